@@ -0,0 +1,156 @@
+"""
+Benchmark of all our optimizations: for each of them, records the wall time,
+the numbers of evaluations and iterations of SLSQP, the exponent reached, and
+whether it matches the value given in the paper.
+
+The results are appended to a JSON history file (one entry per run, with the
+current git commit), so that two commits can be compared:
+    python bench.py                  # runs all the benchmarks
+    python bench.py bcj hgj-quantum2 # runs only these ones
+    python bench.py --compare        # compares the last two entries
+    python bench.py --compare abc123 def456   # the last entries of these commits
+
+The cache of results (see cache.py) is not used.
+"""
+
+from classical_bcj import optimize_bcj_classical
+from classical import optimize_classical
+from quantum_qw import optimize_quantum
+from quantum_qw_no_heuristic import optimize_quantum_without_heuristic
+from quantum_hgj_asymmetric import optimize_hgj
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import numpy as np
+
+
+HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_history.json")
+
+# name: (optimization, keyword arguments, exponent in the paper)
+BENCHMARKS = {
+    "bcj" : (optimize_bcj_classical, {}, 0.289),
+    "classical" : (optimize_classical, {}, 0.283),
+    "hgj-classical" : (optimize_hgj, {'flag' : "classical"}, 0.337),
+    "hgj-quantum1" : (optimize_hgj, {'flag' : "quantum1"}, 0.2374),
+    "hgj-quantum2" : (optimize_hgj, {'flag' : "quantum2"}, 0.2356),
+    "hgj-moremem" : (optimize_hgj, {'flag' : "moremem"}, 0.2374),
+    "quantum" : (optimize_quantum, {}, 0.216),
+    "quantum-no-heuristic" : (optimize_quantum_without_heuristic, {}, 0.218),
+}
+
+
+def run_benchmark(name, repeat=1, tol=1e-3):
+    """
+    Runs the benchmark name repeat times. Returns a dict of the results: the
+    minimal wall time, the statistics of SLSQP, the exponent and whether it is
+    within tol of the value of the paper.
+    """
+    optimize, kwargs, paper = BENCHMARKS[name]
+    times = []
+    for i in range(repeat):
+        begin = time.perf_counter()
+        success, exponent, result = optimize(verb=False, **kwargs)
+        times.append(time.perf_counter() - begin)
+    return { 'seconds' : min(times), 'success' : bool(success),
+             'nit' : int(result.get('nit', 0)), 'nfev' : int(result.get('nfev', 0)),
+             'njev' : int(result.get('njev', 0)), 'exponent' : float(exponent),
+             'paper' : paper, 'matches' : bool(abs(exponent - paper) <= tol) }
+
+
+def git_commit():
+    """
+    The current commit (with "+" if the tree has changes), or None.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=directory,
+                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=directory,
+                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if dirty else "")
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def print_entry(entry):
+    print("commit %s, %s" % (entry['commit'], entry['date']))
+    print("%-22s %9s %6s %6s %6s %9s %7s  %s" % ("", "seconds", "nit", "nfev", "njev", "exponent", "paper", "ok"))
+    for name, r in entry['results'].items():
+        print("%-22s %9.3f %6i %6i %6i %9.5f %7s  %s" % (name, r['seconds'], r['nit'], r['nfev'],
+                r['njev'], r['exponent'], r['paper'], "yes" if r['matches'] else "NO"))
+
+
+def compare(old, new):
+    """
+    Prints the differences between two entries of the history.
+    """
+    print("%s (%s) -> %s (%s)" % (old['commit'], old['date'], new['commit'], new['date']))
+    print("%-22s %19s %9s %13s %19s" % ("", "seconds (old, new)", "speedup", "nfev", "exponent"))
+    for name in new['results']:
+        if name not in old['results']:
+            continue
+        a, b = old['results'][name], new['results'][name]
+        flag = "" if abs(a['exponent'] - b['exponent']) <= 1e-6 else "  CHANGED"
+        print("%-22s %9.3f %9.3f %8.2fx %6i %6i %9.5f %9.5f%s" % (name, a['seconds'], b['seconds'],
+                a['seconds'] / b['seconds'], a['nfev'], b['nfev'], a['exponent'], b['exponent'], flag))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks all our optimizations.")
+    parser.add_argument("names", nargs="*", help="the benchmarks to run (default: all): "
+            + ", ".join(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=3, help="keep the best time of this many runs")
+    parser.add_argument("--tol", type=float, default=1e-3,
+            help="maximal difference with the exponent of the paper")
+    parser.add_argument("--history", default=HISTORY, help="the JSON history file")
+    parser.add_argument("--no-save", action="store_true", help="do not append to the history")
+    parser.add_argument("--compare", nargs="*", metavar="COMMIT", default=None,
+            help="compare the last entries of two commits (default: the last two entries)")
+    args = parser.parse_args()
+
+    history = load_history(args.history)
+    if args.compare is not None:
+        if args.compare:
+            entries = [ [ e for e in history if e['commit'].startswith(c) ][-1:] for c in args.compare ]
+            if len(args.compare) != 2 or not all(entries):
+                parser.error("give two commits present in the history")
+            old, new = entries[0][0], entries[1][0]
+        elif len(history) < 2:
+            parser.error("less than two entries in the history")
+        else:
+            old, new = history[-2:]
+        compare(old, new)
+        return
+
+    names = args.names or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            parser.error("unknown benchmark: " + name)
+    # not counted in the first benchmark (see macros.minimize)
+    import scipy.optimize
+    with np.errstate(all='ignore'):
+        results = { name : run_benchmark(name, args.repeat, args.tol) for name in names }
+    entry = { 'commit' : git_commit(), 'date' : time.strftime("%Y-%m-%d %H:%M:%S"),
+              'python' : platform.python_version(), 'numpy' : np.__version__,
+              'results' : results }
+    print_entry(entry)
+    if not args.no_save:
+        history.append(entry)
+        with open(args.history, "w") as f:
+            json.dump(history, f, indent=1)
+    if not all(r['matches'] for r in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Startup-time benchmark: measures the time to import each of our modules in a
+fresh interpreter (median of several runs). For reference, it also measures
+an empty interpreter, and the eager imports that each module used to do
+(numpy, scipy.optimize, scipy.stats and matplotlib.pyplot).
+
+Run:
+    python bench_startup.py [--runs 10] [--output bench_output.txt]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+MODULES = ["macros", "model", "classical_bcj", "classical", "quantum_qw",
+        "quantum_qw_no_heuristic", "quantum_hgj_asymmetric", "main"]
+
+REFERENCES = [
+    ("(empty interpreter)", "pass"),
+    ("(former eager imports)", "import numpy, scipy.optimize, scipy.stats, matplotlib.pyplot"),
+]
+
+
+def startup_time(code, runs):
+    """
+    Median time (in seconds) of running python -c code, or None if it fails.
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for i in range(runs):
+        begin = time.perf_counter()
+        process = subprocess.run([sys.executable, "-c", code], cwd=directory,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if process.returncode != 0:
+            return None
+        times.append(time.perf_counter() - begin)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the import time of the modules.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", default=None, help="also append the results to this file")
+    args = parser.parse_args()
+
+    lines = [ "Startup times (median of %i runs), %s" % (args.runs, time.strftime("%Y-%m-%d %H:%M:%S")) ]
+    for label, code in REFERENCES + [ (m, "import " + m) for m in MODULES ]:
+        t = startup_time(code, args.runs)
+        lines.append("%-28s %s" % (label, "failed" if t is None else "%7.1f ms" % (t*1000)))
+    print("\n".join(lines))
+    if args.output is not None:
+        with open(args.output, "a") as f:
+            f.write("\n".join(lines) + "\n\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Persistent cache of optimization results.
+
+The results of Model.solve are stored in a SQLite database, under a hash of
+everything that determines them: the names of the parameters, the source of
+the constraints and of the time function (with their closures), the bounds,
+the starting point, tol, maxiter, the options of the solve, and the contents
+of the files that define them. So a result is only reused if nothing changed.
+
+The cache is used by the models once enabled:
+>>> import cache
+>>> cache.enable()
+>>> optimize_hgj("quantum2")   # solved and stored
+>>> optimize_hgj("quantum2")   # read from the cache
+
+When the database exceeds its maximal size, the least recently used results
+are evicted.
+
+Command line:
+    python cache.py list          # the stored results
+    python cache.py stats
+    python cache.py invalidate [label prefix]    # all the results by default
+    python cache.py evict --max-size 1000000
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".optcache", "results.sqlite")
+DEFAULT_MAX_SIZE = 64 * 2**20
+
+# the fields of OptimizeResult which are stored
+FIELDS = ["x", "fun", "success", "status", "message", "nit", "nfev", "njev", "epigraph"]
+
+
+_hashes = {}
+
+
+def file_hash(filename):
+    """
+    Hash of the contents of a file (computed once per process).
+    """
+    if filename not in _hashes:
+        with open(filename, "rb") as f:
+            _hashes[filename] = hashlib.sha256(f.read()).hexdigest()
+    return _hashes[filename]
+
+
+def make_key(definition):
+    """
+    Hash of a definition made of JSON-serializable values (other values are
+    replaced by their repr).
+    """
+    text = json.dumps(definition, sort_keys=True, default=repr)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _tojson(t):
+    if isinstance(t, np.ndarray):
+        return t.tolist()
+    if isinstance(t, np.generic):
+        return t.item()
+    return t
+
+
+def result_to_dict(result, seconds):
+    d = { field : _tojson(result[field]) for field in FIELDS if field in result }
+    d["seconds"] = seconds
+    return d
+
+
+def dict_to_result(d):
+    import scipy.optimize as opt
+    result = opt.OptimizeResult({ field : d[field] for field in FIELDS if field in d })
+    result.x = np.array(result.x)
+    result.seconds = d["seconds"]
+    result.cached = True
+    return result
+
+
+class Cache:
+    """
+    A SQLite database of results, of at most max_size bytes (of stored results).
+    The connections are opened at each access, so that a Cache can be used by
+    forked processes.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, max_size=DEFAULT_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with contextlib.closing(self._connect()) as db, db:
+            db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, label TEXT, "
+                    "value TEXT, size INTEGER, created REAL, accessed REAL)")
+
+    def _connect(self):
+        """
+        A new connection, which the caller closes: the with statement of a
+        connection only commits or rolls back its transaction.
+        """
+        return sqlite3.connect(self.path, timeout=60)
+
+    def get(self, key):
+        """
+        The result stored under key, or None.
+        """
+        with contextlib.closing(self._connect()) as db, db:
+            row = db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            db.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        return dict_to_result(json.loads(row[0]))
+
+    def put(self, key, label, result, seconds):
+        """
+        Stores the result (computed in seconds) under key, then evicts the
+        least recently used results if the cache is too large.
+        """
+        value = json.dumps(result_to_dict(result, seconds))
+        now = time.time()
+        with contextlib.closing(self._connect()) as db, db:
+            db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, label, value, len(value), now, now))
+        self.evict()
+
+    def evict(self, max_size=None):
+        """
+        Removes the least recently used results until the cache holds at most
+        max_size bytes (default: self.max_size). Returns the number of removed
+        results.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        removed = 0
+        with contextlib.closing(self._connect()) as db, db:
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            for key, size in db.execute("SELECT key, size FROM results ORDER BY accessed").fetchall():
+                if total <= max_size:
+                    break
+                db.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+        return removed
+
+    def invalidate(self, prefix=""):
+        """
+        Removes the results whose label starts with prefix (by default, all of
+        them). Returns the number of removed results.
+        """
+        with contextlib.closing(self._connect()) as db, db:
+            return db.execute("DELETE FROM results WHERE substr(label, 1, ?) = ?",
+                    (len(prefix), prefix)).rowcount
+
+    def entries(self):
+        """
+        The list of (label, key, size, created, accessed), most recent first.
+        """
+        with contextlib.closing(self._connect()) as db, db:
+            return db.execute("SELECT label, key, size, created, accessed FROM results "
+                    "ORDER BY accessed DESC").fetchall()
+
+
+# the cache used by the models when their solve is not given one
+_default = None
+
+
+def enable(path=DEFAULT_PATH, max_size=DEFAULT_MAX_SIZE):
+    """
+    Makes the models use a cache stored at path. Returns it.
+    """
+    global _default
+    _default = Cache(path, max_size)
+    return _default
+
+
+def disable():
+    global _default
+    _default = None
+
+
+def default():
+    return _default
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Manages the cache of optimization results.")
+    parser.add_argument("--path", default=DEFAULT_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list the stored results")
+    commands.add_parser("stats", help="number and size of the stored results")
+    invalidate = commands.add_parser("invalidate", help="remove results")
+    invalidate.add_argument("prefix", nargs="?", default="",
+            help="remove only the results whose label starts with it")
+    evict = commands.add_parser("evict", help="remove the least recently used results")
+    evict.add_argument("--max-size", type=int, default=DEFAULT_MAX_SIZE,
+            help="maximal size of the cache in bytes")
+    args = parser.parse_args(args)
+
+    cache = Cache(args.path)
+    if args.command == "list":
+        for label, key, size, created, accessed in cache.entries():
+            print("%s  %s  %6i bytes  used %s" % (key[:12], label, size,
+                    time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(accessed))))
+    elif args.command == "stats":
+        entries = cache.entries()
+        print("%i results, %i bytes, in %s" % (len(entries), sum(e[2] for e in entries), args.path))
+    elif args.command == "invalidate":
+        print("Removed %i results" % cache.invalidate(args.prefix))
+    elif args.command == "evict":
+        print("Removed %i results" % cache.evict(args.max_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Certified exponents: a guaranteed upper bound on the time of a solution.
+
+The solutions returned by SLSQP satisfy the constraints up to about 1e-9 only.
+certify(model, x) turns such a solution into a rigorous upper bound:
+1. it solves the model again from x with the 'ineq' constraints tightened by a
+margin, to move x strictly inside them;
+2. it proves with the Krawczyk test (in interval arithmetic, see interval.py)
+that a box X around x contains a point x* which satisfies exactly the 'eq'
+constraints. The test is done on as many variables as there are 'eq'
+constraints, chosen by a pivoted QR decomposition of their jacobian; the other
+variables keep their values;
+3. it checks, in interval arithmetic, that the 'ineq' constraints hold on the
+whole box X, hence at x*;
+4. the upper bound of the time on X (with interval_max as max) is then an upper
+bound on the time of the valid point x*.
+If a step fails, the margin is increased and the certification starts again.
+
+>>> from quantum_qw import model_quantum
+>>> success, time, result = model_quantum.optimize(verb=False)
+>>> certificate = certify(model_quantum, result.x)
+>>> print(certificate.bound)
+
+The box must lie within the bounds of the variables. The 'eq' constraints
+which fix a variable to a float (e.g. x.c0 - 1) are solved first, exactly, and
+the other ones by the Krawczyk test (see _pin). p_good_2 in classical.py
+minimizes an inner function numerically: its enclosure brackets the minimizer
+(see classical.enclose_min_proba_2). A function which has no enclosure raises
+NotEnclosable: it is detected before any solve, and the certification fails
+with the reason. The branches of f, min or max on an interval which contains
+the branching point fail in the same way.
+
+certify_tradeoff certifies each point of a time-memory tradeoff curve (see
+quantum_hgj_asymmetric.sweep_hgj). The points are certified one by one, in a
+loop: each one needs its own tightened solve and its own Krawczyk box, and its
+model has its own memory bound, so the interval evaluations are not batched
+across the points.
+"""
+
+from macros import Dual, minimize, round_upwards_to_str
+from interval import Interval, Undecided, NotEnclosable, interval_max, dot
+import collections
+import numpy as np
+
+
+Certificate = collections.namedtuple('Certificate', 'certified bound x box margin message')
+Certificate.__doc__ = """
+The result of certify: whether the certification succeeded, the upper bound on
+the time, the point x from which it was obtained, the box of the variables (an
+Interval) which contains a valid point, the margin used and, on failure, the
+reason.
+"""
+
+
+def interval_duals(box):
+    """
+    The variables of the box (an Interval) as duals, to enclose the jacobians.
+    """
+    return [ Dual(box[i], {i: 1.}) for i in range(len(box)) ]
+
+
+def _enclose(constraints, box):
+    """
+    The values of the constraints on the box, as one Interval.
+    """
+    return Interval.stack([ c['fun'](list(box)) for c in constraints ])
+
+
+def _enclose_jacobian(constraints, box, columns):
+    """
+    The jacobian of the constraints on the box, restricted to the columns, as
+    an Interval of shape len(constraints) x len(columns).
+    """
+    duals = interval_duals(box)
+    rows = []
+    for c in constraints:
+        y = c['fun'](duals)
+        d = y.d if isinstance(y, Dual) else {}
+        rows.append([ Interval.of(d.get(j, 0.)) for j in columns ])
+    return Interval(np.array([ [ t.lo for t in row ] for row in rows ]),
+            np.array([ [ t.hi for t in row ] for row in rows ]))
+
+
+def krawczyk(constraints, x, columns, steps=20):
+    """
+    Looks for a box around x, in the variables of the given columns only,
+    which contains a zero of the (eq) constraints. Returns it (an Interval over
+    all the variables), or None.
+
+    If the Krawczyk operator K(X) = y - C F(y) + (I - C J(X)) (X - y), where J(X)
+    encloses the jacobian on X and C approximates its inverse at y, maps X into
+    its interior, then X contains a (unique) zero.
+    """
+    x = np.array(x, dtype=float)
+    m = len(constraints)
+    # a few Newton steps in floating-point arithmetic
+    for i in range(5):
+        jac = np.array([ c['fun'].jac(x) for c in constraints ])[:, columns]
+        step = np.linalg.solve(jac, [ c['fun'](x) for c in constraints ])
+        x[columns] -= step
+    jac = np.array([ c['fun'].jac(x) for c in constraints ])[:, columns]
+    C = np.linalg.inv(jac)
+    y = x[columns]
+
+    # epsilon-inflation of the box
+    radius = np.abs(C @ np.array([ c['fun'](x) for c in constraints ])) + 1e-12*(1 + np.abs(y))
+    for i in range(steps):
+        radius *= 2
+        X = Interval(y - radius, y + radius)
+        box = Interval(x)
+        box.lo, box.hi = box.lo.copy(), box.hi.copy()
+        box.lo[columns], box.hi[columns] = X.lo, X.hi
+        Fy = _enclose(constraints, Interval(x))
+        J = _enclose_jacobian(constraints, box, columns)
+        M = Interval(np.eye(m)) - Interval(np.array([ dot(C, J[:, k]).lo for k in range(m) ]).T,
+                np.array([ dot(C, J[:, k]).hi for k in range(m) ]).T)
+        K = Interval(y) - dot(C, Fy) + dot(M, X - y)
+        if X.interior(K):
+            box.lo[columns], box.hi[columns] = K.lo, K.hi
+            return box
+        # the next box contains the current image
+        radius = np.maximum(radius, np.maximum(y - K.lo, K.hi - y))
+    return None
+
+
+def tighten(model, x, margin, epigraph=False):
+    """
+    Solves the model from x with the 'ineq' constraints tightened by margin.
+    Returns the new point, or x if the optimization fails.
+    """
+    # the jacobians do not change
+    constraints = [ dict(c, jac=c['fun'].jac) if c['type'] == 'eq' else
+            dict(c, fun=lambda x, fun=c['fun'] : fun(x) - margin, jac=c['fun'].jac)
+            for c in model.constraints ]
+    try:
+        with np.errstate(all='ignore'):
+            result = minimize(model.time, x, model.bounds, constraints, tol=model.tol,
+                    maxiter=model.maxiter, epigraph=epigraph)
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return np.array(x, dtype=float)
+    return result.x if result.success else np.array(x, dtype=float)
+
+
+def _pin(model, eq, y):
+    """
+    The 'eq' constraints of the form x.v - k (the jacobian is exactly 1 on v
+    and 0 elsewhere, on the whole bounds of the variables), whose zero v = k is
+    exactly a float: v is set to it in y (in place). Returns the indices of
+    these constraints and of their variables. Such a constraint often
+    duplicates a bound (e.g. x.c0 - 1 and c0 <= 1), which could not be checked
+    on a box around its zero.
+    """
+    bounds = Interval(np.array([ -np.inf if lo is None else lo for lo, hi in model.bounds ], dtype=float),
+            np.array([ np.inf if hi is None else hi for lo, hi in model.bounds ], dtype=float))
+    duals = interval_duals(bounds)
+    constraints, variables = [], []
+    for k, c in enumerate(eq):
+        try:
+            with np.errstate(all='ignore'):
+                d = c['fun'](duals).d
+        except (Undecided, ZeroDivisionError, TypeError, AttributeError):
+            continue
+        if len(d) != 1:
+            continue
+        (i, slope), = d.items()
+        slope = Interval.of(slope)
+        if i in variables or slope.lo != 1 or slope.hi != 1:
+            continue
+        z = y.copy()
+        z[i] = y[i] - c['fun'](y)
+        value = Interval.of(c['fun'](list(Interval(z))))
+        if value.lo == 0 and value.hi == 0:
+            y[i] = z[i]
+            constraints.append(k)
+            variables.append(i)
+    return constraints, variables
+
+
+def enclosable(model, x):
+    """
+    Why the constraints or the time of the model have no interval extension
+    (evaluating them at the point x), or "" if they have one.
+    """
+    point = list(Interval(np.array(x, dtype=float)))
+    for i, c in enumerate(model.constraints):
+        try:
+            c['fun'](point)
+        except NotEnclosable as e:
+            return "constraint %i cannot be enclosed: %s" % (i, e)
+        except (Undecided, ZeroDivisionError, TypeError):
+            pass
+    try:
+        model.time(point, max=interval_max)
+    except NotEnclosable as e:
+        return "the time cannot be enclosed: %s" % e
+    except (Undecided, ZeroDivisionError, TypeError):
+        pass
+    return ""
+
+
+def certify(model, x, margins=(1e-10, 1e-9, 1e-8, 1e-7, 1e-6), epigraph=False, verb=False):
+    """
+    Certifies an upper bound on the time of the model near the solution x
+    (see the module docstring), trying the margins in turn. Returns a
+    Certificate.
+    """
+    eq = [ c for c in model.constraints if c['type'] == 'eq' ]
+    ineq = [ c for c in model.constraints if c['type'] == 'ineq' ]
+    message = enclosable(model, x)
+    if message:
+        if verb:
+            print("Not certified: " + message)
+        return Certificate(False, np.inf, np.array(x, dtype=float), None, None, message)
+    message = "no margin"
+    for margin in margins:
+        y = np.array(tighten(model, x, margin, epigraph), dtype=float)
+        try:
+            pinned, fixed = _pin(model, eq, y)
+            rest = [ c for k, c in enumerate(eq) if k not in pinned ]
+            if rest:
+                # the best conditioned free variables for the 'eq' constraints
+                import scipy.linalg
+                free = np.array([ i for i in range(len(y)) if i not in fixed ], dtype=int)
+                jac = np.array([ c['fun'].jac(y) for c in rest ])[:, free]
+                q, r, pivots = scipy.linalg.qr(jac, pivoting=True)
+                if len(rest) > len(free) or abs(r[len(rest) - 1, len(rest) - 1]) < 1e-12:
+                    return Certificate(False, np.inf, y, None, margin, "the 'eq' constraints are singular")
+                box = krawczyk(rest, y, np.sort(free[pivots[:len(rest)]]))
+                if box is None:
+                    message = "Krawczyk test failed"
+                    continue
+            else:
+                box = Interval(y)
+            outside = [ i for i, (lo, hi) in enumerate(model.bounds)
+                    if (lo is not None and box.lo[i] < lo) or (hi is not None and box.hi[i] > hi) ]
+            if outside:
+                message = "the box leaves the bounds of %s" % model.settype._fields[outside[0]]
+                continue
+            values = _enclose(ineq, box) if ineq else Interval(np.zeros(0))
+            if np.any(values.lo < 0):
+                message = "'ineq' constraint %i not certified" % np.argmin(values.lo)
+                continue
+            bound = float(model.time(list(box), max=interval_max).hi)
+        except (Undecided, ZeroDivisionError, TypeError, np.linalg.LinAlgError) as e:
+            message = "%s: %s" % (type(e).__name__, e)
+            continue
+        if verb:
+            print("Certified time: %s (margin %g)" % (round_upwards_to_str(bound), margin))
+        return Certificate(True, bound, y, box, margin, "")
+    if verb:
+        print("Not certified: " + message)
+    return Certificate(False, np.inf, np.array(x, dtype=float), None, None, message)
+
+
+def certify_tradeoff(points, flag="quantum2", margins=(1e-10, 1e-9, 1e-8, 1e-7, 1e-6), epigraph=False,
+        verb=False):
+    """
+    Certifies each point of a time-memory tradeoff curve (the tradeoff_point
+    returned by quantum_hgj_asymmetric.sweep_hgj with this flag) for its memory
+    bound. Returns the list of Certificate, in the order of the points (each
+    one is certified separately, see the module docstring).
+    """
+    from quantum_hgj_asymmetric import model_hgj
+    certificates = []
+    for point in points:
+        model = model_hgj(flag, point.mcons)
+        certificate = certify(model, list(point.params), margins, epigraph)
+        if verb:
+            print("mcons %s: time %s, %s" % (round_upwards_to_str(point.mcons), round_upwards_to_str(point.time),
+                    "certified %s" % round_upwards_to_str(certificate.bound) if certificate.certified else
+                    "not certified (%s)" % certificate.message))
+        certificates.append(certificate)
+    return certificates
+
+
+if __name__ == "__main__":
+    from classical_bcj import model_bcj
+    from quantum_qw import model_quantum
+    from quantum_hgj_asymmetric import model_hgj
+    from classical import model_classical
+    for model in [ model_bcj, model_quantum, model_hgj("quantum2"), model_classical ]:
+        with np.errstate(all='ignore'):
+            success, time, result = model.optimize(verb=False)
+        print("%s: time %s" % (model.name, round_upwards_to_str(time)))
+        certify(model, result.x, verb=True)
+    from quantum_hgj_asymmetric import sweep_hgj
+    with np.errstate(all='ignore'):
+        certify_tradeoff(sweep_hgj("quantum2", mcons=np.linspace(0.05, 0.3, 11), refine=None), verb=True)
@@ -12,15 +12,21 @@ To obtain the exponent 0.283
 """
 
 
-from macros import round_to_str, check_constraints, round_upwards_to_str, wrap
-import collections
+from macros import wrap, xlx_array
+from macros import Dual, Interval, value
+from interval import Undecided
+from model import Model, parameters
 from math import*
-import scipy.optimize as opt
-import matplotlib.pyplot as plt
 import numpy as np
 
 
-set_classical = collections.namedtuple('classical', 'p0 p1 p2 l1 l2 l3 l4 c1 c2 c3 alpha1 alpha2 alpha3 gamma1 gamma2 gamma3')
+# (name, bounds, start)
+set_classical, bounds_classical, start_classical = parameters('classical', [
+    ('p0', (-1, 0), -0.2), ('p1', (-1, 0), -0.2), ('p2', (-1, 0), -0.2), ('l1', (0, 1), 0.2),
+    ('l2', (0, 1), 0.2), ('l3', (0, 1), 0.2), ('l4', (0, 1), 0.2), ('c1', (0, 1), 0.2), ('c2', (0, 1), 0.2),
+    ('c3', (0, 1), 0.2), ('alpha1', (0, 0.05), 0.03), ('alpha2', (0, 0.05), 0.03),
+    ('alpha3', (0, 0.05), 0.03), ('gamma1', (0, 0.01), 0.005), ('gamma2', (0, 0.01), 0.005),
+    ('gamma3', (0, 0.01), 0.005)])
 def classical(f) : return wrap(f,set_classical)
 #=================================
 # Among these variables:
@@ -34,6 +40,8 @@ def classical(f) : return wrap(f,set_classical)
 
 
 def xlx(x):
+    if isinstance(x, (Dual, Interval)): return x.xlx(0)
+    if isinstance(x, np.ndarray): return xlx_array(x, slope=0)
     if x<=0: return 0
     return x*log(x, 2)
 
@@ -47,22 +55,147 @@ def g(a, b):
 
 
 def f(a, b, c):
-    if a<=0: return g(b, c)
-    if b<=0: return g(a, c)
-    if c<=0: return g(a, b)
+    if isinstance(a, np.ndarray) or isinstance(b, np.ndarray) or isinstance(c, np.ndarray):
+        return f_array(a, b, c)
+    # xlx(t) = 0 for t <= 0: it only adds the slope of xlx at 0 to the gradient
+    if a<=0: return g(b, c) - xlx(a)
+    if b<=0: return g(a, c) - xlx(b)
+    if c<=0: return g(a, b) - xlx(c)
     if a+b+c >= 1: return min(g(b, c), g(a, c), g(a, b))
-    try:
-        return -a*log(a,2) - b*log(b,2) - c*log(c,2) - (1-a-b-c)*log(1-a-b-c, 2)
-    except:
-        return 0.
+    return -xlx(a) - xlx(b) - xlx(c) - xlx(1-a-b-c)
+
+
+def f_array(a, b, c):
+    """
+    Vectorized f, with the same case distinctions as the scalar version.
+    """
+    a, b, c = np.broadcast_arrays(*[np.asarray(t, dtype=float) for t in (a, b, c)])
+    return np.select([a <= 0, b <= 0, c <= 0, a+b+c >= 1],
+            [g(b, c), g(a, c), g(a, b), np.minimum(np.minimum(g(b, c), g(a, c)), g(a, b))],
+            -xlx(a) - xlx(b) - xlx(c) - xlx(1-a-b-c))
 
     
+def proba_2(x, b0, a0, c0, b1, a1):
+    """
+    The function of x minimized in p_good_2.
+    """
+    return 2*xlx(a0/2) + 2*xlx(x+a1-a0/2-b0/2) + xlx(1-c0-2*a1-2*x) + 2*xlx(b0/2-x) + 2*xlx(x) + 2*xlx(x+c0/2-b1/2+a1/2-a0/4-b0/4) + xlx(b1-a1+a0/2+b0/2-2*x)
+
+
+def argmin_proba_2(b0, a0, c0, b1, a1, lo, hi):
+    """
+    Minimizer of proba_2 on [lo, hi], where lo and hi are the bounds of p_good_2.
+    proba_2 is a sum of terms k*xlx(u + s*x), and the sum of the k*s is zero.
+    So its derivative is (up to a factor 2/ln(2)) the increasing function
+        phi(x) = ln( (A+x) x (D+x) ) - ln( (C-2x) (B-x) (E-2x) )
+    whose factors vanish at lo or hi. We find the root of phi with Newton
+    steps, falling back to bisection when they leave the current bracket.
+    """
+    A = a1-a0/2-b0/2
+    B = b0/2
+    C = 1-c0-2*a1
+    D = c0/2-b1/2+a1/2-a0/4-b0/4
+    E = b1-a1+a0/2+b0/2
+    if lo >= hi: return lo
+    a, b = lo, hi
+    x = (lo + hi)/2
+    for i in range(100):
+        u, v = (A+x)*x*(D+x), (C-2*x)*(B-x)*(E-2*x)
+        # [lo, hi] can be too small to hold a point where phi is defined
+        if u <= 0 or v <= 0: return x
+        p = log(u) - log(v)
+        if p > 0: hi = x
+        else: lo = x
+        d = 1/(A+x) + 1/x + 1/(D+x) + 2/(C-2*x) + 1/(B-x) + 2/(E-2*x)
+        y = x - p/d
+        # the bracket is closed, but phi is not defined at the initial bounds
+        if not (lo <= y <= hi and a < y < b):
+            y = (lo + hi)/2
+        if abs(y - x) <= 1e-15*x:
+            return y
+        x = y
+    return x
+
+
+def enclose_min_proba_2(b0, a0, c0, b1, a1, steps=60):
+    """
+    An enclosure of the minimum of proba_2 when the parameters are intervals
+    (or duals of intervals). proba_2 is convex, so its minimizer lies in
+    [xl, xr] when phi (see argmin_proba_2) is negative at xl and positive at
+    xr. Both signs are checked in interval arithmetic, for a bracket around the
+    minimizer at the middle of the intervals, widened until they hold. The
+    minimum is then above the lower bound of proba_2 on [xl, xr] and below
+    its upper bound at xl, and (by the envelope theorem) its gradient is
+    among the gradients of proba_2 on [xl, xr] at fixed x.
+    """
+    params = (b0, a0, c0, b1, a1)
+    b0_, a0_, c0_, b1_, a1_ = [ Interval.of(value(t)) for t in params ]
+    A = a1_-a0_/2-b0_/2
+    B = b0_/2
+    C = 1-c0_-2*a1_
+    D = c0_/2-b1_/2+a1_/2-a0_/4-b0_/4
+    E = b1_-a1_+a0_/2+b0_/2
+    def u(x): return (A+x)*x*(D+x)
+    def v(x): return (C-2*x)*(B-x)*(E-2*x)
+    # the bounds of p_good_2 and the minimizer, at the middle of the intervals
+    mids = [ float(t.mid()) for t in (b0_, a0_, c0_, b1_, a1_) ]
+    b0m, a0m, c0m, b1m, a1m = mids
+    lo = max(a0m/2+b0m/2-a1m, 0, b1m/2-a1m/2+a0m/4+b0m/4-c0m/2)
+    hi = min(1/2.-c0m/2-a1m, b0m/2, b1m/2-a1m/2+a0m/4+b0m/4)
+    if lo >= hi:
+        raise Undecided("the bounds of the minimization of p_good_2 meet")
+    x = argmin_proba_2(*mids, lo, hi)
+    delta = 1e-15*(1 + abs(x))
+    for i in range(steps):
+        xl, xr = Interval(x - delta), Interval(x + delta)
+        # u > 0 and v > 0 at xl and xr: they are within the bounds
+        if (u(xl).lo > 0 and (v(xl) - u(xl)).lo > 0 and v(xr).lo > 0 and
+                (u(xr) - v(xr)).lo > 0):
+            break
+        delta *= 2
+    else:
+        raise Undecided("the minimizer of proba_2 cannot be bracketed")
+    bracket = Interval(x - delta, x + delta)
+    if any(isinstance(t, Dual) for t in params):
+        xl, bracket = Dual(xl, {}), Dual(bracket, {})
+    whole, upper = proba_2(bracket, *params), proba_2(xl, *params)
+    minimum = Interval(Interval.of(value(whole)).lo, Interval.of(value(upper)).hi)
+    return Dual(minimum, whole.d) if isinstance(whole, Dual) else minimum
+
+
+def _nonnegative(t):
+    """
+    t with a value of at least 0 (and the same gradient if it is a Dual): the
+    rounding errors must not make an xlx term lose its slope.
+    """
+    return t - value(t) if value(t) < 0 else t
+
+
 def p_good_2(b0, a0, c0, b1, a1, c1):
-    def proba(x):
-        return 2*xlx(a0/2) + 2*xlx(x+a1-a0/2-b0/2) + xlx(1-c0-2*a1-2*x) + 2*xlx(b0/2-x) + 2*xlx(x) + 2*xlx(x+c0/2-b1/2+a1/2-a0/4-b0/4) + xlx(b1-a1+a0/2+b0/2-2*x)
-    bounds = [( max(a0/2+b0/2-a1, 0, b1/2-a1/2+a0/4+b0/4-c0/2), min(1/2.-c0/2-a1, b0/2, b1/2-a1/2+a0/4+b0/4) )]
-    if bounds[0][0] > bounds[0][1]: return p_good(b0, a0, b1, a1) - 1
-    return - opt.fminbound(proba, bounds[0][0], bounds[0][1], xtol=1e-15, full_output=1)[1] - 2*f(a1, b1, c1)
+    # proba_2(x) has a term xlx(x - lo_k) for each lower bound lo_k of x, and
+    # a term xlx(hi_k - x) (up to factors) for each upper bound hi_k
+    if any(isinstance(value(t), Interval) for t in (b0, a0, c0, b1, a1, c1)):
+        return -enclose_min_proba_2(b0, a0, c0, b1, a1) - 2*f(a1, b1, c1)
+    lows = [a0/2+b0/2-a1, 0, b1/2-a1/2+a0/4+b0/4-c0/2]
+    highs = [1/2.-c0/2-a1, b0/2, b1/2-a1/2+a0/4+b0/4]
+    lo, hi = max(lows), min(highs)
+    # [lo, hi] is a point when there is no "2" in the children (gamma = 0),
+    # and only the rounding errors can then make it empty
+    if value(lo) > value(hi) + 1e-12: return p_good(b0, a0, b1, a1) - 1
+    # the minimization is done on the values only: by the envelope theorem,
+    # the gradient of the minimum is the gradient of proba_2 at the minimizer.
+    # The minimizer is kept at the same fraction t of [lo, hi], so that the
+    # terms which vanish at lo and hi keep their sign and their gradients
+    # cancel with the ones of f when [lo, hi] shrinks to a point.
+    params = tuple(value(t) for t in (b0, a0, c0, b1, a1))
+    width = value(hi) - value(lo)
+    t = (argmin_proba_2(*params, value(lo), value(hi)) - value(lo))/width if width > 0 else 0.5
+    w = _nonnegative(hi - lo)
+    above = [ _nonnegative((lo - l) + t*w) for l in lows ]
+    below = [ _nonnegative((h - hi) + (1-t)*w) for h in highs ]
+    proba = (2*xlx(a0/2) + 2*xlx(above[0]) + 2*xlx(above[1]) + 2*xlx(above[2]) + xlx(2*below[0]) +
+             2*xlx(below[1]) + xlx(2*below[2]))
+    return - proba - 2*f(a1, b1, c1)
 
 
 def p_good_2_aux(b0, a0, c0, b1, a1, c1):
@@ -96,38 +229,26 @@ constraints_classical = [
 ]
 
 
-def classical_time(x):
+def classical_time(x, max=max):
     x = set_classical(*x)
     return max(x.l4, x.l3, x.l2 - x.p2, x.l1 - x.p1, -x.p0)
 
 
-def optimize_classical(verb=True):
+# solved in epigraph form by default: SLSQP on the plain time (a max) moves
+# slowly along its kinks, it stops at 0.2832 from the default start, the
+# epigraph form at 0.2829
+model_classical = Model(set_classical, constraints_classical, classical_time, bounds_classical, start_classical,
+        epigraph=True)
+
+
+def optimize_classical(verb=True, epigraph=None, nstarts=1, workers=None):
     """
     Optimizes the classical algorithm.
-    """
 
-    time = classical_time
-    objective = time
-    mycons = constraints_classical
-    
-    start = [(-0.2)]*3 + [0.2]*7 + [0.03]*3 + [0.005]*3
-    bounds = [(-1,0)]*3 + [(0,1)]*7 + [(0, 0.05)]*3 + [(0, 0.01)]*3
-    
-    result = opt.minimize(time, start, 
-            bounds= bounds, tol=1e-10, 
-            constraints=mycons, options={'maxiter':5000})
-    
-    astuple = set_classical(*result.x)
-    
-    if verb:
-        print("Validity: ", result.success)
-        print("Time: ", round_upwards_to_str(time(astuple)))
-        for t in astuple._asdict():
-            print(t, round_to_str(astuple._asdict()[t]) )
-        print("Checking that the constraints are satisfied:")
-        print(check_constraints(mycons, result.x))
-
-    return result.success, objective(astuple), result
+    See Model.optimize for epigraph, nstarts and workers. epigraph defaults to
+    the one of model_classical (True).
+    """
+    return model_classical.optimize(verb, epigraph, nstarts, workers)
 
 
 if __name__ == "__main__":
@@ -12,14 +12,16 @@ To obtain the exponent 0.289
 
 
 from macros import*
-import collections
+from model import Model, parameters
 from math import*
-import scipy.optimize as opt
-import matplotlib.pyplot as plt
-import numpy as np
 
 
-set_bcj = collections.namedtuple('BCJ', 'p0 p1 p2 l1 l2 l3 l4 c1 c2 c3 alpha1 alpha2 alpha3')
+# (name, bounds, start)
+variables_bcj = [
+    ('p0', (-1, 0), -0.2), ('p1', (-1, 0), -0.2), ('p2', (-1, 0), -0.2), ('l1', (0, 1), 0.2),
+    ('l2', (0, 1), 0.2), ('l3', (0, 1), 0.2), ('l4', (0, 1), 0.2), ('c1', (0, 1), 0.2), ('c2', (0, 1), 0.2),
+    ('c3', (0, 1), 0.2), ('alpha1', (0, 1), 0.2), ('alpha2', (0, 1), 0.2), ('alpha3', (0, 1), 0.2)]
+set_bcj, bounds_bcj, start_bcj = parameters('BCJ', variables_bcj)
 def bcj(f) : return wrap(f,set_bcj)
 #=================================
 # Among these variables:
@@ -31,59 +33,86 @@ def bcj(f) : return wrap(f,set_bcj)
 # - alphai is the total number of "-1" at level i
 
 
-constraints_bcj_classical = [
-# filtering terms
-{ 'type' : 'eq', 'fun' : bcj(lambda x : p_good(1/2., 0., 1/4.+x.alpha1, x.alpha1) - x.p0 )},
-{ 'type' : 'eq', 'fun' : bcj(lambda x : p_good(1/4.+x.alpha1, x.alpha1, 1/8.+x.alpha2, x.alpha2) - x.p1)},
-{ 'type' : 'eq', 'fun' : bcj(lambda x : p_good(1/8.+x.alpha2, x.alpha2, 1/16.+x.alpha3, x.alpha3) - x.p2)},
-# sizes of the lists
-{ 'type' : 'eq', 'fun' : bcj(lambda x : 2*x.l1 - (1-x.c1) + x.p0 )},
-{ 'type' : 'eq', 'fun' : bcj(lambda x : 2*x.l2 - (x.c1 - x.c2) + x.p1 - x.l1 )},
-{ 'type' : 'eq', 'fun' : bcj(lambda x : 2*x.l3 - (x.c2 - x.c3) + x.p2 - x.l2 )},
-{ 'type' : 'eq', 'fun' : bcj(lambda x : 2*x.l4 - x.c3 - x.l3 )},
-{ 'type' : 'ineq', 'fun' : bcj(lambda x : g(1/4.+x.alpha1, x.alpha1) - x.c1 - x.l1)},
-{ 'type' : 'ineq', 'fun' : bcj(lambda x : g(1/8.+x.alpha2, x.alpha2) - x.c2 - x.l2)},
-{ 'type' : 'ineq', 'fun' : bcj(lambda x : g(1/16.+x.alpha3, x.alpha3) - x.c3 - x.l3)},
-{ 'type' : 'ineq', 'fun' : bcj(lambda x : g(1/16.+x.alpha3, x.alpha3)*0.5 - x.l4)},
-# coherence of the -1
-{ 'type' : 'ineq', 'fun' : bcj(lambda x : x.alpha2 - x.alpha1/2)},
-{ 'type' : 'ineq', 'fun' : bcj(lambda x : x.alpha3 - x.alpha2/2)}
-]
-
-
-def classical_time_bcj(x):
+def constraints_bcj(bcj, repeated=False):
+    """
+    The constraints of BCJ, on the parameters wrapped by bcj. If repeated, a
+    run finds the solution with probability 2^{-r n} only (see
+    model_bcj_memory).
+    """
+    if repeated:
+        size1 = lambda x : 2*x.l1 - (1-x.c1) + x.p0 + x.r
+    else:
+        size1 = lambda x : 2*x.l1 - (1-x.c1) + x.p0
+    return [
+    # filtering terms
+    { 'type' : 'eq', 'fun' : bcj(lambda x : p_good(1/2., 0., 1/4.+x.alpha1, x.alpha1) - x.p0 )},
+    { 'type' : 'eq', 'fun' : bcj(lambda x : p_good(1/4.+x.alpha1, x.alpha1, 1/8.+x.alpha2, x.alpha2) - x.p1)},
+    { 'type' : 'eq', 'fun' : bcj(lambda x : p_good(1/8.+x.alpha2, x.alpha2, 1/16.+x.alpha3, x.alpha3) - x.p2)},
+    # sizes of the lists
+    { 'type' : 'eq', 'fun' : bcj(size1)},
+    { 'type' : 'eq', 'fun' : bcj(lambda x : 2*x.l2 - (x.c1 - x.c2) + x.p1 - x.l1 )},
+    { 'type' : 'eq', 'fun' : bcj(lambda x : 2*x.l3 - (x.c2 - x.c3) + x.p2 - x.l2 )},
+    { 'type' : 'eq', 'fun' : bcj(lambda x : 2*x.l4 - x.c3 - x.l3 )},
+    { 'type' : 'ineq', 'fun' : bcj(lambda x : g(1/4.+x.alpha1, x.alpha1) - x.c1 - x.l1)},
+    { 'type' : 'ineq', 'fun' : bcj(lambda x : g(1/8.+x.alpha2, x.alpha2) - x.c2 - x.l2)},
+    { 'type' : 'ineq', 'fun' : bcj(lambda x : g(1/16.+x.alpha3, x.alpha3) - x.c3 - x.l3)},
+    { 'type' : 'ineq', 'fun' : bcj(lambda x : g(1/16.+x.alpha3, x.alpha3)*0.5 - x.l4)},
+    # coherence of the -1
+    { 'type' : 'ineq', 'fun' : bcj(lambda x : x.alpha2 - x.alpha1/2)},
+    { 'type' : 'ineq', 'fun' : bcj(lambda x : x.alpha3 - x.alpha2/2)}
+    ]
+
+
+constraints_bcj_classical = constraints_bcj(bcj)
+
+
+def classical_time_bcj(x, max=max):
     x = set_bcj(*x)
     return max(x.l4, x.l3, x.l2 - x.p2, x.l1 - x.p1, -x.p0)
 
 
-def optimize_bcj_classical(verb=True):
+model_bcj = Model(set_bcj, constraints_bcj_classical, classical_time_bcj, bounds_bcj, start_bcj)
+
+
+# with a memory constraint, a run of the tree finds the solution with
+# probability 2^{-r n} only (there are fewer representations than the
+# constraints of the lists assume), and is repeated 2^{r n} times
+set_bcj_memory, bounds_bcj_memory, start_bcj_memory = parameters('BCJMemory', variables_bcj + [('r', (0, 1), 0.)])
+
+
+def classical_time_bcj_memory(x, max=max):
+    x = set_bcj_memory(*x)
+    return x.r + classical_time_bcj(x[:-1], max=max)
+
+
+def memory_bcj(x):
     """
-    Optimizes the classical BCJ algorithm.
+    The memory of BCJ: its largest list.
     """
+    x = set_bcj_memory(*x)
+    return max(x.l1, x.l2, x.l3, x.l4)
 
-    time = classical_time_bcj
-    objective = time
-    mycons = constraints_bcj_classical
-    
-    start = [(-0.2)]*3 + [(0.2)]*10
-    bounds = [(-1,0)]*3 + [(0,1)]*10
-    
-    result = opt.minimize(time, start, 
-            bounds= bounds, tol=1e-10, 
-            constraints=mycons, options={'maxiter':5000})
-    
-    astuple = set_bcj(*result.x)
-    
-    if verb:
-        print("Validity: ", result.success)
-        print("Time: ", round_upwards_to_str(time(astuple)))
-        
-        for t in astuple._asdict():
-            print(t, round_to_str(astuple._asdict()[t]) )
-        print("Checking that the constraints are satisfied:")
-        print(check_constraints(mycons, result.x))
-
-    return result.success, objective(astuple), result
+
+def model_bcj_memory(mcons):
+    """
+    The model of BCJ where the lists have at most 2^{mcons n} elements, and
+    the runs are repeated 2^{r n} times.
+    """
+    constraints = constraints_bcj(lambda f : wrap(f, set_bcj_memory), repeated=True)
+    for l in ["l1", "l2", "l3", "l4"]:
+        constraints.append({ 'type' : 'ineq', 'fun' : wrap(lambda x, l=l : mcons - getattr(x, l), set_bcj_memory) })
+    return Model(set_bcj_memory, constraints, classical_time_bcj_memory, bounds_bcj_memory, start_bcj_memory,
+            reports=[ ("Memory", memory_bcj) ],
+            name="BCJ mcons=%s" % mcons)
+
+
+def optimize_bcj_classical(verb=True, epigraph=False, nstarts=1, workers=None):
+    """
+    Optimizes the classical BCJ algorithm.
+
+    See Model.optimize for epigraph, nstarts and workers.
+    """
+    return model_bcj.optimize(verb, epigraph, nstarts, workers)
 
 if __name__ == "__main__":
 
@@ -0,0 +1,211 @@
+"""
+Command-line interface to all our optimizations, with machine-readable output:
+each run is one solve of a model, and its result (status, time, all the
+parameters, the reports of the model such as the memory, the counts of the
+solver and the duration) is written as JSON or CSV. Run:
+    python cli.py bcj                                  # JSON on stdout
+    python cli.py hgj --flag quantum2 --mcons 0.1 0.2 --format csv -o tradeoff.csv
+    python cli.py quantum --nstarts 8 --workers 4 --tol 1e-12 --maxiter 20000
+    python cli.py --list                               # the models
+    python cli.py classical --no-epigraph              # plain SLSQP (classical defaults to --epigraph)
+
+The runs (one per value of --mcons, times the models) are solved in parallel
+processes (see runner.py), on --workers processes; a single run gives them to
+its multistart instead (see Model.solve). The results are written in the order
+of the runs, whatever their order of completion. The cache of results (see
+cache.py) is used unless --no-cache is given, and the exit status is 1 if a run
+did not finish.
+"""
+
+from macros import SOLVERS, violation
+from classical_bcj import model_bcj
+from classical import model_classical
+from quantum_qw import model_quantum
+from quantum_hgj_asymmetric import model_hgj
+from runner import run_jobs
+import quantum_qw_no_heuristic
+import argparse
+import cache
+import copy
+import csv
+import json
+import sys
+import numpy as np
+
+
+# name: function of (flag, mcons, epigraph) -> model
+MODELS = {
+    "bcj" : lambda flag, mcons, epigraph : model_bcj,
+    "classical" : lambda flag, mcons, epigraph : model_classical,
+    "hgj" : lambda flag, mcons, epigraph : model_hgj(flag, mcons, epigraph),
+    "quantum" : lambda flag, mcons, epigraph : model_quantum,
+    "quantum-no-heuristic" : lambda flag, mcons, epigraph : quantum_qw_no_heuristic.model_quantum,
+}
+
+# the models which take a flag and a memory constraint
+FLAGS = { "hgj" : ["classical", "quantum1", "quantum2", "moremem"] }
+
+# the columns of the output which are not parameters of the model
+COLUMNS = ["model", "flag", "mcons", "epigraph", "method", "tol", "maxiter", "nstarts", "status", "success",
+           "time", "epigraph_time", "violation", "nit", "nfev", "message", "seconds", "cached", "error"]
+
+
+def make_model(name, flag=None, mcons=None, epigraph=False, tol=None, maxiter=None):
+    """
+    The model of MODELS with this name, with the tolerance and the maximal
+    number of iterations of its solver replaced if they are not None.
+    """
+    if name in FLAGS:
+        model = MODELS[name](flag or FLAGS[name][0], mcons, epigraph)
+    elif flag is not None or mcons is not None:
+        raise ValueError("The model %s takes no flag nor memory constraint" % name)
+    else:
+        model = MODELS[name](flag, mcons, epigraph)
+    if tol is not None or maxiter is not None:
+        model = copy.copy(model)
+        model.tol = model.tol if tol is None else tol
+        model.maxiter = model.maxiter if maxiter is None else maxiter
+    return model
+
+
+def _number(t):
+    t = float(t)
+    return t if np.isfinite(t) else None
+
+
+def run(name, flag=None, mcons=None, epigraph=None, method="SLSQP", tol=None, maxiter=None, nstarts=1,
+        workers=None):
+    """
+    Solves one model (see make_model and Model.solve) and returns its result as
+    a dict of JSON values: the options of the run, the time, the time of the
+    epigraph reformulation (if epigraph), the maximal violation of the
+    constraints, the counts of the solver, the reports of the model (e.g.
+    "Memory") and the parameters at the optimum, by name. epigraph defaults to
+    the one of the model (see Model).
+    """
+    model = make_model(name, flag, mcons, bool(epigraph), tol, maxiter)
+    if epigraph is None:
+        epigraph = model.epigraph
+    with np.errstate(all='ignore'):
+        result = model.solve(epigraph=epigraph, nstarts=nstarts, workers=workers, method=method)
+        x = model.astuple(result.x)
+        res = { 'model' : name, 'flag' : flag or (FLAGS[name][0] if name in FLAGS else None), 'mcons' : mcons,
+                'epigraph' : epigraph, 'method' : method, 'tol' : model.tol, 'maxiter' : model.maxiter,
+                'nstarts' : nstarts, 'success' : bool(result.success), 'time' : _number(model.time(x)),
+                'epigraph_time' : _number(result.epigraph) if epigraph and 'epigraph' in result else None,
+                'violation' : _number(violation(model.constraints, result.x)),
+                'nit' : int(result.nit) if 'nit' in result else None,
+                'nfev' : int(result.nfev) if 'nfev' in result else None,
+                'message' : str(result.get('message', "")), 'seconds' : float(result.seconds),
+                'cached' : bool(getattr(result, 'cached', False)) }
+        res['reports'] = { label : _number(function(x)) for label, function in model.reports }
+    res['parameters'] = { field : float(t) for field, t in zip(model.settype._fields, result.x) }
+    return res
+
+
+def run_all(runs, workers=None, timeout=None, verb=False):
+    """
+    Runs the runs (dicts of keyword arguments of run) in parallel processes
+    (see runner.run_jobs). Returns their results in order, with their status
+    ("done", "error" or "timeout"), their error (the traceback) if any, and
+    their duration in seconds (including the time to build the model).
+    """
+    results = [None]*len(runs)
+    jobs = [ (run, dict(r, workers=1 if len(runs) > 1 else workers)) for r in runs ]
+    for i, status, value, seconds in run_jobs(jobs, workers=workers, timeout=timeout):
+        if status == "done":
+            value.update(status=status, error=None, seconds=seconds)
+            results[i] = value
+        else:
+            results[i] = dict(runs[i], status=status, error=value, seconds=seconds)
+        if verb:
+            print("[%.1fs] %s : %s" % (seconds, runs[i], results[i].get('time') if status == "done" else status),
+                    file=sys.stderr)
+    return results
+
+
+def to_json(results, output):
+    """
+    Writes the results of run_all to the file output, as a JSON list.
+    """
+    json.dump(results, output, indent=1)
+    output.write("\n")
+
+
+def to_csv(results, output):
+    """
+    Writes the results of run_all to the file output, as CSV with one row per
+    run: the COLUMNS, then one column per report and per parameter (the
+    union over the runs, empty where a run does not have it).
+    """
+    reports, parameters = [], []
+    for r in results:
+        reports.extend(k for k in r.get('reports', {}) if k not in reports)
+        parameters.extend(k for k in r.get('parameters', {}) if k not in parameters)
+    writer = csv.writer(output)
+    writer.writerow(COLUMNS + reports + parameters)
+    for r in results:
+        writer.writerow([ r.get(c) for c in COLUMNS ] + [ r.get('reports', {}).get(k) for k in reports ] +
+                [ r.get('parameters', {}).get(k) for k in parameters ])
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Runs our optimizations and writes their results as JSON or CSV.")
+    parser.add_argument("models", nargs="*", help="the models: " + ", ".join(MODELS))
+    parser.add_argument("--list", action="store_true", help="list the models and their flags")
+    parser.add_argument("--flag", default=None,
+            help="the variant of the models which have one (hgj: %s), ignored by the others" % ", ".join(FLAGS["hgj"]))
+    parser.add_argument("--mcons", type=float, nargs="+", default=None,
+            help="memory constraints (hgj only, ignored by the others), one run for each")
+    parser.add_argument("--epigraph", action=argparse.BooleanOptionalAction, default=None,
+            help="minimize the smooth reformulation of the time (see macros.epigraph_problem); "
+            "default: as the model (see Model)")
+    parser.add_argument("--method", default="SLSQP", choices=list(SOLVERS))
+    parser.add_argument("--tol", type=float, default=None, help="tolerance of the solver (default: the model's)")
+    parser.add_argument("--maxiter", type=int, default=None,
+            help="maximal number of iterations of the solver (default: the model's)")
+    parser.add_argument("--nstarts", type=int, default=1, help="number of starting points (see multistart.py)")
+    parser.add_argument("--workers", type=int, default=None,
+            help="number of processes (default: the number of cores)")
+    parser.add_argument("--timeout", type=float, default=None, help="maximal time of each run, in seconds")
+    parser.add_argument("--format", default="json", choices=["json", "csv"])
+    parser.add_argument("-o", "--output", default=None, help="the output file (default: stdout)")
+    parser.add_argument("--no-cache", action="store_true", help="do not reuse nor store the results (see cache.py)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="report each run on stderr as it finishes")
+    args = parser.parse_args(args)
+
+    if args.list:
+        for name in MODELS:
+            print(name + (" (--flag %s)" % "|".join(FLAGS[name]) if name in FLAGS else ""))
+        return 0
+    if not args.models:
+        parser.error("no model given")
+    if (args.flag is not None or args.mcons is not None) and not any(name in FLAGS for name in args.models):
+        parser.error("--flag and --mcons only apply to: " + ", ".join(FLAGS))
+    runs = []
+    for name in args.models:
+        if name not in MODELS:
+            parser.error("unknown model: " + name)
+        if name in FLAGS and args.flag is not None and args.flag not in FLAGS[name]:
+            parser.error("unknown flag for %s: %s" % (name, args.flag))
+        for mcons in (args.mcons or [None]) if name in FLAGS else [None]:
+            runs.append({ 'name' : name, 'flag' : args.flag if name in FLAGS else None, 'mcons' : mcons,
+                          'epigraph' : args.epigraph, 'method' : args.method, 'tol' : args.tol,
+                          'maxiter' : args.maxiter, 'nstarts' : args.nstarts })
+
+    if not args.no_cache:
+        cache.enable()
+    results = run_all(runs, workers=args.workers, timeout=args.timeout, verb=args.verbose)
+    for r in results:
+        r['model'] = r.pop('name', r.get('model'))
+    output = sys.stdout if args.output is None else open(args.output, "w", newline="")
+    try:
+        (to_json if args.format == "json" else to_csv)(results, output)
+    finally:
+        if args.output is not None:
+            output.close()
+    return 0 if all(r['status'] == "done" for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+Compares the solvers (see macros.minimize) on our models: for each model and
+each solver, the wall time, the exponent reached, the success and the maximal
+violation of the constraints. The cache of results is not used. Run:
+    python compare_solvers.py                      # all the models, all the solvers
+    python compare_solvers.py bcj quantum --methods SLSQP trust-constr
+
+The solvers which are not installed (cyipopt for "ipopt") are reported as such,
+and the results which violate the constraints by more than 1e-7 as FAILED
+(see Model.compare). trust-constr reaches the optima of SLSQP on BCJ, HGJ and
+the quantum walk, but fails on the classical model and on the quantum walk
+without the heuristic, where it stops far from the feasible set.
+SLSQP can also be compared without the epigraph reformulation (--no-epigraph),
+but the other solvers need it: the times are not smooth.
+"""
+
+from macros import SOLVERS
+from classical_bcj import model_bcj
+from classical import model_classical
+from quantum_qw import model_quantum
+from quantum_hgj_asymmetric import model_hgj
+import quantum_qw_no_heuristic
+import argparse
+import numpy as np
+
+
+MODELS = {
+    "bcj" : lambda : model_bcj,
+    "classical" : lambda : model_classical,
+    "hgj-classical" : lambda : model_hgj("classical", None, True),
+    "hgj-quantum1" : lambda : model_hgj("quantum1", None, True),
+    "hgj-quantum2" : lambda : model_hgj("quantum2", None, True),
+    "quantum" : lambda : model_quantum,
+    "quantum-no-heuristic" : lambda : quantum_qw_no_heuristic.model_quantum,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the solvers on our models.")
+    parser.add_argument("names", nargs="*", help="the models (default: all): " + ", ".join(MODELS))
+    parser.add_argument("--methods", nargs="+", default=list(SOLVERS), choices=list(SOLVERS))
+    parser.add_argument("--no-epigraph", action="store_true",
+            help="minimize the time itself instead of its epigraph reformulation")
+    args = parser.parse_args()
+    names = args.names or list(MODELS)
+    for name in names:
+        if name not in MODELS:
+            parser.error("unknown model: " + name)
+    with np.errstate(all='ignore'):
+        for name in names:
+            MODELS[name]().compare(args.methods, epigraph=not args.no_epigraph)
+
+
+if __name__ == "__main__":
+    main()
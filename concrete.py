@@ -0,0 +1,353 @@
+"""
+Concrete subset-sum instances, and the list operations of the merging-tree
+algorithms on NumPy arrays, to run the algorithms on concrete instances and
+compare them with our models (see concrete_bcj.py). The runs are limited to n
+of about 24 to 60, far below the bound n <= 128 of the representation below.
+The plan of concrete_bcj.py builds about 2^23.7 elements and pairs at n = 48
+(about 10 seconds), 2^35.5 at n = 80 (about 10 hours at the same rate) and
+2^43.9 at n = 120 (months), with lists of up to 2^38 vectors of 48 bytes at
+n = 120. The time is the limit: concrete_streaming.py spills the lists to
+disk, which bounds the memory but not the number of elements built.
+
+The integers modulo 2^n (n <= 128), i.e. the knapsack weights and the sums
+of subknapsacks, are stored as two uint64 limbs [low, high]: an array of them
+has shape (..., 2). A list of the merging tree is a Vectors: the sums of its
+vectors and their representations as bitmasks (of the "1" and of the "-1", two
+uint64 limbs each as well).
+
+Two lists are merged by sort-and-join: the keys of the right list are sorted
+once, the matching keys of the left list are found by searchsorted, and the
+pairs are examined by chunks. When the sums of both lists are already fixed on
+their k lowest bits, the join only compares the next w bits (see merge).
+"""
+
+import collections
+import itertools
+import numpy as np
+
+
+MAX_N = 128
+
+M64 = (1 << 64) - 1
+
+
+def mask(w):
+    """
+    The uint64 with the w <= 64 lowest bits set.
+    """
+    return np.uint64((1 << w) - 1)
+
+
+#=================================
+# integers modulo 2^n as two limbs
+#====================================
+
+def to_limbs(values):
+    """
+    The array of limbs of the (nonnegative) Python integers values.
+    """
+    return np.array([ [v & M64, v >> 64] for v in values ], dtype=np.uint64).reshape(-1, 2)
+
+
+def from_limbs(x):
+    """
+    The Python integers of the array of limbs x.
+    """
+    return [ int(lo) | (int(hi) << 64) for lo, hi in np.asarray(x).reshape(-1, 2) ]
+
+
+def reduce(x, n):
+    """
+    x modulo 2^n.
+    """
+    lo, hi = x[..., 0], x[..., 1]
+    if n <= 64:
+        return np.stack([lo & mask(n), np.zeros_like(hi)], axis=-1)
+    return np.stack([lo, hi & mask(n - 64)], axis=-1)
+
+
+def add(x, y, n):
+    """
+    x + y modulo 2^n.
+    """
+    # the limbs wrap around modulo 2^64 (which NumPy reports on scalars)
+    with np.errstate(over='ignore'):
+        lo = x[..., 0] + y[..., 0]
+        carry = (lo < x[..., 0]).astype(np.uint64)
+        return reduce(np.stack([lo, x[..., 1] + y[..., 1] + carry], axis=-1), n)
+
+
+def neg(x, n):
+    """
+    -x modulo 2^n.
+    """
+    with np.errstate(over='ignore'):
+        lo = ~x[..., 0] + np.uint64(1)
+        carry = (lo == 0).astype(np.uint64)
+        return reduce(np.stack([lo, ~x[..., 1] + carry], axis=-1), n)
+
+
+def sub(x, y, n):
+    return add(x, neg(y, n), n)
+
+
+def window(x, k, w):
+    """
+    The bits k to k+w-1 of x (w <= 64), as uint64.
+    """
+    lo, hi = x[..., 0], x[..., 1]
+    if w == 0:
+        return np.zeros_like(lo)
+    if k >= 64:
+        v = hi >> np.uint64(k - 64)
+    elif k == 0:
+        v = lo
+    else:
+        v = (lo >> np.uint64(k)) | (hi << np.uint64(64 - k))
+    return v & mask(w)
+
+
+def low_greater(x, t, k):
+    """
+    Whether x mod 2^k > t mod 2^k, for an array x and a single t.
+    """
+    if k == 0:
+        return np.zeros(x.shape[:-1], dtype=bool)
+    low = lambda y : (y[..., 0] & mask(min(k, 64)), y[..., 1] & mask(max(k - 64, 0)))
+    (xl, xh), (tl, th) = low(x), low(t)
+    return (xh > th) | ((xh == th) & (xl > tl))
+
+
+#=================================
+# instances
+#====================================
+
+Instance = collections.namedtuple('Instance', 'n weights target solution')
+Instance.__doc__ = """
+A subset-sum instance modulo 2^n: the weights (limbs), the target (limbs), and
+the planted solution (a 0/1 vector of weight n/2).
+"""
+
+
+def random_instance(n, seed=None):
+    """
+    A random instance of density 1: n weights uniform modulo 2^n, and the sum of
+    a random subset of n//2 of them.
+    """
+    if not 0 < n <= MAX_N:
+        raise ValueError("Invalid n: " + str(n))
+    rng = np.random.default_rng(seed)
+    weights = [ int.from_bytes(rng.bytes(16), "little") % (1 << n) for i in range(n) ]
+    solution = np.zeros(n, dtype=np.int8)
+    solution[rng.choice(n, n//2, replace=False)] = 1
+    target = sum(w for w, e in zip(weights, solution) if e) % (1 << n)
+    return Instance(n, to_limbs(weights), to_limbs([target])[0], solution)
+
+
+def random_residue(rng, bits):
+    """
+    A random integer modulo 2^bits, as limbs.
+    """
+    return to_limbs([ int.from_bytes(rng.bytes(16), "little") % (1 << bits) ])[0]
+
+
+def check_solution(instance, e):
+    """
+    Whether the vector e is a 0/1 solution of the instance.
+    """
+    e = np.asarray(e)
+    if not np.all((e == 0) | (e == 1)):
+        return False
+    total = sum(w for w, t in zip(from_limbs(instance.weights), e) if t)
+    return total % (1 << instance.n) == from_limbs([instance.target])[0]
+
+
+#=================================
+# lists of vectors in {-1,0,1}^n
+#====================================
+
+Vectors = collections.namedtuple('Vectors', 'sums plus minus')
+Vectors.__doc__ = """
+A list of vectors: the sums of the weights (limbs, shape N x 2) and the
+bitmasks of their "1" and of their "-1" (shape N x 2 each).
+"""
+
+
+def concatenate(lists, empty):
+    lists = [ l for l in lists if len(l.sums) ]
+    if not lists:
+        return empty
+    return Vectors(*[ np.concatenate(arrays) for arrays in zip(*lists) ])
+
+
+def empty_vectors():
+    return Vectors(*[ np.zeros((0, 2), dtype=np.uint64) for i in range(3) ])
+
+
+def bitmasks(positions):
+    """
+    The bitmasks (limbs) of the rows of the array of positions.
+    """
+    positions = np.asarray(positions, dtype=np.uint64)
+    bits = np.uint64(1) << (positions % np.uint64(64))
+    zero = np.uint64(0)
+    lo = np.bitwise_or.reduce(np.where(positions < 64, bits, zero), axis=-1, initial=zero)
+    hi = np.bitwise_or.reduce(np.where(positions >= 64, bits, zero), axis=-1, initial=zero)
+    return np.stack([lo, hi], axis=-1)
+
+
+def weight_sums(weights, positions, n):
+    """
+    The sums modulo 2^n of the weights at the positions of each row.
+    """
+    res = np.zeros((positions.shape[0], 2), dtype=np.uint64)
+    for j in range(positions.shape[1]):
+        res = add(res, weights[positions[:, j]], n)
+    return res
+
+
+def combinations(m, k):
+    """
+    The array of the k-subsets of range(m), one per row.
+    """
+    subsets = list(itertools.combinations(range(m), k))
+    return np.array(subsets, dtype=np.intp).reshape(len(subsets), k)
+
+
+def placements(m, counts):
+    """
+    All the ways to place counts[0] digits of a first kind, counts[1] of a
+    second kind... on m positions: the list of the arrays of the positions of
+    each kind, with one row per placement.
+    """
+    if sum(counts) > m:
+        return [ np.zeros((0, c), dtype=np.intp) for c in counts ]
+    res = []
+    # the free positions, for each row
+    rest = np.arange(m, dtype=np.intp)[None, :]
+    for c in counts:
+        C = combinations(rest.shape[1], c)
+        res = [ np.repeat(P, len(C), axis=0) for P in res ]
+        chosen = rest[:, C].reshape(len(rest)*len(C), c)
+        res.append(chosen)
+        taken = np.zeros((len(chosen), m), dtype=bool)
+        taken[np.arange(len(chosen))[:, None], chosen] = True
+        rest = np.repeat(rest, len(C), axis=0)
+        rest = rest[~taken[np.arange(len(rest))[:, None], rest]].reshape(len(rest), rest.shape[1] - c)
+    return res
+
+
+def enumerate_vectors(weights, positions, ones, minus, n):
+    """
+    All the vectors with ones "1" and minus "-1" on the given positions (and 0
+    elsewhere), as a Vectors.
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    P, M = [ positions[Q] for Q in placements(len(positions), [ones, minus]) ]
+    sums = sub(weight_sums(weights, P, n), weight_sums(weights, M, n), n)
+    return Vectors(sums, bitmasks(P), bitmasks(M))
+
+
+# the number of bits set in each byte, for NumPy < 2.0 (no bitwise_count)
+_POPCOUNT8 = np.array([ bin(i).count("1") for i in range(256) ], dtype=np.uint8)
+
+
+def popcount(x):
+    """
+    The number of bits set in each bitmask (limbs).
+    """
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(x).sum(axis=-1, dtype=np.int64)
+    x = np.ascontiguousarray(x, dtype=np.uint64)
+    return _POPCOUNT8[x.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+
+def unique(vectors):
+    """
+    The list without repeated vectors.
+    """
+    if len(vectors.sums) == 0:
+        return vectors
+    keys = np.concatenate([vectors.plus, vectors.minus], axis=1)
+    keys, index = np.unique(keys, axis=0, return_index=True)
+    return Vectors(*[ a[index] for a in vectors ])
+
+
+def join_keys(sums, target, k, w):
+    """
+    The keys on which a left list of sums is joined with a right list, to find
+    the pairs whose sum is target modulo 2^(k+w) when they already add up to
+    target modulo 2^k: only the bits k to k+w-1 (w <= 64) are compared, the
+    keys of the right list being window(sums, k, w). The carry from the lower
+    bits is 1 exactly when the low bits of the left sum are greater than the
+    ones of the target.
+    """
+    if w > 64:
+        raise ValueError("Cannot join on more than 64 bits")
+    carry = low_greater(sums, target, k).astype(np.uint64)
+    return (window(target, k, w) - window(sums, k, w) - carry) & mask(w)
+
+
+def join(left_keys, right_keys, chunk=1 << 20, order=None):
+    """
+    The pairs (i, j) such that left_keys[i] == right_keys[j], as arrays of
+    indices, by chunks of about chunk pairs (more only if one left key has
+    more matches). The right keys are sorted once (order is their argsort, if
+    already known), and the matches of the left keys are found with
+    searchsorted.
+    """
+    if order is None:
+        order = np.argsort(right_keys, kind='stable')
+    sorted_keys = right_keys[order]
+    first = np.searchsorted(sorted_keys, left_keys, 'left')
+    counts = np.searchsorted(sorted_keys, left_keys, 'right') - first
+    total = np.cumsum(counts)
+    if len(total) == 0 or total[-1] == 0:
+        return
+    # the left keys of each chunk
+    bounds = np.unique(np.concatenate([[0], np.searchsorted(total, np.arange(chunk, total[-1], chunk), 'right'),
+            [len(left_keys)]]))
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        c = counts[begin:end]
+        size = int(c.sum())
+        if size == 0:
+            continue
+        i = np.repeat(np.arange(begin, end), c)
+        offsets = np.arange(size) - np.repeat(np.cumsum(c) - c, c)
+        yield i, order[np.repeat(first[begin:end], c) + offsets]
+
+
+def merge_chunks(left, right, target, k, w, n, ones, minus, chunk=1 << 20, stats=None):
+    """
+    The vectors of merge (with repeats), as Vectors by chunks of about chunk
+    pairs joined.
+    """
+    for i, j in join(join_keys(left.sums, target, k, w), window(right.sums, k, w), chunk):
+        pl, ml, pr, mr = left.plus[i], left.minus[i], right.plus[j], right.minus[j]
+        valid = ~np.any((pl & pr) | (ml & mr), axis=1)
+        # 1 + (-1) = 0
+        p = (pl & ~mr) | (pr & ~ml)
+        m = (ml & ~pr) | (mr & ~pl)
+        valid &= (popcount(p) == ones) & (popcount(m) == minus)
+        if stats is not None:
+            stats["pairs"] += len(i)
+            stats["kept"] += int(valid.sum())
+        yield Vectors(add(left.sums[i[valid]], right.sums[j[valid]], n), p[valid], m[valid])
+
+
+def merge(left, right, target, k, w, n, ones, minus, chunk=1 << 20, dedup=True, stats=None):
+    """
+    The vectors eL + eR, for eL in left and eR in right, whose sum is target
+    modulo 2^(k+w), and which have ones "1", minus "-1" and no "2" nor "-2".
+
+    The sums of left and right must already add up to target modulo 2^k (see
+    join_keys).
+
+    @param dedup: remove the repeated vectors (the representations of the same
+    vector), which cannot happen if left and right have disjoint supports.
+    @param stats: if not None, a Counter to which the number of pairs
+    joined ("pairs") and kept ("kept") are added.
+    """
+    res = concatenate(list(merge_chunks(left, right, target, k, w, n, ones, minus, chunk, stats)),
+            empty_vectors())
+    return unique(res) if dedup else res
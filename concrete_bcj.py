@@ -0,0 +1,295 @@
+"""
+Concrete BCJ solver: the merging tree of classical_bcj.py, run on subset-sum
+instances of n of about 24 to 60 (see concrete.py for the lists and merges).
+
+The optimized parameters are scaled to n (see make_plan): the list of level i
+contains the vectors with about alphai*n "-1" whose sum is fixed modulo 2^bi,
+where bi is about ci*n. Each list of level i < 4 is the merge of two lists of
+level i+1, whose targets are a random residue r and (target - r) modulo
+2^b_{i+1}; the bottom lists contain the vectors on the two halves of a random
+partition of the positions. Each run ends with the solutions found, if any,
+and the size of the lists and the number of pairs examined at each level,
+which we compare with the predictions 2^{li*n} of the model:
+>>> instance = random_instance(48, seed=0)
+>>> solution, stats = solve_bcj(instance, verb=True)
+>>> benchmark([24, 32, 40, 48])      # measured exponent vs. 0.289
+
+At these sizes, the polynomial factors which the model neglects are far from
+negligible: the rounding of the numbers of "-1", and above all the split of
+the bottom lists into halves, cost many representations, so that the bits of
+the modular constraints must be lowered and the lists are larger than 2^{li*n}.
+The lists are kept in memory, which limits the runs to n of about 60.
+"""
+
+from concrete import (Vectors, random_instance, random_residue, check_solution, enumerate_vectors, merge, reduce,
+        sub, MAX_N)
+from macros import log2_count, log2_representations, round_to_str
+import collections
+import itertools
+import time as timer
+import numpy as np
+
+
+DEPTH = 4
+
+
+Plan = collections.namedtuple('Plan', 'n bits minus representations log2_sizes success log2_cost log2_keep')
+Plan.__doc__ = """
+The BCJ parameters scaled to n:
+- bits: the numbers of bits b0 = n, b1, b2, b3 of the modular constraints
+- minus: the numbers of "-1" m0 = 0, m1, m2, m3 of each level
+- representations: the log2 of the number of representations of a vector of
+level i-1 by two vectors of level i (which the bottom lists can build, for i = 3)
+- log2_sizes: the log2 of the expected size of the lists of each level 0..4
+- success: the estimated probability that a run finds the solution
+- log2_cost: the log2 of the expected number of elements and pairs built
+until the solution is found (the cost of a run over success)
+- log2_keep: the log2 of the probability that a vector of a bottom list is
+kept (0: the bottom lists are complete; below 0 with a memory constraint, see
+bcj_parameters).
+"""
+
+
+def bcj_parameters(mcons=None):
+    """
+    The optimal parameters of classical_bcj.py (a set_bcj), or with the memory
+    constraint mcons, the ones of classical_bcj.model_bcj_memory (a
+    set_bcj_memory): the lists are smaller, the bottom ones are sampled, and
+    the runs are repeated 2^{r n} times.
+    """
+    from classical_bcj import model_bcj, model_bcj_memory
+    model = model_bcj if mcons is None else model_bcj_memory(mcons)
+    with np.errstate(all='ignore'):
+        result = model.solve(epigraph=mcons is not None)
+    return model.astuple(result.x)
+
+
+def _scale(n, x, minus, slack):
+    weights = [ (n//2) >> i for i in range(DEPTH) ]
+    level = lambda i, weight : (weight + minus[i], minus[i])
+    o, m = level(DEPTH - 1, weights[DEPTH - 1])
+    bottom = float(log2_count(n//2, o//2, m//2) + log2_count(n - n//2, o - o//2, m - m//2))/2
+    # with a memory constraint, the bottom lists are sampled down to 2^{l4 n}
+    # vectors, and the runs are repeated 2^{r n} times
+    repeats = getattr(x, 'r', 0.)*n
+    keep = min(0., x.l4*n - bottom) if hasattr(x, 'r') else 0.
+    representations = [0.]
+    for i in range(1, DEPTH):
+        left, right = level(i, weights[i]), level(i, weights[i-1] - weights[i])
+        r = log2_representations(n, level(i-1, weights[i-1]), left, right)
+        if i == DEPTH - 1:
+            # both vectors must split into the halves of the bottom lists, and
+            # their two halves must be kept
+            for o, m in [left, right]:
+                r += (log2_count(n//2, o//2, m//2) + log2_count(n - n//2, o - o//2, m - m//2)
+                        - log2_count(n, o, m)) + 2*keep
+        representations.append(float(r))
+    bits = [n]
+    for i, (c, r) in enumerate(zip([x.c1, x.c2, x.c3], representations[1:])):
+        # the missing representations of level 1 are paid by the repetitions
+        r += repeats if i == 0 else 0
+        bits.append(int(min(bits[-1], max(0, round(c*n)), max(0, np.floor(r - slack)))))
+
+    sizes = [0.] + [ float(log2_count(n, *level(i, weights[i])) - bits[i]) for i in range(1, DEPTH) ]
+    sizes.append(bottom + keep)
+    # the lists of level 3 only have the vectors which split into the halves
+    sizes[DEPTH - 1] = 2*sizes[DEPTH] - bits[DEPTH - 1]
+    # 2^i lists at level i, each one merged from two lists of level i+1
+    pairs = [ 2*sizes[i+1] - (bits[i] - (bits[i+1] if i + 1 < DEPTH else 0)) for i in range(DEPTH) ]
+    cost = np.log2(sum(2.**(i + sizes[i]) for i in range(DEPTH + 1)) + sum(2.**(i + pairs[i]) for i in range(DEPTH)))
+    # a vector of level i-1 is found if one of its representations is, and the
+    # number of representations found is about Poisson
+    success = 1.
+    for i in range(DEPTH - 1, 0, -1):
+        success = 1 - np.exp(-2.**(representations[i] - bits[i])*success**2)
+    return Plan(n, bits, list(minus), representations, sizes, float(success), float(cost - np.log2(success)),
+            float(keep))
+
+
+def make_plan(n, x=None, slack=1):
+    """
+    Scales the parameters x of classical_bcj.py (default: the optimal ones, see
+    bcj_parameters) to n.
+
+    At small n, the rounding of the numbers of "1" and "-1" and the split of
+    the bottom lists into halves leave fewer representations than predicted by
+    the model: each bi is then lowered so that 2^slack representations of level
+    i are expected to remain (a representation remains only if both its
+    vectors remain at the level below, so one is not enough). The numbers of
+    "-1" are the floors or ceilings of alphai*n with the smallest largest list
+    (the memory of a run), then the smallest cost.
+    """
+    if not 0 < n <= MAX_N:
+        raise ValueError("Invalid n: " + str(n))
+    if x is None:
+        x = bcj_parameters()
+    near = lambda alpha : sorted({ int(np.floor(alpha*n)), int(np.ceil(alpha*n)) })
+    plans = []
+    for minus in itertools.product(*[ near(alpha) for alpha in [x.alpha1, x.alpha2, x.alpha3] ]):
+        minus = (0,) + minus
+        # coherence of the -1: the two vectors below must have all of them
+        if all(2*minus[i+1] >= minus[i] for i in range(DEPTH - 1)):
+            plans.append(_scale(n, x, minus, slack))
+    plan = min(plans, key=lambda plan : (round(max(plan.log2_sizes)), plan.log2_cost))
+    widths = [ plan.bits[i] - plan.bits[i+1] for i in range(DEPTH - 1) ] + [plan.bits[-1]]
+    if max(widths) > 64:
+        raise ValueError("Modular constraints of more than 64 bits for n = %i: %s" % (n, widths))
+    return plan
+
+
+def vector(plus, minus, n):
+    """
+    The vector in {-1,0,1}^n of the bitmasks (limbs) plus and minus.
+    """
+    bits = lambda mask : np.unpackbits(np.asarray(mask, dtype='<u8').view(np.uint8), bitorder='little')[:n]
+    return bits(plus).astype(np.int8) - bits(minus).astype(np.int8)
+
+
+class BCJSolver:
+    """
+    One run of the BCJ merging tree on an instance, with random residues.
+
+    @param plan: the scaled parameters (see make_plan).
+    @param chunk: the number of pairs examined at once by the merges.
+    """
+
+    def __init__(self, instance, plan, rng, chunk=1 << 20):
+        self.instance = instance
+        self.plan = plan
+        self.rng = rng
+        self.chunk = chunk
+        # per level: the sizes of the lists, the pairs examined
+        self.sizes = [ [] for i in range(DEPTH + 1) ]
+        self.pairs = [ collections.Counter() for i in range(DEPTH) ]
+
+    def sample(self, vectors):
+        """
+        The vectors of a bottom list which are kept (see Plan.log2_keep).
+        """
+        if self.plan.log2_keep >= 0:
+            return vectors
+        kept = self.rng.random(len(vectors.sums)) < 2.**self.plan.log2_keep
+        return Vectors(*[ a[kept] for a in vectors ])
+
+    def build(self, i, target, weight):
+        """
+        The list of level i: vectors with weight + m_i "1" and m_i "-1" whose
+        sum is target modulo 2^{b_i}.
+        """
+        plan = self.plan
+        n = plan.n
+        ones, minus = weight + plan.minus[i], plan.minus[i]
+        if i == DEPTH - 1:
+            # the halves are random, so that the vectors of the upper levels do
+            # not all need the same number of "1" on the same half; an odd
+            # number of "1" or "-1" goes to either half at random
+            positions = self.rng.permutation(n)
+            a, b = (ones + self.rng.integers(2))//2, (minus + self.rng.integers(2))//2
+            weights = self.instance.weights
+            left = self.sample(enumerate_vectors(weights, positions[:n//2], a, b, n))
+            right = self.sample(enumerate_vectors(weights, positions[n//2:], ones - a, minus - b, n))
+            self.sizes[DEPTH] += [ len(left.sums), len(right.sums) ]
+            k = 0
+        else:
+            k = plan.bits[i+1]
+            r = random_residue(self.rng, k)
+            left = self.build(i + 1, r, weight//2)
+            right = self.build(i + 1, reduce(sub(target, r, n), k), weight - weight//2)
+        # the bottom lists have disjoint supports: no vector is repeated
+        res = merge(left, right, target, k, plan.bits[i] - k, n, ones, minus, chunk=self.chunk,
+                dedup=i < DEPTH - 1, stats=self.pairs[i])
+        self.sizes[i].append(len(res.sums))
+        return res
+
+    def run(self):
+        """
+        Returns the solutions found (vectors in {0,1}^n).
+        """
+        n = self.plan.n
+        res = self.build(0, self.instance.target, n//2)
+        solutions = [ vector(p, m, n) for p, m in zip(res.plus, res.minus) ]
+        return [ e for e in solutions if check_solution(self.instance, e) ]
+
+
+def _stats(solvers, plan, x, seconds):
+    n = plan.n
+    levels = []
+    for i in range(DEPTH + 1):
+        sizes = [ s for solver in solvers for s in solver.sizes[i] ]
+        predicted = 0. if i == 0 else getattr(x, "l%i" % i)*n
+        pairs = sum(solver.pairs[i]["pairs"] for solver in solvers) if i < DEPTH else 0
+        levels.append({ 'level' : i, 'lists' : len(sizes),
+                        'log2_size' : float(np.mean(np.log2(np.maximum(sizes, 1)))) if sizes else None,
+                        'log2_planned' : plan.log2_sizes[i], 'log2_predicted' : predicted,
+                        'log2_pairs' : float(np.log2(max(pairs, 1))) })
+    return { 'n' : n, 'runs' : len(solvers), 'seconds' : seconds, 'bits' : plan.bits,
+             'minus' : plan.minus, 'levels' : levels }
+
+
+def solve_bcj(instance, x=None, tries=20, seed=None, chunk=1 << 20, verb=False):
+    """
+    Runs the BCJ merging tree on the instance, with new random residues until a
+    solution is found, at most tries times.
+
+    @param x: the parameters of classical_bcj.py (default: the optimal ones).
+    Returns the solution (or None) and the statistics of the runs: for each
+    level, the mean of the log2 sizes of the lists, compared with the one
+    expected by the plan (see make_plan) and with li*n, and the log2 of the
+    number of pairs examined by the merges.
+    """
+    if x is None:
+        x = bcj_parameters()
+    plan = make_plan(instance.n, x)
+    rng = np.random.default_rng(seed)
+    solvers = []
+    solution = None
+    begin = timer.perf_counter()
+    for t in range(tries):
+        solver = BCJSolver(instance, plan, rng, chunk)
+        solvers.append(solver)
+        solutions = solver.run()
+        if solutions:
+            solution = solutions[0]
+            break
+    stats = _stats(solvers, plan, x, timer.perf_counter() - begin)
+    if verb:
+        print("n = %i, bits %s, minus %s: %s after %i runs (%.2fs)" % (instance.n, plan.bits, plan.minus,
+                "solved" if solution is not None else "not solved", len(solvers), stats['seconds']))
+        for level in stats['levels']:
+            print("   level %i: log2 size %s (plan %s, model %s), log2 pairs %s" % (level['level'],
+                    "-" if level['log2_size'] is None else round_to_str(level['log2_size']),
+                    round_to_str(level['log2_planned']), round_to_str(level['log2_predicted']),
+                    round_to_str(level['log2_pairs'])))
+    return solution, stats
+
+
+def benchmark(ns, instances=3, x=None, tries=20, verb=True):
+    """
+    Solves random instances for each n of ns, and fits the exponent of the time:
+    log2(seconds) ~ a*n + b. Returns the list of (n, success rate, mean
+    seconds, log2 of the cost expected by the plan) and a, to compare with the
+    exponent of the model.
+    """
+    from classical_bcj import classical_time_bcj
+    if x is None:
+        x = bcj_parameters()
+    rows = []
+    for n in ns:
+        results = [ solve_bcj(random_instance(n, seed), x, tries, seed) for seed in range(instances) ]
+        success = np.mean([ solution is not None for solution, stats in results ])
+        seconds = np.mean([ stats['seconds'] for solution, stats in results ])
+        rows.append((n, float(success), float(seconds), make_plan(n, x).log2_cost))
+        if verb:
+            print("n = %i: success %.2f, %.3fs (planned cost 2^%.1f)" % rows[-1])
+    fit = lambda values : float(np.polyfit([ row[0] for row in rows ], values, 1)[0]) if len(rows) > 1 else np.nan
+    slope = fit(np.log2([ row[2] for row in rows ]))
+    if verb:
+        print("Measured exponent: %s (planned %s, model %s)" % (round_to_str(slope),
+                round_to_str(fit([ row[3] for row in rows ])), round_to_str(classical_time_bcj(x))))
+    return rows, slope
+
+
+if __name__ == "__main__":
+    print("=========== CONCRETE BCJ ALGORITHM ===========")
+    solve_bcj(random_instance(48, seed=0), verb=True)
+    benchmark([24, 32, 40, 48, 56], instances=2)
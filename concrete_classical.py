@@ -0,0 +1,429 @@
+"""
+Concrete solver with {-1,0,1,2} representations: the 5-level merging tree of
+classical.py, run on subset-sum instances (see concrete.py and concrete_bcj.py
+for the BCJ tree).
+
+The optimized parameters are scaled to n as in concrete_bcj.py (see
+make_plan): a vector of level i has about alphai*n "-1" and gammai*n "2", and
+the lists of level i have their sums fixed modulo 2^bi, where bi is about
+ci*n. Each merge counts the pairs which match on the modular constraint and
+the ones which are representations of the level above, to compare with the
+filtering probabilities pi of the model (computed by p_good_2):
+>>> instance = random_instance(40, seed=0)
+>>> solution, stats = solve_classical(instance, verb=True)
+
+A list stores its vectors as packed digits, two per byte (the nibble of a
+digit d is d + 2), and their sums as the two uint64 limbs of concrete.py: the
+sums of n of about 100 bits do not fit in an int64. The digits of two vectors
+are added in one uint8 addition per byte, without carries between the
+nibbles (see add_digits).
+
+The merges are streamed: a merge only keeps its right list in memory, sorted
+by its keys, and joins the left list chunk by chunk as it is produced by the
+merges below; the level-0 merge stops at the first solution. Only one list
+per level is then in memory at a time. This does not change the limits of
+concrete.py: the largest list has about 2^{0.283n} elements of n/2 + 16
+bytes, e.g. about 20 GB at n = 100, and the runs are limited to n of about
+24 to 60.
+"""
+
+from concrete import (random_instance, random_residue, check_solution, placements, weight_sums, join_keys, join,
+        window, add, sub, reduce, MAX_N)
+from macros import PAIRS, KINDS, log2_multinomial, log2_representations, round_to_str
+import collections
+import itertools
+import time as timer
+import numpy as np
+
+
+DEPTH = 4
+
+# the gammai of the optimum which are at their bound 0 are only 0 up to the
+# accuracy of the solver (e.g. gamma3 is about 2e-8)
+ZERO = 1e-6
+
+#=================================
+# packed digit vectors
+#====================================
+
+Digits = collections.namedtuple('Digits', 'sums digits')
+Digits.__doc__ = """
+A list of vectors of {-1,0,1,2}^n: their sums (limbs, shape N x 2) and their
+packed digits (uint8, shape N x ceil(n/2)).
+"""
+
+
+def pack(D):
+    """
+    The packed digits of the vectors of digits D (shape N x n).
+    """
+    D = np.asarray(D, dtype=np.int8)
+    if D.shape[1] % 2:
+        D = np.concatenate([D, np.zeros((len(D), 1), dtype=np.int8)], axis=1)
+    e = (D + 2).astype(np.uint8)
+    return e[:, 0::2] | (e[:, 1::2] << 4)
+
+
+def nibbles(P):
+    """
+    The nibbles (digit + 2) of the packed digits P, as uint8 of shape N x 2*bytes.
+    """
+    res = np.empty((len(P), 2*P.shape[1]), dtype=np.uint8)
+    res[:, 0::2], res[:, 1::2] = P & 15, P >> 4
+    return res
+
+
+def unpack(P, n):
+    return nibbles(P)[:, :n].astype(np.int8) - 2
+
+
+def add_digits(P, Q):
+    """
+    The packed digits of the sums of the vectors P and Q. A nibble of P + Q is
+    dP + dQ + 4 in [2, 8]: subtracting 2 gives the nibble of dP + dQ in [0, 6]
+    without any borrow or carry.
+    """
+    return P + Q - np.uint8(0x22)
+
+
+def empty_digits(n):
+    return Digits(np.zeros((0, 2), dtype=np.uint64), np.zeros((0, (n + 1)//2), dtype=np.uint8))
+
+
+def concatenate(lists, n):
+    lists = [ l for l in lists if len(l.sums) ]
+    if not lists:
+        return empty_digits(n)
+    return Digits(np.concatenate([ l.sums for l in lists ]), np.concatenate([ l.digits for l in lists ]))
+
+
+def unique(vectors):
+    """
+    The list without repeated vectors.
+    """
+    if len(vectors.sums) < 2:
+        return vectors
+    rows = np.ascontiguousarray(vectors.digits).view(np.dtype((np.void, vectors.digits.shape[1])))[:, 0]
+    rows, index = np.unique(rows, return_index=True)
+    return Digits(vectors.sums[index], vectors.digits[index])
+
+
+def enumerate_digits(weights, positions, counts, n):
+    """
+    All the vectors with counts = (ones, minus, twos) "1", "-1" and "2" on the
+    given positions (and 0 elsewhere), as a Digits.
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    P, M, T = [ positions[Q] for Q in placements(len(positions), counts) ]
+    D = np.zeros((len(P), n), dtype=np.int8)
+    rows = np.arange(len(P))[:, None]
+    D[rows, P], D[rows, M], D[rows, T] = 1, -1, 2
+    twice = weight_sums(weights, T, n)
+    sums = sub(add(weight_sums(weights, P, n), add(twice, twice, n), n), weight_sums(weights, M, n), n)
+    return Digits(sums, pack(D))
+
+
+def merge_stream(left_chunks, right, target, k, w, n, counts, chunk=1 << 20, stats=None):
+    """
+    The vectors eL + eR, for eL in the chunks of left_chunks and eR in right,
+    whose sum is target modulo 2^(k+w) and which have counts = (ones, minus,
+    twos) "1", "-1" and "2", chunk by chunk (without repeated vectors in a
+    chunk). The sums of the left and right lists must already add up to
+    target modulo 2^k (see concrete.join_keys).
+
+    @param stats: if not None, a Counter to which the number of pairs
+    joined ("pairs") and kept ("kept") are added.
+    """
+    ones, minus, twos = counts
+    keys = window(right.sums, k, w)
+    order = np.argsort(keys, kind='stable')
+    for left in left_chunks:
+        for i, j in join(join_keys(left.sums, target, k, w), keys, chunk, order):
+            digits = add_digits(left.digits[i], right.digits[j])
+            e = nibbles(digits)[:, :n]
+            valid = np.all((e >= 1) & (e <= 4), axis=1)
+            valid &= ((e == 3).sum(axis=1) == ones) & ((e == 1).sum(axis=1) == minus) & ((e == 4).sum(axis=1) == twos)
+            if stats is not None:
+                stats["pairs"] += len(i)
+                stats["kept"] += int(valid.sum())
+            if valid.any():
+                yield unique(Digits(add(left.sums[i[valid]], right.sums[j[valid]], n), digits[valid]))
+
+
+#=================================
+# scaling of the parameters
+#====================================
+
+Plan = collections.namedtuple('Plan', 'n bits digits representations log2_sizes success log2_cost')
+Plan.__doc__ = """
+The parameters of classical.py scaled to n (as in concrete_bcj.Plan):
+- bits: the numbers of bits b0 = n, b1, b2, b3 of the modular constraints
+- digits: the numbers of "1", "-1" and "2" of the vectors of the leftmost
+lists of each level 0..3
+- representations: the log2 of the number of representations of a vector of
+level i-1 by two vectors of level i (which the bottom lists can build, for i = 3)
+- log2_sizes: the log2 of the expected size of the lists of each level 0..4
+- success: the estimated probability that a run finds the solution
+- log2_cost: the log2 of the expected number of elements and pairs built
+until the solution is found.
+"""
+
+
+def classical_parameters():
+    """
+    The optimal parameters of classical.py (a set_classical).
+    """
+    from classical import model_classical
+    with np.errstate(all='ignore'):
+        result = model_classical.solve(epigraph=True)
+    return model_classical.astuple(result.x)
+
+
+def level_digits(weight, minus, twos):
+    """
+    The numbers of "1", "-1" and "2" of a vector of the given weight (its sum
+    of digits).
+    """
+    return (weight + minus - 2*twos, minus, twos)
+
+
+def halves(n, counts):
+    """
+    The numbers of digits of the two halves of a bottom vector (an odd number
+    goes to the right half).
+    """
+    left = tuple(c//2 for c in counts)
+    return left, tuple(c - l for c, l in zip(counts, left))
+
+
+def _scale(n, x, minus, twos, slack):
+    weights = [ (n//2) >> i for i in range(DEPTH) ]
+    level = lambda i, weight : level_digits(weight, minus[i], twos[i])
+    representations = [0.]
+    for i in range(1, DEPTH):
+        left, right = level(i, weights[i]), level(i, weights[i-1] - weights[i])
+        r = log2_representations(n, level(i-1, weights[i-1]), left, right)
+        if i == DEPTH - 1:
+            # both vectors must split into the halves of the bottom lists
+            for counts in [left, right]:
+                a, b = halves(n, counts)
+                r += log2_multinomial(n//2, a) + log2_multinomial(n - n//2, b) - log2_multinomial(n, counts)
+        representations.append(float(r))
+    bits = [n]
+    for c, r in zip([x.c1, x.c2, x.c3], representations[1:]):
+        bits.append(int(min(bits[-1], max(0, round(c*n)), max(0, np.floor(r - slack)))))
+
+    a, b = halves(n, level(DEPTH - 1, weights[DEPTH - 1]))
+    sizes = [0.] + [ float(log2_multinomial(n, level(i, weights[i])) - bits[i]) for i in range(1, DEPTH) ]
+    sizes.append(float(log2_multinomial(n//2, a) + log2_multinomial(n - n//2, b))/2)
+    # the lists of level 3 only have the vectors which split into the halves
+    sizes[DEPTH - 1] = 2*sizes[DEPTH] - bits[DEPTH - 1]
+    pairs = [ 2*sizes[i+1] - (bits[i] - (bits[i+1] if i + 1 < DEPTH else 0)) for i in range(DEPTH) ]
+    cost = np.log2(sum(2.**(i + sizes[i]) for i in range(DEPTH + 1)) + sum(2.**(i + pairs[i]) for i in range(DEPTH)))
+    success = 1.
+    for i in range(DEPTH - 1, 0, -1):
+        success = 1 - np.exp(-2.**(representations[i] - bits[i])*success**2)
+    digits = [ level(i, weights[i]) for i in range(DEPTH) ]
+    with np.errstate(divide='ignore'):
+        return Plan(n, bits, digits, representations, sizes, float(success), float(cost - np.log2(success)))
+
+
+def model_twos(n, x):
+    """
+    The numbers of "2" of the levels 1, 2, 3 that the parameters x call for:
+    gammai*n rounded up, or 0 if gammai is 0 (below ZERO).
+    """
+    return tuple(int(np.ceil(t*n)) if t > ZERO else 0 for t in [x.gamma1, x.gamma2, x.gamma3])
+
+
+def make_plan(n, x=None, slack=1, twos=None):
+    """
+    Scales the parameters x of classical.py (default: the optimal ones) to n,
+    as concrete_bcj.make_plan: the bits are lowered to the representations
+    which remain at n, and the numbers of "-1" are the floors or ceilings of
+    alphai*n with the smallest largest list, then the smallest cost.
+
+    @param twos: the numbers of "2" of the levels 1, 2, 3. By default, the
+    ones of the model (see model_twos), e.g. (1, 1, 0) at the optimum for the
+    n we can run. With twos="best", they are also the floors or ceilings of
+    gammai*n which give the best plan: at these n, gammai*n is below 1, and
+    this plan has no "2" at all (it is a BCJ tree).
+
+    The "2" have few representations at these n, so that the lists are
+    smaller than planned and the runs succeed less often than estimated: on
+    random_instance(48, seed=0), the plan with the "2" of the model finds no
+    solution in 20 runs, the one with twos="best" finds it in the first run.
+    """
+    if not 0 < n <= MAX_N:
+        raise ValueError("Invalid n: " + str(n))
+    if x is None:
+        x = classical_parameters()
+    near = lambda t : sorted({ int(np.floor(t*n)), int(np.ceil(t*n)) })
+    params = [ x.alpha1, x.alpha2, x.alpha3, x.gamma1, x.gamma2, x.gamma3 ]
+    weights = [ (n//2) >> i for i in range(DEPTH) ]
+    plans = []
+    choices = [ near(t) for t in params ]
+    if twos is None:
+        twos = model_twos(n, x)
+    if twos != "best":
+        choices[3:] = [ [t] for t in twos ]
+    for counts in itertools.product(*choices):
+        minus, doubles = (0,) + counts[:3], (0,) + counts[3:]
+        if any(level_digits(weights[i], minus[i], doubles[i])[0] < 0 for i in range(DEPTH)):
+            continue
+        plan = _scale(n, x, minus, doubles, slack)
+        if np.all(np.isfinite(plan.representations)):
+            plans.append(plan)
+    if not plans:
+        raise ValueError("No representations for n = %i with the numbers of \"2\" %s" % (n, twos))
+    plan = min(plans, key=lambda plan : (round(max(plan.log2_sizes)), plan.log2_cost))
+    widths = [ plan.bits[i] - plan.bits[i+1] for i in range(DEPTH - 1) ] + [plan.bits[-1]]
+    if max(widths) > 64:
+        raise ValueError("Modular constraints of more than 64 bits for n = %i: %s" % (n, widths))
+    return plan
+
+
+#=================================
+# the merging tree
+#====================================
+
+class ClassicalSolver:
+    """
+    One run of the {-1,0,1,2} merging tree on an instance, with random
+    residues, streamed (see the module docstring).
+
+    @param plan: the scaled parameters (see make_plan).
+    @param chunk: the number of pairs examined at once by the merges.
+    """
+
+    def __init__(self, instance, plan, rng, chunk=1 << 20):
+        self.instance = instance
+        self.plan = plan
+        self.rng = rng
+        self.chunk = chunk
+        # per level: the sizes of the lists, the pairs examined and kept
+        self.sizes = [ [] for i in range(DEPTH + 1) ]
+        self.pairs = [ collections.Counter() for i in range(DEPTH) ]
+
+    def counts(self, i, weight):
+        plan = self.plan
+        return level_digits(weight, plan.digits[i][1], plan.digits[i][2])
+
+    def bottom(self, counts):
+        """
+        The bottom lists below a list of level 3: the vectors on the two halves
+        of a random partition of the positions. An odd number of digits goes
+        to either half at random.
+        """
+        n = self.plan.n
+        positions = self.rng.permutation(n)
+        a = tuple((c + self.rng.integers(2))//2 for c in counts)
+        b = tuple(c - t for c, t in zip(counts, a))
+        weights = self.instance.weights
+        left = enumerate_digits(weights, positions[:n//2], a, n)
+        right = enumerate_digits(weights, positions[n//2:], b, n)
+        self.sizes[DEPTH] += [ len(left.sums), len(right.sums) ]
+        return left, right
+
+    def stream(self, i, target, weight):
+        """
+        The list of level i: vectors of the given weight whose sum is target
+        modulo 2^{b_i}, chunk by chunk.
+        """
+        plan = self.plan
+        n = plan.n
+        counts = self.counts(i, weight)
+        if i == DEPTH - 1:
+            left, right = self.bottom(counts)
+            k, chunks = 0, [left]
+        else:
+            k = plan.bits[i+1]
+            r = random_residue(self.rng, k)
+            # the right list is kept, the left one is streamed
+            right = unique(concatenate(self.stream(i + 1, reduce(sub(target, r, n), k), weight - weight//2), n))
+            chunks = self.stream(i + 1, r, weight//2)
+        size = 0
+        for res in merge_stream(chunks, right, target, k, plan.bits[i] - k, n, counts, self.chunk, self.pairs[i]):
+            size += len(res.sums)
+            yield res
+        if i > 0:
+            self.sizes[i].append(size)
+
+    def run(self):
+        """
+        Returns a solution (a vector of {0,1}^n), or None.
+        """
+        n = self.plan.n
+        for res in self.stream(0, self.instance.target, n//2):
+            for e in unpack(res.digits, n):
+                if check_solution(self.instance, e):
+                    return e
+        return None
+
+
+def _stats(solvers, plan, x, seconds):
+    n = plan.n
+    levels = []
+    for i in range(DEPTH + 1):
+        sizes = [ s for solver in solvers for s in solver.sizes[i] ]
+        pairs = sum(solver.pairs[i]["pairs"] for solver in solvers) if i < DEPTH else 0
+        kept = sum(solver.pairs[i]["kept"] for solver in solvers) if i < DEPTH else 0
+        levels.append({ 'level' : i, 'lists' : len(sizes),
+                        'log2_size' : float(np.mean(np.log2(np.maximum(sizes, 1)))) if sizes else None,
+                        'log2_planned' : plan.log2_sizes[i],
+                        'log2_predicted' : 0. if i == 0 else getattr(x, "l%i" % i)*n,
+                        'log2_pairs' : float(np.log2(max(pairs, 1))),
+                        # the filtering probability, against pi*n
+                        'log2_filtering' : float(np.log2(kept/pairs)) if kept else None,
+                        'log2_filtering_predicted' : getattr(x, "p%i" % i)*n if i < DEPTH - 1 else None })
+    return { 'n' : n, 'runs' : len(solvers), 'seconds' : seconds, 'bits' : plan.bits,
+             'digits' : plan.digits, 'levels' : levels }
+
+
+def solve_classical(instance, x=None, tries=20, seed=None, chunk=1 << 20, twos=None, verb=False):
+    """
+    Runs the {-1,0,1,2} merging tree on the instance, with new random residues
+    until a solution is found, at most tries times.
+
+    @param x: the parameters of classical.py (default: the optimal ones).
+    @param twos: the numbers of "2" of the levels 1, 2, 3, or "best" (see
+    make_plan). By default, the ones of the model.
+    Returns the solution (or None) and the statistics of the runs: for each
+    level, the mean of the log2 sizes of the lists, compared with the plan
+    and with li*n, the log2 of the number of pairs examined by the merges, and
+    the log2 of the proportion of them which are representations of the level
+    above, compared with pi*n.
+    """
+    if x is None:
+        x = classical_parameters()
+    plan = make_plan(instance.n, x, twos=twos)
+    rng = np.random.default_rng(seed)
+    solvers = []
+    solution = None
+    begin = timer.perf_counter()
+    for t in range(tries):
+        solver = ClassicalSolver(instance, plan, rng, chunk)
+        solvers.append(solver)
+        solution = solver.run()
+        if solution is not None:
+            break
+    stats = _stats(solvers, plan, x, timer.perf_counter() - begin)
+    if verb:
+        print("n = %i, bits %s, digits %s: %s after %i runs (%.2fs)" % (instance.n, plan.bits, plan.digits,
+                "solved" if solution is not None else "not solved", len(solvers), stats['seconds']))
+        show = lambda t : "-" if t is None else round_to_str(t)
+        for level in stats['levels']:
+            print("   level %i: log2 size %s (plan %s, model %s), log2 pairs %s, filtering %s (model %s)" % (
+                    level['level'], show(level['log2_size']), round_to_str(level['log2_planned']),
+                    round_to_str(level['log2_predicted']), round_to_str(level['log2_pairs']),
+                    show(level['log2_filtering']), show(level['log2_filtering_predicted'])))
+    return solution, stats
+
+
+if __name__ == "__main__":
+    print("=========== CONCRETE {-1,0,1,2} ALGORITHM ===========")
+    for n in [32, 40]:
+        solve_classical(random_instance(n, seed=0), verb=True)
+    print("=========== WITHOUT \"2\" ===========")
+    for n in [32, 40, 48]:
+        solve_classical(random_instance(n, seed=0), twos="best", verb=True)
@@ -0,0 +1,550 @@
+"""
+Classical simulation of the data structure of the quantum walks of
+quantum_qw.py (heuristic, 6 levels) and quantum_qw_no_heuristic.py (5 levels),
+to check their update costs on concrete vertices of the Johnson graph:
+>>> simulate(60, heuristic=True, updates=10**5, verb=True)
+>>> simulate(60, heuristic=True, updates=10**6, batch=10**4, verb=True)
+
+A vertex of the walk is a set of bottom lists of 2^{l4*n} elements. The
+merging tree above it is maintained incrementally while the walk moves: an
+update swaps one element of a bottom list for a new one, which deletes the
+elements of the upper levels built from the old element, and inserts the ones
+built from the new element. Each list is indexed by the residue of the
+modular constraint of the merge above it, so that the partners of an element
+are found in one dictionary lookup; the simulator counts, per level and per
+update, the partners examined (the matches before filtering), and the
+elements inserted and deleted.
+
+The elements are random modular sums: a bottom element has a random sum (with
+the c4*n low bits of its list fixed, in the heuristic case, where the level-4
+lists stand for the merges of the lists l5l of the vertex with the complete
+lists l5r), the sum of a pair is the sum of its elements, and a pair which
+matches the constraint of level i is kept with probability 2^{pi*n}, as the
+filtering of the representations is modeled.
+
+The model bounds the update by one element per level: the constraints l4 >=
+l3 >= l2 >= l1 make the expected number of elements of level i which contain
+a bottom element 2^{(li - l4)n} <= 1. The simulator reports how many updates
+change more than one element of a level (an "update explosion").
+
+WalkTree applies the updates one at a time, in Python, BatchWalkTree by
+batches, in NumPy. Measured at n = 60 (updates per second):
+
+                   WalkTree   BatchWalkTree (batches of 10^4)
+    heuristic      1.1e4      0.9e5 - 1.0e5
+    no heuristic   3.1e4      1.9e5 - 2.0e5
+
+This is an order of magnitude short of millions of updates per second. A
+batch costs a pass over all the lists of the tree, so it must be large to pay
+for it, yet small compared to the bottom lists (2^{l4*n} elements, about 10^4
+at n = 60): larger batches change most of a vertex at once and no longer
+simulate a walk. Going further needs a compiled inner loop, which this
+repository does not have.
+"""
+
+from concrete import join
+from macros import round_to_str
+import collections
+import random
+import time as timer
+import numpy as np
+
+
+DEPTH = 4
+
+
+Spec = collections.namedtuple('Spec', 'sizes bits filters')
+Spec.__doc__ = """
+The exponents of a merging tree of depth 4: the log2 sizes l0..l4 of its lists
+over n, the numbers of bits c0 = 1, c1..c3 of their modular constraints and c4
+of the bottom lists (0 without heuristic) over n, and the log2 filtering
+probabilities p0..p3 of the merges of each level over n (p3 = 0 without
+heuristic).
+"""
+
+
+def make_spec(x, heuristic=True):
+    """
+    The Spec of the parameters x of quantum_qw.py (heuristic) or
+    quantum_qw_no_heuristic.py.
+
+    The heuristic tree has 6 levels, folded into DEPTH = 4 here: its lists of
+    level 4 are the merges, on c4*n bits, of the lists l5l of the vertex (2^{l4
+    n} elements) with the complete lists l5r (2^{c4 n} elements, which do not
+    change during the walk). Each element of l5l has one partner in l5r on
+    average, so a list of level 4 is simulated directly as the 2^{l4 n}
+    elements of the vertex, with their c4*n low bits fixed. The number of
+    partners in l5r is about Poisson, which the folding leaves out: the
+    simulated lists of level 4 have exactly 2^{l4 n} elements, and an update
+    changes exactly one of them.
+    """
+    sizes = [x.l0, x.l1, x.l2, x.l3, x.l4]
+    if heuristic:
+        return Spec(sizes, [1., x.c1, x.c2, x.c3, x.c4], [x.p0, x.p1, x.p2, x.p3])
+    return Spec(sizes, [1., x.c1, x.c2, x.c3, 0.], [x.p0, x.p1, x.p2, 0.])
+
+
+def model_update(x, heuristic=True):
+    """
+    The update term of quantum_time (heuristic) or of
+    quantum_time_without_heuristic.
+    """
+    if heuristic:
+        return max(0, (x.l4 - (x.c3 - x.c4))/2, (x.l3 - (x.c2 - x.c3))/2, (x.l2 - (x.c1 - x.c2))/2,
+                (x.l1 - (1 - x.c1))/2)
+    time2 = max(x.l3 - (x.c2-x.c3),0)
+    elts2 = max(x.l3 - (x.c2-x.c3) + x.p2/2, 0)
+    time1 = max(x.l2 - (x.c1-x.c2),0)
+    elts1 = max(x.l2 - (x.c1-x.c2) + x.p1/2, 0)
+    return max(0, time2, elts2+time1, (elts2+elts1)/2 + max((x.l1 - (1 - x.c1))/2,0))
+
+
+def qw_parameters(heuristic=True):
+    """
+    The optimal parameters of quantum_qw.py (heuristic) or
+    quantum_qw_no_heuristic.py.
+    """
+    if heuristic:
+        from quantum_qw import model_quantum
+    else:
+        from quantum_qw_no_heuristic import model_quantum
+    with np.errstate(all='ignore'):
+        result = model_quantum.solve()
+    return model_quantum.astuple(result.x)
+
+
+class WalkTree:
+    """
+    The merging tree of one vertex, for the Spec scaled to n.
+
+    The 2^5 - 1 lists are numbered as a heap: the list v has the children 2v+1
+    (left) and 2v+2 (right), and the root 0 is the list of level 0. Each list
+    has a dictionary of its elements (id -> modular sum), an index of its
+    elements by key (the residue joined by the merge above, see key), and for
+    each element the ids of the elements of the parent list which contain it.
+
+    examined, inserted and deleted are the counts of each level since the
+    creation of the tree, changes the number of elements changed at each level
+    by the last update.
+    """
+
+    def __init__(self, n, spec, seed=None):
+        self.n = n
+        self.rng = random.Random(seed)
+        self.bits = [ int(round(c*n)) for c in spec.bits ]
+        self.bits[0] = n
+        self.keep = [ 2.**(p*n) for p in spec.filters ]
+        self.size = max(1, int(round(2.**(spec.sizes[DEPTH]*n))))
+        lists = 2**(DEPTH + 1) - 1
+        self.level = [ (v + 1).bit_length() - 1 for v in range(lists) ]
+        self.parent = [ None ] + [ (v - 1) >> 1 for v in range(1, lists) ]
+        self.sibling = [ None ] + [ v + 1 if v & 1 else v - 1 for v in range(1, lists) ]
+        self.sums = [ {} for v in range(lists) ]
+        self.index = [ {} for v in range(lists) ]
+        self.parents = [ {} for v in range(lists) ]
+        self.pairs = [ {} for v in range(lists) ]
+        # the targets of the lists: the sum of the children of v is the
+        # target of v modulo 2^(bits of v)
+        self.targets = [ self.rng.getrandbits(n) ] + [ 0 ]*(lists - 1)
+        for v in range(2**DEPTH - 1):
+            b = self.bits[self.level[v] + 1]
+            r = self.rng.getrandbits(b) if b else 0
+            self.targets[2*v + 1] = r
+            self.targets[2*v + 2] = (self.targets[v] - r) % (1 << b)
+        self.masks = [ None ] + [ (1 << self.bits[self.level[self.parent[v]]]) - 1 for v in range(1, lists) ]
+        self.next_id = 0
+        self.examined = [0]*(DEPTH + 1)
+        self.inserted = [0]*(DEPTH + 1)
+        self.deleted = [0]*(DEPTH + 1)
+        self.changes = [0]*(DEPTH + 1)
+
+    def key(self, v, s):
+        """
+        The key of the sum s in the list v > 0: two elements of the children
+        of a list match when they have the same key.
+        """
+        if v & 1:
+            return (self.targets[self.parent[v]] - s) & self.masks[v]
+        return s & self.masks[v]
+
+    def insert(self, v, s, pair=None):
+        """
+        Inserts the element of sum s in the list v (built from pair, a couple
+        of ids of the children), and the elements it builds in the lists above.
+        Returns its id.
+        """
+        i = self.next_id
+        self.next_id += 1
+        level = self.level[v]
+        self.sums[v][i] = s
+        self.inserted[level] += 1
+        self.changes[level] += 1
+        if pair is not None:
+            self.pairs[v][i] = pair
+        if v == 0:
+            return i
+        key = self.key(v, s)
+        bucket = self.index[v].get(key)
+        if bucket is None:
+            self.index[v][key] = { i }
+        else:
+            bucket.add(i)
+        parents = self.parents[v][i] = []
+        sibling = self.sibling[v]
+        partners = self.index[sibling].get(key)
+        if not partners:
+            return i
+        p = self.parent[v]
+        self.examined[level - 1] += len(partners)
+        keep = self.keep[level - 1]
+        sibling_sums, sibling_parents = self.sums[sibling], self.parents[sibling]
+        modulus = (1 << self.n) - 1
+        for j in list(partners):
+            if keep < 1 and self.rng.random() >= keep:
+                continue
+            pid = self.insert(p, (s + sibling_sums[j]) & modulus, (i, j) if v & 1 else (j, i))
+            parents.append(pid)
+            sibling_parents[j].append(pid)
+        return i
+
+    def delete(self, v, i):
+        """
+        Deletes the element i of the list v, and the elements built from it in
+        the lists above.
+        """
+        s = self.sums[v].pop(i)
+        level = self.level[v]
+        self.deleted[level] += 1
+        self.changes[level] += 1
+        self.pairs[v].pop(i, None)
+        if v == 0:
+            return
+        key = self.key(v, s)
+        bucket = self.index[v][key]
+        bucket.discard(i)
+        if not bucket:
+            del self.index[v][key]
+        p = self.parent[v]
+        sibling_parents = self.parents[self.sibling[v]]
+        for pid in self.parents[v].pop(i):
+            left, right = self.pairs[p][pid]
+            sibling_parents[right if v & 1 else left].remove(pid)
+            self.delete(p, pid)
+
+    def list_size(self, v):
+        return len(self.sums[v])
+
+    def new_sum(self, v):
+        """
+        A random sum of the bottom list v: its low bits are the target of v.
+        """
+        m = (1 << self.bits[DEPTH]) - 1
+        return (self.targets[v] & m) | (self.rng.getrandbits(self.n) & ~m)
+
+    def setup(self):
+        """
+        Fills the bottom lists with random elements, and builds the tree.
+        """
+        for v in range(2**DEPTH - 1, 2**(DEPTH + 1) - 1):
+            for t in range(self.size):
+                self.insert(v, self.new_sum(v))
+
+    def update(self):
+        """
+        Moves to a random neighbour of the vertex: one element of a random
+        bottom list is replaced by a new one. Returns the number of elements
+        changed at each level.
+        """
+        self.changes = [0]*(DEPTH + 1)
+        v = self.rng.randrange(2**DEPTH - 1, 2**(DEPTH + 1) - 1)
+        # the oldest element: a random one, since the elements are random
+        self.delete(v, next(iter(self.sums[v])))
+        self.insert(v, self.new_sum(v))
+        return self.changes
+
+
+class BatchWalkTree:
+    """
+    The tree of WalkTree, on NumPy arrays, updated by batches: the deletions of
+    a batch of updates are applied first, then its insertions, level by level,
+    each level in a few array operations. An element inserted by an update
+    only pairs with the elements inserted by the earlier updates of the batch,
+    as if they were applied one at a time, but an update does not see the
+    elements deleted by the later updates of its batch (which WalkTree would
+    pair with, then delete): a batch must be small compared to the lists.
+    The sums have at most 64 bits (n <= 64).
+
+    Each list is a dict of arrays: the ids, the sums and the keys (see
+    WalkTree.key) of its elements, oldest first, and the ids of their two
+    children ("left", "right") above the bottom level.
+    """
+
+    def __init__(self, n, spec, seed=None):
+        if n > 64:
+            raise ValueError("The batched tree needs n <= 64")
+        self.n = n
+        self.rng = np.random.default_rng(seed)
+        # the same tree as WalkTree
+        tree = WalkTree(n, spec, int(self.rng.integers(1 << 62)))
+        self.bits, self.keep, self.size = tree.bits, tree.keep, tree.size
+        self.level, self.parent = tree.level, tree.parent
+        self.modulus = np.uint64((1 << n) - 1)
+        self.targets = [ np.uint64(t) for t in tree.targets ]
+        self.masks = [ None ] + [ np.uint64(m) for m in tree.masks[1:] ]
+        self.bottom = np.uint64((1 << self.bits[DEPTH]) - 1)
+        self.lists = [ self._empty(v) for v in range(2**(DEPTH + 1) - 1) ]
+        self.next_id = 0
+        self.examined = [0]*(DEPTH + 1)
+        self.inserted = [0]*(DEPTH + 1)
+        self.deleted = [0]*(DEPTH + 1)
+
+    def _empty(self, v):
+        res = { 'ids' : np.zeros(0, dtype=np.int64), 'sums' : np.zeros(0, dtype=np.uint64),
+                'keys' : np.zeros(0, dtype=np.uint64), 'origins' : np.zeros(0, dtype=np.int64) }
+        if self.level[v] < DEPTH:
+            res['left'] = np.zeros(0, dtype=np.int64)
+            res['right'] = np.zeros(0, dtype=np.int64)
+        return res
+
+    def _keys(self, v, sums):
+        if v == 0:
+            return np.zeros(len(sums), dtype=np.uint64)
+        if v & 1:
+            return (self.targets[self.parent[v]] - sums) & self.masks[v]
+        return sums & self.masks[v]
+
+    def _elements(self, v, sums, origins, **children):
+        ids = np.arange(self.next_id, self.next_id + len(sums), dtype=np.int64)
+        self.next_id += len(sums)
+        return dict(children, ids=ids, sums=sums, keys=self._keys(v, sums), origins=origins)
+
+    def list_size(self, v):
+        return len(self.lists[v]['ids'])
+
+    def _delete(self, nodes, count, changes):
+        """
+        Deletes the oldest element of the bottom list nodes[o] for each update o,
+        and the elements built from them.
+        """
+        deleted = {}
+        for v in range(2**DEPTH - 1, 2**(DEPTH + 1) - 1):
+            origins = np.nonzero(nodes == v)[0]
+            l = self.lists[v]
+            deleted[v] = (l['ids'][:len(origins)], origins)
+            self.lists[v] = { name : a[len(origins):] for name, a in l.items() }
+            changes[DEPTH] += np.bincount(origins, minlength=count)
+        for v in range(2**DEPTH - 2, -1, -1):
+            l = self.lists[v]
+            # the update which deleted a child of each element, or count
+            origin = np.full(len(l['ids']), count, dtype=np.int64)
+            for side, child in [('left', 2*v + 1), ('right', 2*v + 2)]:
+                ids, origins = deleted[child]
+                if len(ids) == 0:
+                    continue
+                order = np.argsort(ids)
+                position = np.minimum(np.searchsorted(ids[order], l[side]), len(ids) - 1)
+                hit = ids[order][position] == l[side]
+                origin = np.where(hit, np.minimum(origin, origins[order][position]), origin)
+            dead = origin < count
+            deleted[v] = (l['ids'][dead], origin[dead])
+            self.lists[v] = { name : a[~dead] for name, a in l.items() }
+            changes[self.level[v]] += np.bincount(origin[dead], minlength=count)
+        for i in range(DEPTH + 1):
+            self.deleted[i] += int(changes[i].sum())
+
+    def _pairs(self, new, old, other):
+        """
+        The pairs (i, j) of an element i of new with an element j of the
+        sibling list, either old or inserted by an earlier update (other), j
+        indexing the concatenation of old and other.
+        """
+        keys = np.concatenate([old['keys'], other['keys']])
+        chunks = list(join(new['keys'], keys)) if len(new['keys']) and len(keys) else []
+        if not chunks:
+            return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+        i, j = [ np.concatenate(a) for a in zip(*chunks) ]
+        earlier = j < len(old['keys'])
+        later = np.nonzero(~earlier)[0]
+        earlier[later] = other['origins'][j[later] - len(old['keys'])] < new['origins'][i[later]]
+        return i[earlier], j[earlier]
+
+    def _insert(self, nodes, origins, count, changes):
+        """
+        Inserts a new element in the bottom list nodes[k] for the update
+        origins[k], and the elements built from them.
+        """
+        new = {}
+        for v in range(2**DEPTH - 1, 2**(DEPTH + 1) - 1):
+            o = origins[nodes == v]
+            sums = ((self.rng.integers(0, 1 << 63, len(o), dtype=np.uint64) << np.uint64(1)) ^
+                    self.rng.integers(0, 2, len(o), dtype=np.uint64))
+            sums = (self.targets[v] & self.bottom) | (sums & self.modulus & ~self.bottom)
+            new[v] = self._elements(v, sums, o)
+            changes[DEPTH] += np.bincount(o, minlength=count)
+        for v in range(2**DEPTH - 2, -1, -1):
+            level = self.level[v]
+            left, right = 2*v + 1, 2*v + 2
+            parts = []
+            for mine, sibling, first in [(left, right, True), (right, left, False)]:
+                i, j = self._pairs(new[mine], self.lists[sibling], new[sibling])
+                o = new[mine]['origins'][i]
+                self.examined[level] += len(i)
+                if self.keep[level] < 1:
+                    kept = self.rng.random(len(i)) < self.keep[level]
+                    i, j, o = i[kept], j[kept], o[kept]
+                other = { name : np.concatenate([self.lists[sibling][name], new[sibling][name]])
+                        for name in ['ids', 'sums'] }
+                ids = (new[mine]['ids'][i], other['ids'][j])
+                parts.append((new[mine]['sums'][i] + other['sums'][j], o, ids if first else ids[::-1]))
+            with np.errstate(over='ignore'):
+                sums = np.concatenate([ p[0] for p in parts ]) & self.modulus
+            o = np.concatenate([ p[1] for p in parts ])
+            new[v] = self._elements(v, sums, o, left=np.concatenate([ p[2][0] for p in parts ]),
+                    right=np.concatenate([ p[2][1] for p in parts ]))
+            changes[level] += np.bincount(o, minlength=count)
+            for child in [left, right]:
+                self.lists[child] = { name : np.concatenate([a, new[child][name]])
+                        for name, a in self.lists[child].items() }
+        self.lists[0] = { name : np.concatenate([a, new[0][name]]) for name, a in self.lists[0].items() }
+        for i in range(DEPTH + 1):
+            self.inserted[i] += int(changes[i].sum())
+
+    def setup(self):
+        """
+        Fills the bottom lists with random elements, and builds the tree.
+        """
+        nodes = np.repeat(np.arange(2**DEPTH - 1, 2**(DEPTH + 1) - 1), self.size)
+        count = len(nodes)
+        self._insert(nodes, np.arange(count), count, np.zeros((DEPTH + 1, count), dtype=np.int64))
+
+    def updates(self, count):
+        """
+        Applies count updates (see WalkTree.update) as one batch. Returns the
+        number of elements changed at each level by each update, an array of
+        shape count x (DEPTH + 1).
+        """
+        nodes = self.rng.integers(2**DEPTH - 1, 2**(DEPTH + 1) - 1, count)
+        deletions = np.zeros((DEPTH + 1, count), dtype=np.int64)
+        insertions = np.zeros((DEPTH + 1, count), dtype=np.int64)
+        self._delete(nodes, count, deletions)
+        self._insert(nodes, np.arange(count), count, insertions)
+        return (deletions + insertions).T
+
+
+def simulate(n, heuristic=True, x=None, updates=10**5, seed=None, batch=None, tolerance=1., verb=False):
+    """
+    Builds the merging tree of a random vertex for the parameters x of
+    quantum_qw.py (heuristic) or quantum_qw_no_heuristic.py (default: the
+    optimal ones) scaled to n, and applies updates random updates.
+
+    Returns, for each level: the log2 over n of the mean size of its lists, and
+    of the mean number of partners examined and of elements changed
+    (inserted or deleted) per update, their predictions (by the model, and by
+    the model with the numbers of bits c_i*n rounded to the integers of the
+    tree, which moves them by a few bits at n = 60), the largest number of
+    elements changed by an update, and the fraction of updates which change
+    more than 2 of them (more than a deletion and an insertion: an update
+    explosion). The measured update exponent, the largest log2 of partners
+    examined per update over 2n (the cost of a quantum search among them) is
+    compared with the one of the model.
+
+    The measures which leave the model are listed in 'mismatches': a size, or
+    a number of partners examined or of elements changed, more than tolerance
+    bits above its prediction (log2, not over n), or explosions in more than
+    half of the updates of a level.
+
+    @param batch: apply the updates by batches of this size, with
+    BatchWalkTree (default: one at a time, with WalkTree).
+    """
+    if x is None:
+        x = qw_parameters(heuristic)
+    spec = make_spec(x, heuristic)
+    tree = WalkTree(n, spec, seed) if batch is None else BatchWalkTree(n, spec, seed)
+    begin = timer.perf_counter()
+    tree.setup()
+    setup = timer.perf_counter() - begin
+    counts = [ list(c) for c in (tree.examined, tree.inserted, tree.deleted) ]
+    largest = [0]*(DEPTH + 1)
+    explosions = [0]*(DEPTH + 1)
+    begin = timer.perf_counter()
+    if batch is None:
+        for t in range(updates):
+            for i, c in enumerate(tree.update()):
+                if c > 2:
+                    explosions[i] += 1
+                if c > largest[i]:
+                    largest[i] = c
+    else:
+        for t in range(0, updates, batch):
+            changes = tree.updates(min(batch, updates - t))
+            for i in range(DEPTH + 1):
+                explosions[i] += int(np.sum(changes[:, i] > 2))
+                largest[i] = max(largest[i], int(changes[:, i].max()))
+    seconds = timer.perf_counter() - begin
+    # the counts of the updates only
+    examined, inserted, deleted = [ [ a - b for a, b in zip(now, before) ]
+            for now, before in zip((tree.examined, tree.inserted, tree.deleted), counts) ]
+    log2n = lambda t : float(np.log2(t))/n if t > 0 else -np.inf
+    l, c, p = spec.sizes, spec.bits, spec.filters
+    # the predictions of the model with the bits of the tree (rounded to
+    # integers) and its bottom lists, in log2
+    rounded = [0.]*DEPTH + [ float(np.log2(tree.size)) ]
+    for i in range(DEPTH - 1, -1, -1):
+        rounded[i] = 2*rounded[i+1] - (tree.bits[i] - tree.bits[i+1]) + float(np.log2(tree.keep[i]))
+    levels = []
+    for i in range(DEPTH + 1):
+        size = np.mean([ tree.list_size(v) for v in range(2**i - 1, 2**(i + 1) - 1) ])
+        # 2^{l_{i+1} - l4} insertions of level i+1 per update, with 2^{l_{i+1} -
+        # (c_i - c_{i+1})} partners each
+        predicted = 2*l[i+1] - l[DEPTH] - (c[i] - c[i+1]) if i < DEPTH else None
+        levels.append({ 'level' : i, 'log2_size' : log2n(size), 'log2_predicted_size' : l[i],
+                        'log2_examined' : log2n(examined[i]/updates) if i < DEPTH else None,
+                        'log2_predicted_examined' : predicted,
+                        'log2_changes' : log2n((inserted[i] + deleted[i])/(2*updates)),
+                        'log2_predicted_changes' : l[i] - l[DEPTH],
+                        'log2_rounded_size' : rounded[i]/n,
+                        'log2_rounded_examined' : (2*rounded[i+1] - rounded[DEPTH] -
+                                (tree.bits[i] - tree.bits[i+1]))/n if i < DEPTH else None,
+                        'log2_rounded_changes' : (rounded[i] - rounded[DEPTH])/n,
+                        'largest' : largest[i],
+                        'explosions' : explosions[i]/updates })
+    measured = max([0.] + [ level['log2_examined']/2 for level in levels[:DEPTH]
+            if level['log2_examined'] is not None and np.isfinite(level['log2_examined']) ])
+    mismatches = []
+    for level in levels:
+        for name in ['size', 'examined', 'changes']:
+            t, model = level['log2_' + name], level['log2_predicted_' + name]
+            if t is not None and model is not None and (t - model)*n > tolerance:
+                mismatches.append("level %i: %s 2^(%s n) above the model 2^(%s n) (2^(%s n) with the bits "
+                        "rounded)" % (level['level'], name, round_to_str(t), round_to_str(model),
+                        round_to_str(level['log2_rounded_' + name])))
+        if level['explosions'] > 0.5:
+            mismatches.append("level %i: explosions in %i%% of the updates" % (level['level'],
+                    round(100*level['explosions'])))
+    stats = { 'n' : n, 'updates' : updates, 'batch' : batch, 'setup_seconds' : setup, 'seconds' : seconds,
+              'updates_per_second' : updates/seconds, 'levels' : levels,
+              'update' : measured, 'model_update' : float(model_update(x, heuristic)),
+              'mismatches' : mismatches }
+    if verb:
+        print("n = %i, %s: setup %.2fs, %i updates in %.2fs (%i per second)" % (n,
+                "heuristic" if heuristic else "no heuristic", setup, updates, seconds, updates/seconds))
+        show = lambda t : "-" if t is None else round_to_str(t)
+        for level in levels:
+            print("   level %i: size %s (model %s), examined %s (model %s), changed %s (model %s), "
+                    "largest %i, explosions %.2g" % (level['level'], show(level['log2_size']),
+                    show(level['log2_predicted_size']), show(level['log2_examined']),
+                    show(level['log2_predicted_examined']), show(level['log2_changes']),
+                    show(level['log2_predicted_changes']), level['largest'], level['explosions']))
+        print("   update exponent %s (model %s)" % (round_to_str(measured), round_to_str(stats['model_update'])))
+        for m in mismatches:
+            print("   MISMATCH " + m)
+    return stats
+
+
+if __name__ == "__main__":
+    print("=========== QUANTUM WALK DATA STRUCTURE ===========")
+    simulate(60, heuristic=True, verb=True)
+    simulate(60, heuristic=False, verb=True)
+    print("=========== BY BATCHES ===========")
+    simulate(60, heuristic=True, updates=10**6, batch=10000, verb=True)
+    simulate(60, heuristic=False, updates=10**6, batch=10000, verb=True)
@@ -0,0 +1,410 @@
+"""
+Memory-bounded BCJ merging tree: the lists of concrete_bcj.py are partitioned
+into residue classes and spilled to files, so that a run fits in a given
+memory budget, e.g. the 2^{mcons*n} elements of a memory constraint mcons (see
+budget_from_mcons), and the time-memory tradeoff can be measured:
+>>> instance = random_instance(40, seed=0)
+>>> solution, stats = solve_streaming(instance, mcons=0.2, verb=True)
+>>> tradeoff(40, [None, 0.25, 0.2, 0.15], instances=1)
+
+With a memory constraint mcons, the plan is built from the parameters which
+are optimal under it (classical_bcj.model_bcj_memory): smaller lists, sampled
+bottom lists, and 2^{r n} runs. The spilling then only handles what the
+rounding at small n adds to the lists; a run whose peak exceeds the budget is
+reported (stats['over_budget']).
+
+A merge of level i joins two lists of level i+1 on the bits k to k+w-1 of
+their sums (see concrete.merge). Both lists are partitioned by the B lowest
+bits of their join keys: two vectors can only match if they are in the same
+class, so the merge takes the classes one at a time, and only needs one class
+of each list in memory (about 2^-B of the lists). The merged vectors are
+partitioned in turn by the keys of the merge above. The bottom lists are
+enumerated lazily, by chunks, directly into their classes.
+
+The classes are kept in memory as long as all the lists of the run fit in the
+budget; beyond it, the classes in memory are appended to one file per class,
+which is read back as a memory map when the class is merged. Duplicate vectors
+have the same sums, hence the same class: a list is deduplicated class by
+class before being merged.
+
+A merge has at most 2^w classes (and MAX_CLASS_BITS): at small n, the classes
+of the lists much larger than the budget do not fit in it, and the peak memory
+is about the size of their largest class. Unlike the model, the run then pays
+the time of writing and reading back the spilled lists.
+"""
+
+from concrete import (Vectors, random_instance, random_residue, combinations, weight_sums, bitmasks,
+        join_keys, window, mask, sub, reduce, merge_chunks, unique)
+from concrete_bcj import BCJSolver, bcj_parameters, make_plan, vector, check_solution, _stats, DEPTH
+from macros import round_to_str
+import itertools
+import os
+import shutil
+import tempfile
+import time as timer
+import numpy as np
+
+
+# a vector of a list, as stored in the files
+RECORD = np.dtype([('sums', np.uint64, 2), ('plus', np.uint64, 2), ('minus', np.uint64, 2)])
+
+# at most 2^16 classes per list
+MAX_CLASS_BITS = 16
+
+
+def to_records(vectors):
+    res = np.empty(len(vectors.sums), dtype=RECORD)
+    for name, a in zip(Vectors._fields, vectors):
+        res[name] = a
+    return res
+
+
+def from_records(records):
+    return Vectors(*[ np.ascontiguousarray(records[name]) for name in Vectors._fields ])
+
+
+def budget_from_mcons(mcons, n):
+    """
+    The memory budget in bytes of 2^{mcons*n} vectors.
+    """
+    return int(2.**(mcons*n))*RECORD.itemsize
+
+
+def enumerate_chunks(weights, positions, ones, minus, n, chunk=1 << 16):
+    """
+    The vectors of concrete.enumerate_vectors, lazily, by Vectors of about chunk
+    vectors (at least the number of placements of the "-1" for given "1").
+    """
+    positions = np.asarray(positions, dtype=np.intp)
+    m = len(positions)
+    if ones + minus > m:
+        return
+    C = combinations(m - ones, minus)
+    subsets = itertools.combinations(range(m), ones)
+    batch = max(1, chunk // len(C))
+    while True:
+        P = list(itertools.islice(subsets, batch))
+        if not P:
+            return
+        P = np.array(P, dtype=np.intp).reshape(len(P), ones)
+        taken = np.zeros((len(P), m), dtype=bool)
+        taken[np.arange(len(P))[:, None], P] = True
+        # the free positions of each row, where the "-1" are placed
+        rest = np.nonzero(~taken)[1].reshape(len(P), m - ones)
+        M = positions[rest[:, C].reshape(len(P)*len(C), minus)]
+        P = positions[np.repeat(P, len(C), axis=0)]
+        yield Vectors(sub(weight_sums(weights, P, n), weight_sums(weights, M, n), n), bitmasks(P), bitmasks(M))
+
+
+class Memory:
+    """
+    The bytes of the vectors in memory during a run, shared by all its
+    Buckets: when they exceed the budget (None: no budget), the Buckets spill
+    the classes they have in memory to files, in a temporary directory
+    created in directory (default: the system one).
+
+    peak is the largest number of bytes in memory (counting the vectors just
+    added, before they are spilled), spilled the number of bytes written to
+    the files.
+    """
+
+    def __init__(self, budget=None, directory=None):
+        self.budget = budget
+        self.directory = directory
+        self.path = None
+        self.resident = 0
+        self.peak = 0
+        self.spilled = 0
+        self.files = 0
+        self.buckets = []
+
+    def allocate(self, nbytes):
+        self.resident += nbytes
+        self.peak = max(self.peak, self.resident)
+        if self.budget is not None and self.resident > self.budget:
+            for buckets in self.buckets:
+                buckets.spill()
+
+    def release(self, nbytes):
+        self.resident -= nbytes
+
+    def file(self):
+        """
+        A new file name in the temporary directory.
+        """
+        if self.path is None:
+            self.path = tempfile.mkdtemp(prefix="streaming-", dir=self.directory)
+        self.files += 1
+        return os.path.join(self.path, "%i.bin" % self.files)
+
+    def close(self):
+        """
+        Removes the files.
+        """
+        if self.path is not None:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.path = None
+        self.buckets = []
+
+
+class Buckets:
+    """
+    A list partitioned into the 2^bits residue classes of its keys for the
+    merge (target, k, w) above it: the keys are join_keys(sums, target, k, w)
+    for the left list and window(sums, k, w) for the right list, as in
+    concrete.merge. Each class is in memory, in a file, or both.
+    """
+
+    def __init__(self, bits, memory, target, k, w, left):
+        self.bits = bits
+        self.memory = memory
+        self.key = ((lambda sums : join_keys(sums, target, k, w)) if left else
+                (lambda sums : window(sums, k, w)))
+        self.parts = [ [] for c in range(1 << bits) ]
+        self.files = [ None ]*(1 << bits)
+        # the classes with vectors in memory
+        self.resident = set()
+        self.size = 0
+        memory.buckets.append(self)
+
+    def __len__(self):
+        return self.size
+
+    def add(self, vectors):
+        """
+        Adds the vectors (a Vectors) to their classes.
+        """
+        if len(vectors.sums) == 0:
+            return
+        classes = (self.key(vectors.sums) & mask(self.bits)).astype(np.intp)
+        order = np.argsort(classes, kind='stable')
+        records = to_records(vectors)[order]
+        bounds = np.searchsorted(classes[order], np.arange((1 << self.bits) + 1))
+        for c in np.nonzero(np.diff(bounds))[0]:
+            self.parts[c].append(records[bounds[c]:bounds[c+1]])
+            self.resident.add(c)
+        self.size += len(records)
+        self.memory.allocate(records.nbytes)
+
+    def spill(self):
+        """
+        Appends the classes in memory to their files.
+        """
+        for c in self.resident:
+            parts = self.parts[c]
+            if self.files[c] is None:
+                self.files[c] = self.memory.file()
+            with open(self.files[c], "ab") as f:
+                for records in parts:
+                    records.tofile(f)
+            nbytes = sum(records.nbytes for records in parts)
+            self.memory.spilled += nbytes
+            self.memory.release(nbytes)
+            self.parts[c] = []
+        self.resident = set()
+
+    def take(self, c):
+        """
+        Removes the class c from the list, and returns its vectors (a Vectors),
+        which the caller must release from the memory.
+        """
+        parts, self.parts[c] = self.parts[c], []
+        self.resident.discard(c)
+        if self.files[c] is not None:
+            parts.insert(0, np.memmap(self.files[c], dtype=RECORD, mode='r'))
+        records = np.concatenate(parts) if parts else np.zeros(0, dtype=RECORD)
+        if self.files[c] is not None:
+            os.remove(self.files[c])
+            self.files[c] = None
+        # the class in memory is now counted with the part read from the file
+        self.memory.release(sum(p.nbytes for p in parts if not isinstance(p, np.memmap)))
+        self.memory.allocate(records.nbytes)
+        return from_records(records)
+
+
+def class_bits(plan, budget):
+    """
+    The number of bits B_i of the classes of the merge of level i, for each i:
+    the smallest one for which a class of each of its two lists takes at most
+    half the budget (the other half being left to the other lists of the run).
+    """
+    res = []
+    for i in range(DEPTH):
+        k = plan.bits[i+1] if i + 1 < DEPTH else 0
+        if budget is None:
+            res.append(0)
+            continue
+        nbytes = 2*2.**plan.log2_sizes[i+1]*RECORD.itemsize
+        bits = int(np.ceil(np.log2(max(nbytes/(budget/2), 1))))
+        res.append(min(bits, plan.bits[i] - k, MAX_CLASS_BITS))
+    return res
+
+
+class StreamingBCJSolver(BCJSolver):
+    """
+    One run of the BCJ merging tree (see concrete_bcj.BCJSolver) whose lists
+    are Buckets, within the memory budget of memory (a Memory).
+
+    @param bits: the number of bits of the classes of the merge of each level
+    (see class_bits).
+    @param chunk: the number of pairs examined at once by the merges, and of
+    vectors enumerated at once in the bottom lists, lowered to an eighth of the
+    budget.
+    """
+
+    def __init__(self, instance, plan, rng, memory, bits, chunk=1 << 20):
+        if memory.budget is not None:
+            chunk = min(chunk, max(memory.budget//(8*RECORD.itemsize), 1 << 8))
+        super().__init__(instance, plan, rng, chunk)
+        self.memory = memory
+        self.bits = bits
+
+    def build(self, i, target, weight, sink):
+        """
+        Adds to sink (a Buckets) the list of level i: vectors with weight + m_i
+        "1" and m_i "-1" whose sum is target modulo 2^{b_i}.
+        """
+        plan = self.plan
+        n = plan.n
+        ones, minus = weight + plan.minus[i], plan.minus[i]
+        k = plan.bits[i+1] if i + 1 < DEPTH else 0
+        w = plan.bits[i] - k
+        buckets = lambda left : Buckets(self.bits[i], self.memory, target, k, w, left)
+        left, right = buckets(True), buckets(False)
+        if i == DEPTH - 1:
+            positions = self.rng.permutation(n)
+            a, b = (ones + self.rng.integers(2))//2, (minus + self.rng.integers(2))//2
+            weights = self.instance.weights
+            chunk = min(self.chunk, 1 << 16)
+            for v in enumerate_chunks(weights, positions[:n//2], a, b, n, chunk):
+                left.add(self.sample(v))
+            for v in enumerate_chunks(weights, positions[n//2:], ones - a, minus - b, n, chunk):
+                right.add(self.sample(v))
+        else:
+            r = random_residue(self.rng, k)
+            self.build(i + 1, r, weight//2, left)
+            self.build(i + 1, reduce(sub(target, r, n), k), weight - weight//2, right)
+        # the bottom lists have disjoint supports: no vector is repeated
+        dedup = i + 1 < DEPTH - 1
+        sizes = [0, 0]
+        for c in range(1 << self.bits[i]):
+            l, r = left.take(c), right.take(c)
+            held = (len(l.sums) + len(r.sums))*RECORD.itemsize
+            if dedup:
+                l, r = unique(l), unique(r)
+            sizes[0] += len(l.sums)
+            sizes[1] += len(r.sums)
+            for res in merge_chunks(l, r, target, k, w, n, ones, minus, self.chunk, self.pairs[i]):
+                sink.add(res)
+            self.memory.release(held)
+        # the sizes of the lists of level i+1, without repeats
+        self.sizes[i+1] += sizes
+        self.memory.buckets.remove(left)
+        self.memory.buckets.remove(right)
+
+    def run(self):
+        """
+        Returns the solutions found (vectors in {0,1}^n).
+        """
+        n = self.plan.n
+        top = Buckets(0, self.memory, None, 0, 0, False)
+        self.build(0, self.instance.target, n//2, top)
+        res = top.take(0)
+        self.memory.release(len(res.sums)*RECORD.itemsize)
+        self.memory.buckets.remove(top)
+        res = unique(res)
+        self.sizes[0].append(len(res.sums))
+        solutions = [ vector(p, m, n) for p, m in zip(res.plus, res.minus) ]
+        return [ e for e in solutions if check_solution(self.instance, e) ]
+
+
+def solve_streaming(instance, mcons=None, budget=None, x=None, tries=None, seed=None, chunk=1 << 20,
+        directory=None, verb=False):
+    """
+    Runs the BCJ merging tree on the instance within a memory budget, with new
+    random residues until a solution is found, at most tries times.
+
+    @param mcons: the budget is 2^{mcons*n} vectors (see budget_from_mcons), and
+    the parameters are by default the optimal ones under this memory
+    constraint (see concrete_bcj.bcj_parameters).
+    @param budget: the budget in bytes, if mcons is None (default: none).
+    @param x: the parameters (a set_bcj or a set_bcj_memory).
+    @param tries: the maximal number of runs (default: 3 over the success
+    probability of a run, and at least 20).
+    @param directory: where the spilled classes are written (default: the
+    temporary directory of the system).
+    Returns the solution (or None) and the statistics of concrete_bcj.solve_bcj,
+    with the budget, the bits of the classes, the peak and spilled bytes, and
+    whether the peak exceeded the budget.
+    """
+    if x is None:
+        x = bcj_parameters(mcons)
+    if mcons is not None:
+        budget = budget_from_mcons(mcons, instance.n)
+    plan = make_plan(instance.n, x)
+    bits = class_bits(plan, budget)
+    if tries is None:
+        tries = max(20, int(np.ceil(3/plan.success)))
+    rng = np.random.default_rng(seed)
+    memory = Memory(budget, directory)
+    solvers = []
+    solution = None
+    begin = timer.perf_counter()
+    try:
+        for t in range(tries):
+            solver = StreamingBCJSolver(instance, plan, rng, memory, bits, chunk)
+            solvers.append(solver)
+            solutions = solver.run()
+            if solutions:
+                solution = solutions[0]
+                break
+    finally:
+        memory.close()
+    stats = _stats(solvers, plan, x, timer.perf_counter() - begin)
+    stats.update({ 'mcons' : mcons, 'budget' : budget, 'class_bits' : bits, 'peak' : memory.peak,
+                   'spilled' : memory.spilled, 'over_budget' : budget is not None and memory.peak > budget })
+    if verb:
+        print("n = %i, budget %s, class bits %s: %s after %i runs (%.2fs)" % (instance.n,
+                "-" if budget is None else "%i bytes" % budget, bits,
+                "solved" if solution is not None else "not solved", len(solvers), stats['seconds']))
+        print("   peak %i bytes (2^%s vectors), spilled %i bytes%s" % (memory.peak,
+                round_to_str(np.log2(max(memory.peak, 1)/RECORD.itemsize)), memory.spilled,
+                ", OVER THE BUDGET" if stats['over_budget'] else ""))
+    return solution, stats
+
+
+def tradeoff(n, mcons, instances=3, tries=None, directory=None, verb=True):
+    """
+    Solves random instances of size n for each memory bound of mcons (None: no
+    bound), with the parameters optimal under this bound (see
+    concrete_bcj.bcj_parameters), and compares the measured peak memory and
+    time with the ones predicted by these parameters. Returns the list of
+    (mcons, success rate, mean seconds, log2 of the mean peak number of vectors
+    over n, predicted time exponent, planned log2 cost over n, fraction of the
+    runs over the budget).
+    """
+    from classical_bcj import classical_time_bcj, classical_time_bcj_memory
+    rows = []
+    for m in mcons:
+        x = bcj_parameters(m)
+        results = [ solve_streaming(random_instance(n, seed), m, x=x, tries=tries, seed=seed,
+                directory=directory) for seed in range(instances) ]
+        success = np.mean([ solution is not None for solution, stats in results ])
+        seconds = np.mean([ stats['seconds'] for solution, stats in results ])
+        peak = np.log2(np.mean([ stats['peak'] for solution, stats in results ])/RECORD.itemsize)/n
+        over = np.mean([ stats['over_budget'] for solution, stats in results ])
+        predicted = (classical_time_bcj if m is None else classical_time_bcj_memory)(x)
+        rows.append((m, float(success), float(seconds), float(peak), float(predicted),
+                make_plan(n, x).log2_cost/n, float(over)))
+        if verb:
+            print("mcons = %s: success %.2f, %.3fs, peak 2^(%s n) vectors%s (predicted time 2^(%s n), "
+                    "planned cost 2^(%s n))" % ("-" if m is None else round_to_str(m), success, seconds,
+                    round_to_str(peak), "" if not over else ", over the budget in %i%% of the instances" % (100*over),
+                    round_to_str(predicted), round_to_str(rows[-1][5])))
+    return rows
+
+
+if __name__ == "__main__":
+    print("=========== MEMORY-BOUNDED BCJ ALGORITHM ===========")
+    solve_streaming(random_instance(40, seed=0), mcons=0.2, verb=True)
+    tradeoff(40, [None, 0.25, 0.2, 0.15], instances=1)
@@ -0,0 +1,44 @@
+"""
+Fixtures shared by the tests: a small model, minimize max(a, b) + c under
+a + b >= 1, whose optimum is 0.5 at a = b = 0.5, c = 0.
+"""
+
+from macros import wrap
+from model import Model, parameters
+import collections
+import pytest
+
+
+Toy = collections.namedtuple('Toy', 'settype bounds start constraints time')
+
+
+set_toy, bounds_toy, start_toy = parameters('Toy', [
+    ("a", (0, 1), 0.9),
+    ("b", (0, 1), 0.6),
+    ("c", (0, 1), 0.3),
+])
+
+constraints_toy = [
+    { 'type' : 'ineq', 'fun' : wrap(lambda x : x.a + x.b - 1, set_toy) },
+]
+
+
+def time_toy(x, max=max):
+    x = set_toy(*x)
+    return max(x.a, x.b) + x.c
+
+
+@pytest.fixture
+def toy():
+    """
+    The parts of the toy model.
+    """
+    return Toy(set_toy, bounds_toy, start_toy, constraints_toy, time_toy)
+
+
+@pytest.fixture
+def model_toy(toy):
+    """
+    The toy model (a new one for each test, which may modify it).
+    """
+    return Model(toy.settype, toy.constraints, toy.time, toy.bounds, toy.start)
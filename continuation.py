@@ -0,0 +1,168 @@
+"""
+Continuation from the BCJ optimum to the {-1,0,1,2} optimum of classical.py:
+>>> path = continuation(verb=True)
+>>> onsets(path)
+
+The classical algorithm with "2" digits contains BCJ: with gamma1 = gamma2 =
+gamma3 = 0 (the commented-out "if no 2" constraints of classical.py), its
+constraints are the ones of classical_bcj.py. The continuation starts from the
+solution of optimize_bcj_classical, with the gammas fixed to 0, and relaxes the
+bounds step by step: at the step t (from 0 to 1), the gammas are in [0,
+t*gamma_max] and the alphas in [0, a + t*(alpha_max - a)], where a is their
+value at the BCJ optimum. Each step is solved from the solution of the
+previous one (see Model.variant), and the path records all of them.
+
+The feasible set grows along the path, so the optimal time cannot increase: a
+step which fails, or ends above the time of the previous step (a worse local
+optimum), is retried with half the step, down to min_step, below which the
+previous solution is kept. The entropies have infinite derivatives where a
+number of digits is 0, so a relaxed gamma at 0 starts at half its new bound.
+
+onsets tells at which bound each extra "2" starts to pay off: the first step
+from which the optimum stays away from gamma_i = 0.
+"""
+
+from macros import violation, round_to_str
+import collections
+import time as timer
+import numpy as np
+
+
+Step = collections.namedtuple('Step', 't gamma_max alpha_max time x success accepted seconds nfev')
+Step.__doc__ = """
+A step of the continuation: its parameter t in [0, 1], the upper bound of the
+gammas and the upper bounds of the alphas (a list), the time and the
+parameters x (a namedtuple) at the solution, the success of the solver,
+whether the solution was accepted (if not, x is the previous solution), the
+duration in seconds and the number of evaluations of the solve.
+"""
+
+
+def _names(model, prefix):
+    return [ name for name in model.settype._fields if name.startswith(prefix) ]
+
+
+def bcj_start(model):
+    """
+    The solution of classical_bcj.py as parameters of the model (by name), the
+    other ones (the gammas) at 0.
+    """
+    from classical_bcj import model_bcj
+    with np.errstate(all='ignore'):
+        x = model_bcj.solve().x
+    values = dict(zip(model_bcj.settype._fields, x))
+    return [ float(values.get(name, 0.)) for name in model.settype._fields ]
+
+
+def continuation(model=None, start=None, gamma_max=None, alpha_max=None, steps=20, min_step=None,
+        epigraph=True, verb=False):
+    """
+    Follows the optimum of the model (default: model_classical) while the
+    bounds of its gammas and alphas are relaxed (see the module docstring).
+    Returns the path, a list of Step, the first one at t = 0 (the start).
+
+    @param start: the parameters at t = 0, with the gammas at 0 (default: the
+    BCJ solution, see bcj_start).
+    @param gamma_max, alpha_max: the upper bounds at t = 1 (default: the ones of
+    the model).
+    @param steps: the initial number of steps, whose size is halved after a
+    failure, and doubled again after a success.
+    @param min_step: the smallest step (default: 1/(16*steps)).
+    @param epigraph: solve the smooth reformulation of the time (see
+    macros.epigraph_problem).
+    """
+    if model is None:
+        from classical import model_classical as model
+    fields = model.settype._fields
+    gammas, alphas = _names(model, "gamma"), _names(model, "alpha")
+    if gamma_max is None:
+        gamma_max = max(model.bounds[fields.index(name)][1] for name in gammas)
+    if alpha_max is None:
+        alpha_max = max(model.bounds[fields.index(name)][1] for name in alphas)
+    if min_step is None:
+        min_step = 1./(16*steps)
+    x = list(start) if start is not None else bcj_start(model)
+    alpha0 = [ x[fields.index(name)] for name in alphas ]
+
+    def overrides(t):
+        o = { name : (0., t*gamma_max) for name in gammas }
+        o.update({ name : (0., a + t*(alpha_max - a)) for name, a in zip(alphas, alpha0) })
+        return o
+
+    def record(t, x, success, accepted, seconds, nfev):
+        bounds = overrides(t)
+        step = Step(t, t*gamma_max, [ bounds[name][1] for name in alphas ], float(model.time(x)),
+                model.astuple(x), success, accepted, seconds, nfev)
+        if verb:
+            print("t = %.4f: gamma <= %s, time %s%s (%.2fs, %i evaluations), %s" % (t, round_to_str(t*gamma_max),
+                    round_to_str(step.time), "" if accepted else " (kept)", seconds, nfev,
+                    { name : round_to_str(getattr(step.x, name)) for name in gammas + alphas }))
+        return step
+
+    with np.errstate(all='ignore'):
+        path = [ record(0., x, True, True, 0., 0) ]
+        t, dt = 0., 1./steps
+        while t < 1:
+            dt = min(dt, 1 - t)
+            variant = model.variant(overrides(t + dt))
+            begin = timer.perf_counter()
+            # the previous solution is feasible: it is moved into the interior
+            # for the gammas at 0 (see the module docstring)
+            candidates = []
+            first = [ min(max(value, lo), hi) for value, (lo, hi) in zip(x, variant.bounds) ]
+            for name in gammas:
+                i = fields.index(name)
+                if first[i] <= 0:
+                    first[i] = variant.bounds[i][1]/2
+            for s in [first, x]:
+                result = variant.solve(start=s, epigraph=epigraph, cache=False)
+                candidates.append(result)
+                if result.success and violation(variant.constraints, result.x) <= 1e-8 and \
+                        variant.time(result.x) <= path[-1].time + 1e-9:
+                    break
+            seconds = timer.perf_counter() - begin
+            nfev = sum(int(r.get('nfev', 0)) for r in candidates)
+            result = candidates[-1]
+            accepted = (bool(result.success) and violation(variant.constraints, result.x) <= 1e-8 and
+                    variant.time(result.x) <= path[-1].time + 1e-9)
+            if not accepted and dt > min_step:
+                dt /= 2
+                continue
+            t = 1. if t + dt > 1 - 1e-12 else t + dt
+            if accepted:
+                x = list(result.x)
+                dt = min(2*dt, 1./steps)
+            path.append(record(t, x, bool(result.success), accepted, seconds, nfev))
+    return path
+
+
+def onsets(path, tol=1e-5):
+    """
+    For each gamma, the first step of the path from which it stays above tol
+    at the solution (None if it ends below): from this bound on, the "2" digits
+    of its level pay off.
+    """
+    res = {}
+    for name in path[0].x._fields:
+        if name.startswith("gamma"):
+            res[name] = None
+            for step in path[::-1]:
+                if getattr(step.x, name) <= tol:
+                    break
+                res[name] = step
+    return res
+
+
+if __name__ == "__main__":
+    from classical import model_classical
+    print("=========== CONTINUATION FROM BCJ TO {-1,0,1,2} ===========")
+    begin = timer.perf_counter()
+    path = continuation(verb=True)
+    print("Continuation: %.2fs, %i evaluations" % (timer.perf_counter() - begin, sum(s.nfev for s in path)))
+    for name, step in onsets(path).items():
+        print("%s pays off from gamma <= %s (time %s)" % (name, "-" if step is None else round_to_str(step.gamma_max),
+                "-" if step is None else round_to_str(step.time)))
+    with np.errstate(all='ignore'):
+        result = model_classical.solve(epigraph=True, cache=False)
+    print("Cold start: %.2fs, %i evaluations, time %s" % (result.seconds, result.nfev,
+            round_to_str(model_classical.time(result.x))))
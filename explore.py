@@ -0,0 +1,157 @@
+"""
+Batch exploration: how the optimum of a model moves when some parameters are
+fixed or get other bounds.
+
+A list of overrides (dicts {parameter : value or (lower, upper)}, see
+Model.variant) is solved in parallel processes (see runner.py), and the
+results are gathered in a table with one row per override: the bounds of the
+overridden parameters, the status, the time and all the parameters at the
+optimum. For instance, to move the bound on gamma1 in quantum_qw.py, or to fix
+delta:
+>>> from quantum_qw import model_quantum
+>>> table = explore(model_quantum, grid(gamma1=[ (0, b) for b in [0.005, 0.01, 0.02] ]))
+>>> table = explore(model_quantum, grid(delta=[ i/10. for i in range(11) ]))
+>>> print(to_csv(table))
+
+The variants share the batched constraints of the model (see model.py), which
+are built once before the processes are forked. SLSQP solves one problem at a
+time, so the solves are spread over the processes; the times and the
+violations of the constraints at the optima are then evaluated on the whole
+table at once, by the array kernels of macros.py (see evaluate).
+"""
+
+from runner import run_jobs
+import csv
+import functools
+import io
+import itertools
+import numpy as np
+
+
+def grid(**values):
+    """
+    The overrides of all the combinations of the given values, e.g.
+    grid(delta=[0, 0.5], gamma1=[(0, 0.01), (0, 0.02)]) has 4 elements.
+    """
+    names = list(values)
+    return [ dict(zip(names, combination)) for combination in itertools.product(*values.values()) ]
+
+
+def _array_max(*terms):
+    return functools.reduce(np.maximum, terms)
+
+
+def _evaluate(fun, columns, xs, **kwargs):
+    """
+    fun on the points xs, given by their columns, or point by point if it does
+    not accept arrays (e.g. it calls max or branches on its arguments).
+    """
+    try:
+        values = np.asarray(fun(columns, **kwargs), dtype=float)
+    except (TypeError, ValueError):
+        values = np.array([ fun(x) for x in xs ], dtype=float)
+    return np.broadcast_to(values, len(xs))
+
+
+def evaluate(model, xs):
+    """
+    The times and the maximal violations of the constraints of the model at the
+    points xs (one per row), as arrays. The variables are given to the time and
+    the constraints as arrays (of the values of each variable at all the
+    points), so that the array kernels evaluate all the points in one call.
+    """
+    xs = np.asarray(xs, dtype=float).reshape(-1, len(model.settype._fields))
+    columns = list(xs.T)
+    with np.errstate(all='ignore'):
+        times = _evaluate(model.time, columns, xs, max=_array_max)
+        violations = np.zeros(len(xs))
+        for c in model.constraints:
+            values = _evaluate(c['fun'], columns, xs)
+            violations = np.maximum(violations, np.abs(values) if c['type'] == 'eq' else -values)
+    return times, violations
+
+
+def _solve_variant(model, overrides, epigraph, nstarts, method):
+    variant = model.variant(overrides)
+    with np.errstate(all='ignore'):
+        result = variant.solve(epigraph=epigraph, nstarts=nstarts, workers=1, method=method)
+    return [ float(t) for t in result.x ], bool(result.success)
+
+
+def _bounds(value):
+    lower, upper = value if isinstance(value, (tuple, list)) else (value, value)
+    return (np.nan if lower is None else lower), (np.nan if upper is None else upper)
+
+
+def explore(model, overrides, epigraph=False, nstarts=1, method="SLSQP", workers=None, timeout=None,
+        verb=False):
+    """
+    Solves the variants of the model given by the overrides (see Model.variant),
+    on workers processes (default: the number of cores), each one for at most
+    timeout seconds if it is not None.
+
+    Returns a NumPy structured array with one row per override, in order, and
+    the fields:
+    - "<name>_min" and "<name>_max": the bounds of each overridden parameter;
+    - "status": "done", "error" or "timeout" (see runner.run_jobs);
+    - "success", "time", "violation" (of the constraints) and "seconds";
+    - one field per parameter of the model, at the optimum.
+    The numbers are NaN for the variants which failed.
+    """
+    names = []
+    for o in overrides:
+        names.extend(name for name in o if name not in names)
+    fields = ([ (name + suffix, float) for name in names for suffix in ["_min", "_max"] ] +
+            [ ("status", "U7"), ("success", bool), ("time", float), ("violation", float), ("seconds", float) ] +
+            [ (name, float) for name in model.settype._fields ])
+    table = np.zeros(len(overrides), dtype=fields)
+    for row, o in zip(table, overrides):
+        for name in names:
+            row[name + "_min"], row[name + "_max"] = _bounds(o[name]) if name in o else (np.nan, np.nan)
+
+    jobs = [ (_solve_variant, { 'model' : model, 'overrides' : o, 'epigraph' : epigraph,
+            'nstarts' : nstarts, 'method' : method }) for o in overrides ]
+    for i, status, value, seconds in run_jobs(jobs, workers=workers, timeout=timeout):
+        row = table[i]
+        row["status"], row["seconds"] = status, seconds
+        if status == "done":
+            x, row["success"] = value
+            for name, t in zip(model.settype._fields, x):
+                row[name] = t
+        else:
+            for name in model.settype._fields:
+                row[name] = np.nan
+        if verb:
+            print("[%.1fs] %s : %s" % (seconds, overrides[i], status))
+            if status == "error":
+                print(value)
+    # the variants share the time and the constraints of the model
+    table["time"] = table["violation"] = np.nan
+    done = table["status"] == "done"
+    if np.any(done):
+        xs = np.array([ table[name][done] for name in model.settype._fields ]).T
+        table["time"][done], table["violation"][done] = evaluate(model, xs)
+    return table
+
+
+def to_csv(table, path=None):
+    """
+    Writes the table returned by explore to the CSV file path, or returns it as
+    a string if path is None.
+    """
+    output = io.StringIO() if path is None else open(path, "w", newline="")
+    try:
+        writer = csv.writer(output)
+        writer.writerow(table.dtype.names)
+        for row in table:
+            writer.writerow(row.tolist())
+        if path is None:
+            return output.getvalue()
+    finally:
+        output.close()
+
+
+if __name__ == "__main__":
+    from quantum_qw import model_quantum
+    print("=========== QUANTUM WALK: FIXED DELTA ===========")
+    print(to_csv(explore(model_quantum, grid(delta=[ i/10. for i in range(11) ]), verb=True)))
@@ -0,0 +1,275 @@
+"""
+Finite-n evaluation of the models: the entropies of macros.py (and h and
+filtering of quantum_hgj_asymmetric.py) are asymptotic, and the exponents they
+give are only approached for large n. Here they are replaced by the exact log2
+of the numbers of vectors and of representations at a given n (divided by n,
+so that they remain comparable), and the numbers of digits and of bits of the
+modular constraints are integers:
+>>> from classical_bcj import model_bcj
+>>> result = integer_search(model_bcj, 200, verb=True)
+>>> sweep(model_bcj, [50, 100, 200, 500, 1000])
+
+finite_model(model, n) is the model whose constraints and time call the exact
+functions of exact_terms(n) instead of the asymptotic ones (the same
+functions, with their module globals replaced). A proportion a of n is rounded
+to the integer round(a*n). The counts of vectors and of representations are the ones
+of macros.py (log2_multinomial and log2_representations), shared with the
+concrete solvers.
+
+integer_search fixes the integer parameters (numbers of digits and bits, see
+INTEGERS) to multiples of 1/n, solves the model for the others (a linear
+program, see solve_fixed), and improves the integer parameters by a local
+search with steps of +-1/n, starting from the rounded asymptotic optimum. sweep does it for several n, warm-starting each n
+at the solution of the previous one.
+"""
+
+from macros import (value, check_constraints, wrap, epigraph_problem, with_jacobians, log2_multinomial,
+        log2_representations)
+from model import Model
+import collections
+import functools
+import re
+import types
+import numpy as np
+
+
+# the parameters which are integers over n: numbers of digits and of bits
+INTEGERS = re.compile(r"^(alpha\d*|gamma\d*|c\d*|a|b)$")
+
+
+def _counts(n, *proportions):
+    """
+    The integers nearest to the proportions times n (floats, duals or arrays).
+    """
+    return [ np.rint(np.asarray(value(a), dtype=float)*n).astype(np.int64) for a in proportions ]
+
+
+def _scalar(t):
+    """
+    t as a float if it is a 0-d array: NumPy scalars do not combine with duals.
+    """
+    return float(t) if np.ndim(t) == 0 else t
+
+
+@functools.lru_cache(maxsize=None)
+def exact_terms(n):
+    """
+    The exact counterparts at n of the functions g, f, h, filtering, p_good,
+    p_good_2, p_good_2_up, p_good_2_down and p_good_2_aux, by name: the log2 of
+    the number of vectors or the log2 probability, over n. Their value does not
+    depend on the derivatives of their arguments (they are piecewise constant).
+    """
+    def g(a, b):
+        return _scalar(log2_multinomial(n, _counts(n, a, b))/n)
+
+    def f(a, b, c):
+        return _scalar(log2_multinomial(n, _counts(n, a, b, c))/n)
+
+    def h(a):
+        return _scalar(log2_multinomial(n, _counts(n, a))/n)
+
+    def filtering(a, b):
+        # a vector of weight an avoids the support of a vector of weight bn
+        return _scalar(np.vectorize(lambda a, b : float(log2_multinomial(n - b, [a]) - log2_multinomial(n, [a]))/n)(
+                *_counts(n, a, b)))
+
+    def probability(parent, child):
+        # the pairs of vectors of the child level which are representations
+        # of a vector of the parent level: the digits of the children must
+        # add up to the ones of the parent, so their numbers of "1" are set by
+        # the split of the sum of the digits of the parent (into two halves,
+        # as equal as possible) and by their numbers of "-1" and "2"
+        ones, minus, twos = parent = tuple(int(t) for t in parent)
+        total = ones - minus + 2*twos
+        left, right = [ (half + int(child[1]) - 2*int(child[2]), int(child[1]), int(child[2]))
+                for half in (total//2, total - total//2) ]
+        return float(log2_multinomial(n, parent) + log2_representations(n, parent, left, right)
+                - log2_multinomial(n, left) - log2_multinomial(n, right))/n
+
+    def p_good_2(b0, a0, c0, b1, a1, c1):
+        counts = _counts(n, b0, a0, c0, b1, a1, c1)
+        return _scalar(np.vectorize(lambda *c : probability(c[:3], c[3:]))(*counts))
+
+    def p_good(a0, b0, a1, b1):
+        counts = _counts(n, a0, b0, a1, b1)
+        return _scalar(np.vectorize(lambda a0, b0, a1, b1 : probability((a0, b0, 0), (a1, b1, 0)))(*counts))
+
+    return { 'g' : g, 'f' : f, 'h' : h, 'filtering' : filtering, 'p_good' : p_good, 'p_good_2' : p_good_2,
+             'p_good_2_up' : p_good_2, 'p_good_2_down' : p_good_2, 'p_good_2_aux' : p_good_2 }
+
+
+def finite_function(f, n):
+    """
+    The function f, calling the functions of exact_terms(n) instead of the
+    global functions of the same names.
+    """
+    namespace = dict(f.__globals__)
+    namespace.update(exact_terms(n))
+    res = types.FunctionType(f.__code__, namespace, f.__name__, f.__defaults__, f.__closure__)
+    res.__kwdefaults__ = f.__kwdefaults__
+    return res
+
+
+def finite_model(model, n):
+    """
+    The model at n: its constraints and its time call the exact functions of
+    exact_terms(n).
+    """
+    constraints = [ dict(c, fun=wrap(finite_function(c['fun'].wrapped, n), c['fun'].settype))
+            for c in model.constraints ]
+    return Model(model.settype, constraints, finite_function(model.time, n), model.bounds, model.start,
+            tol=model.tol, maxiter=model.maxiter, name="%s n=%i" % (model.name, n))
+
+
+FiniteResult = collections.namedtuple('FiniteResult', 'n time x integers sizes evaluations')
+FiniteResult.__doc__ = """
+The result of integer_search at n: the time (the log2 of the cost over n, inf
+if no feasible point was found), the parameters x (a namedtuple), the integer parameters as integers (the numbers
+of digits and bits), the list sizes 2^{l*n} rounded to integers (for the
+parameters named l...), and the number of integer points evaluated.
+"""
+
+
+def solve_fixed(model, start):
+    """
+    Minimizes the time of the model at fixed integer parameters (fixed by
+    their bounds), where the constraints and the time are linear in the other
+    parameters (the functions of exact_terms(n) only take the integer ones),
+    with the max of the time replaced by variables (see
+    macros.epigraph_problem).
+    The linear program is solved in two phases with slack variables: first
+    the total violation of the constraints is minimized, then the time, at
+    this violation. Returns the total violation, the time and the parameters
+    (None if the linear programs fail).
+    """
+    import scipy.optimize
+    n = len(start)
+    objective, objective_jac, mycons, mybounds, z0 = epigraph_problem(model.time,
+            with_jacobians(model.constraints), model.bounds, start)
+    z0 = np.array(z0, dtype=float)
+    A_eq, b_eq, A_ub, b_ub = [], [], [], []
+    for c in mycons:
+        values, jac = np.atleast_1d(c['fun'](z0)), np.atleast_2d(c['jac'](z0))
+        # the constraint is values + jac (z - z0), = 0 or >= 0
+        rhs = jac @ z0 - values
+        if c['type'] == 'eq':
+            A_eq.append(jac)
+            b_eq.append(rhs)
+        else:
+            A_ub.append(-jac)
+            b_ub.append(-rhs)
+    stack = lambda rows : np.vstack(rows) if rows else np.zeros((0, len(z0)))
+    A_eq, A_ub = stack(A_eq), stack(A_ub)
+    b_eq, b_ub = [ np.concatenate(b) if b else np.zeros(0) for b in (b_eq, b_ub) ]
+    if not all(np.all(np.isfinite(t)) for t in (A_eq, b_eq, A_ub, b_ub)):
+        return np.inf, np.inf, None
+    # the slacks: two per 'eq' row, one per 'ineq' row
+    m_eq, m_ub = len(b_eq), len(b_ub)
+    slacks = 2*m_eq + m_ub
+    A_eq = np.hstack([A_eq, np.eye(m_eq), -np.eye(m_eq), np.zeros((m_eq, m_ub))])
+    A_ub = np.hstack([A_ub, np.zeros((m_ub, 2*m_eq)), -np.eye(m_ub)])
+    bounds = list(mybounds) + [(0, None)]*slacks
+    total = np.concatenate([np.zeros(len(z0)), np.ones(slacks)])
+    phase1 = scipy.optimize.linprog(total, A_ub, b_ub, A_eq, b_eq, bounds)
+    if phase1.status != 0:
+        return np.inf, np.inf, None
+    gradient = np.concatenate([objective_jac(z0), np.zeros(slacks)])
+    phase2 = scipy.optimize.linprog(gradient, np.vstack([A_ub, total]), np.append(b_ub, phase1.fun + 1e-12),
+            A_eq, b_eq, bounds)
+    z = (phase2 if phase2.status == 0 else phase1).x[:len(z0)]
+    x = z[:n]
+    # the exact violation and time, in case the model is not linear
+    v = sum(abs(t) if kind == 'eq' else max(-t, 0.) for kind, t in check_constraints(model.constraints, x))
+    return float(v), float(model.time(x)), x
+
+
+def _evaluate(model, n, names, point, start):
+    """
+    The score of the model at n with the integer parameters names fixed to
+    point/n: (total violation of the constraints, if above 1e-7, time), and the
+    other parameters (None if they cannot be computed).
+    """
+    variant = model.variant({ name : k/n for name, k in zip(names, point) })
+    start = [ value if lo is None or lo != hi else lo for value, (lo, hi) in zip(start, variant.bounds) ]
+    with np.errstate(all='ignore'):
+        try:
+            v, time, x = solve_fixed(variant, start)
+        except (ValueError, ZeroDivisionError, OverflowError):
+            return (np.inf, np.inf), None
+    if x is None or not np.isfinite(v):
+        return (np.inf, np.inf), None
+    return (0. if v <= 1e-7 else v, time), x
+
+
+def integer_search(model, n, x=None, integers=None, maxiter=200, verb=False):
+    """
+    Optimizes the model at n with integer parameters (see the module
+    docstring) by a local search: the neighbours of the current point change
+    one integer parameter by +-1, and the search moves to the best one while it
+    improves the score, the violation of the constraints first (the rounded
+    asymptotic optimum is often infeasible at small n), then the time. Returns
+    a FiniteResult.
+
+    @param x: the starting point (default: the asymptotic optimum of the model).
+    @param integers: the names of the integer parameters (default: the ones
+    which match INTEGERS).
+    """
+    if x is None:
+        with np.errstate(all='ignore'):
+            x = model.solve().x
+    names = integers or [ name for name in model.settype._fields if INTEGERS.match(name) ]
+    fields = model.settype._fields
+    exact = finite_model(model, n)
+    seen = {}
+    def evaluate(point):
+        if point not in seen:
+            seen[point] = _evaluate(exact, n, names, point, start)
+        return seen[point]
+
+    start = list(x)
+    point = tuple(int(round(x[fields.index(name)]*n)) for name in names)
+    score, best = evaluate(point)
+    for iteration in range(maxiter):
+        if best is not None:
+            start = list(best)
+        neighbours = [ point[:i] + (point[i] + step,) + point[i+1:] for i in range(len(point)) for step in (-1, 1) ]
+        s, p = min((evaluate(p)[0], p) for p in neighbours)
+        if not (s[0] < score[0] or (s[0] == score[0] and s[1] < score[1] - 1e-12)):
+            break
+        score, point = s, p
+        best = evaluate(point)[1]
+        if verb:
+            print("   n = %i: %s -> violation %.2g, time %.6f" % (n, dict(zip(names, point)), *score))
+    time = score[1] if score[0] == 0 else np.inf
+    x = model.astuple(best if best is not None else x)
+    sizes = { name : int(round(2.**(getattr(x, name)*n))) for name in fields if name.startswith('l') }
+    res = FiniteResult(n, time, x, dict(zip(names, point)), sizes, len(seen))
+    if verb:
+        print("n = %i: time %.6f (log2 cost %.2f), %s, list sizes %s (%i points)" % (n, time, time*n,
+                res.integers, sizes, len(seen)))
+    return res
+
+
+def sweep(model, ns, integers=None, verb=True):
+    """
+    integer_search for each n of ns (increasing), each one starting from the
+    solution of the previous one. Returns the list of FiniteResult, and prints
+    their times next to the asymptotic one.
+    """
+    with np.errstate(all='ignore'):
+        x = model.solve().x
+    asymptotic = float(model.time(x))
+    results = []
+    for n in ns:
+        results.append(integer_search(model, n, x, integers))
+        x = list(results[-1].x)
+        if verb:
+            print("n = %4i: time %.4f (asymptotic %.4f), log2 cost %.1f, %s" % (n, results[-1].time,
+                    asymptotic, results[-1].time*n, results[-1].integers))
+    return results
+
+
+if __name__ == "__main__":
+    from classical_bcj import model_bcj
+    print("=========== FINITE-N BCJ ===========")
+    sweep(model_bcj, [50, 100, 200, 500, 1000])
@@ -0,0 +1,230 @@
+"""
+Interval arithmetic, to evaluate our constraints and times with rigorous
+bounds (see certify.py).
+
+An Interval is a closed interval [lo, hi] of reals, or an array of them (lo and
+hi are NumPy arrays of the same shape), so that many boxes are evaluated in one
+call. Each operation rounds its bounds outwards, so that the result contains
+all the values of the operation on the elements of its operands. The floats
+met in the computations (e.g. the constant 1/4. in a constraint) are taken as
+exact.
+
+Comparisons (hence if, max and min) are True or False when they hold for all
+the elements of the intervals, and raise Undecided otherwise. Intervals are
+accepted by the entropy macros (xlx, g, f, p_good...) of macros.py, also as
+the values of Dual numbers (which then give an enclosure of the gradient).
+"""
+
+import numpy as np
+
+
+class Undecided(ValueError):
+    """
+    A comparison between intervals which holds for some of their elements only.
+    """
+
+
+class NotEnclosable(ValueError):
+    """
+    A function which has no interval extension, e.g. because it minimizes an
+    inner function numerically.
+    """
+
+
+def _down(t):
+    return np.nextafter(t, -np.inf)
+
+
+def _up(t):
+    return np.nextafter(t, np.inf)
+
+
+def _sum(a, b):
+    """
+    a + b rounded to nearest, and the rounding error (a + b exactly, minus the
+    result), by the TwoSum algorithm of Knuth.
+    """
+    with np.errstate(invalid='ignore', over='ignore'):
+        s = a + b
+        v = s - a
+        return s, (a - (s - v)) + (b - v)
+
+
+def _widen(lo, hi, ulps):
+    """
+    [lo, hi] enlarged by ulps units in the last place on each side, for the
+    results of the functions of libm (which are not correctly rounded).
+    """
+    with np.errstate(invalid='ignore'):
+        return (np.where(np.isfinite(lo), lo - ulps*np.spacing(np.abs(lo)), lo),
+                np.where(np.isfinite(hi), hi + ulps*np.spacing(np.abs(hi)), hi))
+
+
+class Interval:
+    __slots__ = ('lo', 'hi')
+    # numpy numbers defer to the operators of Interval
+    __array_ufunc__ = None
+
+    def __init__(self, lo, hi=None):
+        self.lo = np.asarray(lo, dtype=float)
+        self.hi = self.lo if hi is None else np.asarray(hi, dtype=float)
+
+    @staticmethod
+    def of(t):
+        return t if isinstance(t, Interval) else Interval(t)
+
+    @staticmethod
+    def stack(intervals):
+        """
+        The array of the (scalar) intervals.
+        """
+        intervals = [ Interval.of(t) for t in intervals ]
+        return Interval(np.array([ t.lo for t in intervals ]), np.array([ t.hi for t in intervals ]))
+
+    def __getitem__(self, index):
+        return Interval(self.lo[index], self.hi[index])
+
+    def __len__(self):
+        return len(self.lo)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self):
+        return "Interval(%r, %r)" % (self.lo.tolist(), self.hi.tolist())
+
+    def mid(self):
+        return (self.lo + self.hi)/2
+
+    def width(self):
+        return self.hi - self.lo
+
+    def contains(self, o):
+        o = Interval.of(o)
+        return bool(np.all((self.lo <= o.lo) & (o.hi <= self.hi)))
+
+    def interior(self, o):
+        """
+        Whether o is in the interior of self.
+        """
+        o = Interval.of(o)
+        return bool(np.all((self.lo < o.lo) & (o.hi < self.hi)))
+
+    # arithmetic
+
+    def __add__(self, o):
+        o = Interval.of(o)
+        # the bounds are moved outwards only if the sum is not exact
+        lo, error = _sum(self.lo, o.lo)
+        lo = np.where(error >= 0, lo, _down(lo))
+        hi, error = _sum(self.hi, o.hi)
+        hi = np.where(error <= 0, hi, _up(hi))
+        # inf - inf
+        return Interval(np.where(np.isnan(lo), -np.inf, lo), np.where(np.isnan(hi), np.inf, hi))
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return Interval(-self.hi, -self.lo)
+
+    def __sub__(self, o):
+        return self + (-Interval.of(o))
+
+    def __rsub__(self, o):
+        return (-self) + o
+
+    def __mul__(self, o):
+        o = Interval.of(o)
+        products = [ self.lo*o.lo, self.lo*o.hi, self.hi*o.lo, self.hi*o.hi ]
+        # 0 * inf is 0: the infinite bounds are not elements of the intervals
+        products = [ np.where(np.isnan(p), 0., p) for p in products ]
+        return Interval(_down(np.minimum.reduce(products)), _up(np.maximum.reduce(products)))
+
+    __rmul__ = __mul__
+
+    def inverse(self):
+        if np.any((self.lo <= 0) & (self.hi >= 0)):
+            raise ZeroDivisionError("Inverse of an interval containing 0")
+        return Interval(_down(1/self.hi), _up(1/self.lo))
+
+    def __truediv__(self, o):
+        return self * Interval.of(o).inverse()
+
+    def __rtruediv__(self, o):
+        return Interval.of(o) * self.inverse()
+
+    def __pow__(self, n):
+        if n != 2:
+            raise ValueError("Only squares of intervals are supported")
+        square = self*self
+        # the square of an interval containing 0
+        return Interval(np.where((self.lo <= 0) & (self.hi >= 0), 0., np.maximum(square.lo, 0.)), square.hi)
+
+    # comparisons
+
+    def _compare(self, o, certainly, certainly_not):
+        if np.all(certainly):
+            return True
+        if np.all(certainly_not):
+            return False
+        raise Undecided("Undecided comparison of intervals")
+
+    def __lt__(self, o):
+        o = Interval.of(o)
+        return self._compare(o, self.hi < o.lo, self.lo >= o.hi)
+
+    def __le__(self, o):
+        o = Interval.of(o)
+        return self._compare(o, self.hi <= o.lo, self.lo > o.hi)
+
+    def __gt__(self, o):
+        return Interval.of(o) < self
+
+    def __ge__(self, o):
+        return Interval.of(o) <= self
+
+    # entropy
+
+    def xlx(self, slope):
+        """
+        x log_2(x), clamped to -slope*x when x < 0 (slope >= 0). This function
+        decreases until 1/e and increases afterwards.
+        """
+        def xlx(t):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return np.where(t > 0, t*np.log2(np.where(t > 0, t, 1.)), -slope*t)
+        lower = xlx(np.clip(np.exp(-1), self.lo, self.hi))
+        upper = np.maximum(xlx(self.lo), xlx(self.hi))
+        return Interval(*_widen(lower, upper, 4))
+
+    def dxlx(self, slope):
+        """
+        The derivatives of xlx(slope) on the interval, where the derivative at
+        0 is any number in [-infinity, -slope].
+        """
+        with np.errstate(divide='ignore'):
+            lower = np.where(self.lo > 0, np.log2(np.maximum(self.lo, 0.)) + 1/np.log(2), -np.inf)
+            upper = np.where(self.hi > 0, np.log2(np.maximum(self.hi, 0.)) + 1/np.log(2), -slope)
+        lower = np.where(self.hi < 0, -slope, lower)
+        upper = np.where(self.lo <= 0, np.maximum(upper, -slope), upper)
+        return Interval(*_widen(lower, upper, 4))
+
+
+def interval_max(*terms):
+    """
+    Max of intervals, to give as the argument max of our time functions.
+    """
+    terms = [ Interval.of(t) for t in terms ]
+    return Interval(np.maximum.reduce([ t.lo for t in terms ]), np.maximum.reduce([ t.hi for t in terms ]))
+
+
+def dot(a, x):
+    """
+    Product of the matrix a (an Interval or an array of shape m x k) with the
+    vector x (an Interval or an array of length k).
+    """
+    a, x = Interval.of(a), Interval.of(x)
+    res = Interval(np.zeros(a.lo.shape[0]))
+    for j in range(a.lo.shape[1]):
+        res = res + a[:, j] * x[j]
+    return res
@@ -1,26 +1,406 @@
 """
 This file defines some functions used in our optimizations.
+
+The entropy macros (xlx, f, g, p_good, p_good_2_down, p_good_2_up) accept
+NumPy arrays of any shape as well as floats: arrays are evaluated
+elementwise (and broadcast together) in a single call. They also accept
+Dual numbers, which carry exact gradients (see grad and with_jacobians),
+and intervals, which give rigorous bounds (see interval.py).
 """
 
 from math import*
-import scipy.optimize as opt
+from interval import Interval, NotEnclosable
+import functools
+import itertools
+import numpy as np
 
 
 def check_constraints(constraints, solution) : 
     return [ (constraint['type'], constraint['fun'](solution)) for constraint in constraints ]
 
 
+def violation(constraints, solution):
+    """
+    Maximal violation of the constraints by the solution (0 if it satisfies them).
+    """
+    v = 0.
+    for constraint in constraints:
+        c = np.atleast_1d(constraint['fun'](solution))
+        v = max(v, np.max(np.abs(c)) if constraint['type'] == 'eq' else np.max(-c))
+    return v
+
+
 def wrap(f,g) :
     def inner(x):
         return f(g(*x))
+    inner.jac = grad(inner)
+    # kept for model.batch_constraints, which evaluates f on one namedtuple for all the constraints
+    inner.wrapped = f
+    inner.settype = g
     return inner
 
 
+def function_node(f):
+    """
+    The ast node of the function f (a def or a lambda), parsed from its source,
+    or None if the source is not found. The node of a lambda is the one of the
+    first lambda on its first line, e.g. the one given to wrap.
+    """
+    import ast
+    import inspect
+    import textwrap
+    import tokenize
+    try:
+        source = inspect.getsource(f)
+    except (OSError, TypeError):
+        return None
+    if f.__name__ != "<lambda>":
+        try:
+            return ast.parse(textwrap.dedent(source)).body[0]
+        except SyntaxError:
+            return None
+    source = source[source.find("lambda"):]
+    # the lambda stops at the first comma, closing bracket or end of line
+    # outside of its brackets
+    depth, end = 0, len(source)
+    lines = source.splitlines(keepends=True)
+    try:
+        for token in tokenize.generate_tokens(iter(lines).__next__):
+            if token.type == tokenize.OP and token.string in "([{":
+                depth += 1
+            elif token.type == tokenize.OP and token.string in ")]}" and depth > 0:
+                depth -= 1
+            elif depth == 0 and (token.string in (",", ")", "]", "}") or token.type == tokenize.NEWLINE):
+                line, column = token.start
+                end = sum(len(l) for l in lines[:line - 1]) + column
+                break
+    except (tokenize.TokenError, SyntaxError):
+        pass
+    try:
+        node = ast.parse(source[:end].strip(), mode="eval").body
+    except SyntaxError:
+        return None
+    return node if isinstance(node, ast.Lambda) else None
+
+
+#=================================
+# exact derivatives
+#====================================
+
+# step of the finite differences of opt.minimize
+EPS = 1.4901161193847656e-08
+
+
+class Dual:
+    """
+    A value together with its exact gradient, stored sparsely as a dict
+    {index of the variable: partial derivative}. Arithmetic and xlx propagate
+    the gradient (forward mode), so evaluating a constraint or an objective
+    on duals(x) gives its value and gradient at x in one pass.
+    Comparisons (hence max and min) only look at the value.
+    """
+    __slots__ = ('v', 'd')
+
+    def __init__(self, v, d):
+        self.v = v
+        self.d = d
+
+    def __add__(self, o):
+        if isinstance(o, Dual):
+            d = dict(self.d)
+            for i, t in o.d.items(): d[i] = d.get(i, 0.) + t
+            return Dual(self.v + o.v, d)
+        return Dual(self.v + o, self.d)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return Dual(-self.v, {i: -t for i, t in self.d.items()})
+
+    def __sub__(self, o):
+        return self + (-o)
+
+    def __rsub__(self, o):
+        return (-self) + o
+
+    def __mul__(self, o):
+        if isinstance(o, Dual):
+            d = {i: t*o.v for i, t in self.d.items()}
+            for i, t in o.d.items(): d[i] = d.get(i, 0.) + t*self.v
+            return Dual(self.v*o.v, d)
+        return Dual(self.v*o, {i: t*o for i, t in self.d.items()})
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, o):
+        if isinstance(o, Dual): return self * o.inverse()
+        return self * (1/o)
+
+    def __rtruediv__(self, o):
+        return self.inverse() * o
+
+    def inverse(self):
+        return Dual(1/self.v, {i: -t/self.v**2 for i, t in self.d.items()})
+
+    def xlx(self, slope):
+        """
+        x log_2(x), clamped to -slope*x when x < 0. At x = 0 the slope of
+        x log_2(x) is -infinity: we use the slope of its secant on [0, EPS]
+        instead, which is what a finite-difference step would see.
+        """
+        if isinstance(self.v, Interval):
+            slopes = self.v.dxlx(slope)
+            return Dual(self.v.xlx(slope), {i: t*slopes for i, t in self.d.items()})
+        if self.v < 0: return self * (-slope)
+        if self.v == 0: return Dual(0., {i: t*log(EPS, 2) for i, t in self.d.items()})
+        l = log(self.v, 2)
+        return Dual(self.v*l, {i: t*(l + 1/log(2)) for i, t in self.d.items()})
+
+    def __lt__(self, o): return self.v < value(o)
+    def __le__(self, o): return self.v <= value(o)
+    def __gt__(self, o): return self.v > value(o)
+    def __ge__(self, o): return self.v >= value(o)
+
+    def __float__(self):
+        return float(self.v)
+
+
+def value(t):
+    """
+    Value of t, whether t is a Dual or a number.
+    """
+    return t.v if isinstance(t, Dual) else t
+
+
+def duals(x):
+    """
+    The variables x as duals: the i-th one has gradient e_i.
+    """
+    return [Dual(t, {i: 1.}) for i, t in enumerate(x)]
+
+
+def derivative(y, n):
+    """
+    Dense gradient (of length n) of the result y of a computation on duals.
+    Constants have zero gradient.
+    """
+    res = np.zeros(n)
+    if isinstance(y, Dual):
+        for i, t in y.d.items(): res[i] = t
+    return res
+
+
+def jacobian(ys, n):
+    """
+    Dense jacobian (of shape len(ys) x n) of the results ys of a computation on
+    duals.
+    """
+    res = np.zeros((len(ys), n))
+    for k, y in enumerate(ys):
+        if isinstance(y, Dual):
+            for i, t in y.d.items(): res[k, i] = t
+    return res
+
+
+def sparse_jacobian(ys, n):
+    """
+    Jacobian of the results ys of a computation on duals, as a scipy.sparse
+    matrix of shape len(ys) x n: its structure is given by the variables on
+    which each dual depends.
+    """
+    import scipy.sparse
+    rows, cols, data = [], [], []
+    for k, y in enumerate(ys):
+        if isinstance(y, Dual):
+            for i, t in y.d.items():
+                rows.append(k)
+                cols.append(i)
+                data.append(t)
+    return scipy.sparse.csr_matrix((data, (rows, cols)), shape=(len(ys), n))
+
+
+def grad(f):
+    """
+    Exact gradient of a function f of the vector x (objectives and wrapped
+    constraints), to be given as 'jac' to opt.minimize.
+    """
+    def inner(x):
+        return derivative(f(duals(x)), len(x))
+    return inner
+
+
+def with_jacobians(constraints):
+    """
+    Adds to each constraint (built with wrap) its exact jacobian. The constraints
+    which already have one are kept as they are.
+    """
+    return [ constraint if 'jac' in constraint else dict(constraint, jac=constraint['fun'].jac)
+            for constraint in constraints ]
+
+
+def with_sparse_jacobians(constraints):
+    """
+    The constraints with sparse jacobians (see sparse_jacobian): their
+    'sparse_jac' if they have one (see model.batch_constraints), otherwise
+    computed on duals for the constraints built with wrap, or converted from
+    their dense 'jac'.
+    """
+    import scipy.sparse
+    res = []
+    for constraint in constraints:
+        fun = constraint['fun']
+        if 'sparse_jac' in constraint:
+            jac = constraint['sparse_jac']
+        elif hasattr(fun, 'wrapped'):
+            jac = lambda x, fun=fun : sparse_jacobian([ fun(duals(x)) ], len(x))
+        else:
+            jac = lambda x, jac=constraint['jac'] : scipy.sparse.csr_matrix(np.atleast_2d(jac(x)))
+        res.append({ 'type' : constraint['type'], 'fun' : fun, 'jac' : jac })
+    return res
+
+
+def epigraph_problem(time, constraints, bounds, start, sparse=False):
+    """
+    Smooth (epigraph) reformulation of the minimization of a time function
+    made of nested max. The time function must take the max function as a
+    keyword argument 'max'. Each call to max in it gets an auxiliary variable
+    u_j, with the constraints u_j >= term for each of its terms, and is replaced
+    by u_j; in particular the outermost max becomes the variable T to minimize.
+    The terms inside the max appear with positive coefficients in our time
+    functions, so that both problems have the same optimum.
+
+    Returns the objective, its jacobian, the constraints, the bounds and the
+    starting point of the new problem, whose variables are x followed by the u_j
+    (the u_j start at the values of the max at the starting point).
+    If sparse is True, the jacobians of the constraints must be sparse, and so
+    are the ones of the new constraints.
+    """
+    n = len(start)
+    values = []
+    def record_max(*terms):
+        values.append(max(terms))
+        return values[-1]
+    time(start, max=record_max)
+
+    def trace(z):
+        """
+        Returns the time with each max replaced by its auxiliary variable, and
+        the list of the differences u_j - term.
+        """
+        diffs = []
+        nodes = []
+        def aux_max(*terms):
+            u = z[n + len(nodes)]
+            nodes.append(u)
+            diffs.extend([u - t for t in terms])
+            return u
+        return time(z[:n], max=aux_max), diffs
+
+    def extend(constraint):
+        fun, jac = constraint['fun'], constraint['jac']
+        # the jacobian of a vector constraint is a matrix
+        def extended_jac(z):
+            j = jac(z[:n])
+            if sparse:
+                import scipy.sparse
+                return scipy.sparse.hstack([j, scipy.sparse.csr_matrix((j.shape[0], len(values)))], format='csr')
+            return np.concatenate([j, np.zeros(j.shape[:-1] + (len(values),))], axis=-1)
+        return dict(constraint, fun=lambda z: fun(z[:n]), jac=extended_jac)
+
+    def trace_jac(z):
+        diffs = trace(duals(z))[1]
+        if sparse:
+            return sparse_jacobian(diffs, len(z))
+        return np.array([ derivative(t, len(z)) for t in diffs ])
+
+    mycons = [ extend(constraint) for constraint in constraints ] + [
+        { 'type' : 'ineq', 'fun' : lambda z : np.array([ value(t) for t in trace(z)[1] ]),
+          'jac' : trace_jac } ]
+    return (lambda z : value(trace(z)[0]), grad(lambda z : trace(z)[0]), mycons,
+            list(bounds) + [(None, None)]*len(values), list(start) + values)
+
+
+def _slsqp(fun, jac, start, bounds, constraints, tol, maxiter, callback):
+    # scipy.optimize takes a long time to import: only when needed
+    import scipy.optimize as opt
+    return opt.minimize(fun, start, jac=jac, bounds=bounds, tol=tol,
+            constraints=constraints, options={'maxiter': maxiter}, callback=callback)
+
+
+def _trust_constr(fun, jac, start, bounds, constraints, tol, maxiter, callback):
+    import scipy.optimize as opt
+    # the hessians of the objective and of the constraints are approximated by BFGS
+    return opt.minimize(fun, start, jac=jac, hess=opt.BFGS(), bounds=bounds, tol=tol,
+            constraints=constraints, method="trust-constr", options={'maxiter': maxiter},
+            callback=None if callback is None else lambda x, state : callback(x))
+
+
+def _ipopt(fun, jac, start, bounds, constraints, tol, maxiter, callback):
+    try:
+        from cyipopt import minimize_ipopt
+    except ImportError:
+        raise ImportError("The method 'ipopt' needs cyipopt (e.g. conda install -c conda-forge cyipopt)")
+    # minimize_ipopt takes dense jacobians, and has no callback
+    constraints = [ dict(c, jac=lambda x, jac=c['jac'] : jac(x).toarray()) for c in constraints ]
+    return minimize_ipopt(fun, start, jac=jac, bounds=bounds, tol=tol,
+            constraints=constraints, options={'max_iter': maxiter})
+
+
+# the solvers accepted by minimize: the ones other than SLSQP get sparse jacobians
+SOLVERS = { "SLSQP" : _slsqp, "trust-constr" : _trust_constr, "ipopt" : _ipopt }
+
+
+def minimize(time, start, bounds, constraints, tol, maxiter, epigraph=False, callback=None, method="SLSQP"):
+    """
+    Minimizes the time function under the constraints (built with wrap) with
+    SLSQP, using exact gradients.
+
+    If epigraph is True, the smooth reformulation given by epigraph_problem is
+    solved instead. Then result.x is cut to the original variables, and
+    result.epigraph is the optimum of the reformulated problem.
+
+    If not None, callback is called with the current point after each
+    iteration (the point of the reformulated problem if epigraph is True).
+
+    @param method: the solver, among SOLVERS: "SLSQP", "trust-constr" (interior
+    point of scipy, with BFGS hessians) or "ipopt" (needs cyipopt). The last two
+    get the jacobians of the constraints as sparse matrices, and work much
+    better with epigraph=True, since the time is not smooth.
+    """
+    if method not in SOLVERS:
+        raise ValueError("Invalid method: " + str(method))
+    solver = SOLVERS[method]
+    sparse = method != "SLSQP"
+    constraints = with_sparse_jacobians(constraints) if sparse else with_jacobians(constraints)
+    if not epigraph:
+        return solver(time, grad(time), start, bounds, constraints, tol, maxiter, callback)
+
+    objective, jac, mycons, mybounds, mystart = epigraph_problem(time, constraints, bounds, start, sparse)
+    result = solver(objective, jac, mystart, mybounds, mycons, tol, maxiter, callback)
+    result.epigraph = result.fun
+    result.x = result.x[:len(start)]
+    result.fun = time(result.x)
+    return result
+
+
 #=================================
 # macros used in quantum_qw.py and quantum_qw_no_heuristic.py
 #====================================
 
+def xlx_array(x, slope=100):
+    """
+    Vectorized xlx: x log_2(x) elementwise. Non-positive entries are clamped
+    to -slope*x, so slope = 100 gives the penalized xlx of this file and
+    slope = 0 the one of classical.py and quantum_hgj_asymmetric.py.
+    """
+    x = np.asarray(x, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(x > 0, x*np.log2(x), -slope*x)
+
+
 def xlx(x):
+    if isinstance(x, (Dual, Interval)): return x.xlx(100)
+    if isinstance(x, np.ndarray): return xlx_array(x)
     if x<=0: return - 100*x
     return x*log(x, 2)
 
@@ -59,6 +439,126 @@ def p_good(a0, b0, a1, b1):
     return -2*xlx(a0/2) - 2*xlx(b0/2) - xlx(a1-a0/2) - xlx(b1-b0/2) - xlx(1-a1-b1-a0/2-b0/2) - 2*g(a1, b1)
     
 
+#=================================
+# exact counts at a given n, used in concrete*.py and finite.py
+#====================================
+
+# the ways to write each digit as the sum of two digits of {-1,0,1,2}
+PAIRS = { -1 : [(-1, 0), (0, -1)],
+           0 : [(0, 0), (1, -1), (-1, 1)],
+           1 : [(1, 0), (0, 1), (2, -1), (-1, 2)],
+           2 : [(2, 0), (0, 2), (1, 1)] }
+
+# the digits counted in a vector: "1", "-1" and "2"
+KINDS = (1, -1, 2)
+
+
+@functools.lru_cache(maxsize=None)
+def log2_factorials(n):
+    """
+    The array of log2(k!) for k = 0..n.
+    """
+    return np.array([ lgamma(k + 1) for k in range(n + 1) ])/log(2)
+
+
+def log2_multinomial(n, counts):
+    """
+    log2 of the number of ways to place counts[0] digits of a first kind,
+    counts[1] of a second kind... on n positions (-inf if impossible). The
+    counts can be arrays of integers, broadcast together (then so is the
+    result).
+    """
+    if n < 0:
+        return -np.inf
+    lf = log2_factorials(int(n))
+    scalar = all(np.ndim(c) == 0 for c in counts)
+    counts = np.broadcast_arrays(*[ np.asarray(c, dtype=np.int64) for c in counts ])
+    rest = n - sum(counts)
+    valid = (rest >= 0) & np.all([ c >= 0 for c in counts ], axis=0)
+    clip = lambda c : np.clip(c, 0, n)
+    res = np.where(valid, lf[n] - lf[clip(rest)] - sum(lf[clip(c)] for c in counts), -np.inf)
+    return float(res) if scalar else res
+
+
+def log2_count(n, ones, minus):
+    """
+    log2 of the number of vectors with ones "1" and minus "-1" on n positions.
+    """
+    return log2_multinomial(n, [ones, minus])
+
+
+# the unknowns of the representations: the number of positions of each digit
+# of the parent which are the sum of each pair of digits (see PAIRS)
+_UNKNOWNS = [ (d, pair) for d in sorted(PAIRS) for pair in PAIRS[d] ]
+
+
+@functools.lru_cache(maxsize=None)
+def _system():
+    """
+    The linear system satisfied by the unknowns: their sum per digit of the
+    parent, and their numbers of each digit of KINDS on the left and on the
+    right. Returns the matrix and the pairs of unknowns which can be chosen
+    as the free ones (the others are then determined).
+    """
+    rows = [ [ float(u[0] == d) for u in _UNKNOWNS ] for d in sorted(PAIRS) ]
+    for side in range(2):
+        rows += [ [ float(u[1][side] == k) for u in _UNKNOWNS ] for k in KINDS ]
+    A = np.array(rows)
+    rank = np.linalg.matrix_rank(A)
+    free = []
+    for columns in itertools.combinations(range(len(_UNKNOWNS)), len(_UNKNOWNS) - rank):
+        rest = [ j for j in range(len(_UNKNOWNS)) if j not in columns ]
+        if np.linalg.matrix_rank(A[:, rest]) == rank:
+            free.append(columns)
+    return A, rank, free
+
+
+def log2_representations(n, parent, left, right):
+    """
+    log2 of the number of ways to write a vector of {-1,0,1,2}^n with parent =
+    (ones, minus, twos) as the sum of a vector with left = (ones, minus, twos)
+    and a vector with right = (ones, minus, twos). Vectors of {-1,0,1}^n can
+    be given as (ones, minus).
+    """
+    parent, left, right = [ tuple(int(t) for t in v) + (0,)*(3 - len(v)) for v in (parent, left, right) ]
+    return _log2_representations(int(n), parent, left, right)
+
+
+@functools.lru_cache(maxsize=None)
+def _log2_representations(n, parent, left, right):
+    # the sum over the ways to split the positions of each digit of the parent
+    # among its pairs, evaluated on the grid of the free unknowns at once
+    totals = dict(zip(KINDS, parent))
+    totals[0] = n - sum(parent)
+    if min(totals.values()) < 0 or min(left + right) < 0:
+        return -np.inf
+    A, rank, free = _system()
+    b = np.array([ totals[d] for d in sorted(PAIRS) ] + list(left) + list(right), dtype=float)
+    # an unknown is at most the right-hand side of each of its equations
+    upper = [ int(min(b[i] for i in range(len(b)) if A[i, j])) for j in range(len(_UNKNOWNS)) ]
+    columns = min(free, key=lambda columns : np.prod([ upper[j] + 1 for j in columns ]))
+    rest = [ j for j in range(len(_UNKNOWNS)) if j not in columns ]
+    grid = np.stack([ t.ravel() for t in np.meshgrid(*[ np.arange(upper[j] + 1) for j in columns ],
+            indexing='ij') ]).reshape(len(columns), -1)
+    # the least-squares solution is exact, since the equations are consistent
+    # when there is an integer solution
+    M = A[:, rest]
+    solution = np.linalg.lstsq(M, b[:, None] - A[:, list(columns)] @ grid, rcond=None)[0]
+    rounded = np.rint(solution)
+    valid = (np.all(rounded >= 0, axis=0) & np.all(np.abs(solution - rounded) < 1e-6, axis=0) &
+            np.all(np.abs(M @ rounded + A[:, list(columns)] @ grid - b[:, None]) < 1e-6, axis=0))
+    if not np.any(valid):
+        return -np.inf
+    unknowns = np.zeros((len(_UNKNOWNS), int(valid.sum())), dtype=np.int64)
+    unknowns[list(columns)] = grid[:, valid]
+    unknowns[rest] = rounded[:, valid]
+    lf = log2_factorials(n)
+    log2_ways = sum(lf[totals[d]] - sum(lf[unknowns[j]] for j, u in enumerate(_UNKNOWNS) if u[0] == d)
+            for d in sorted(PAIRS))
+    top = log2_ways.max()
+    return float(top + np.log2(np.sum(np.exp2(log2_ways - top))))
+
+
 def round_to_str(t):
     """
     Rounds the value 't' to a string with 4 digit precision (adding trailing zeroes
@@ -1,6 +1,9 @@
-
 """
 Runs separately all our optimization programs and shows our results.
+
+The optimizations run in parallel processes; each exponent is printed as soon
+as it is obtained, then all of them in order. Run:
+    python main.py [--workers N] [--timeout SECONDS] [--no-cache]
 """
 
 from macros import *
@@ -9,23 +12,51 @@ from classical import optimize_classical
 from quantum_qw import optimize_quantum
 from quantum_qw_no_heuristic import optimize_quantum_without_heuristic
 from quantum_hgj_asymmetric import optimize_hgj
+from runner import run_jobs
+import argparse
+import cache
+
+
+jobs = [
+(optimize_bcj_classical, {}, "Classical BCJ algorithm with relaxed constraints (Section 2.4, second paragraph)"),
+(optimize_classical, {}, "New classical algorithm with {-1,0,1,2} representations (Section 2.4)."),
+(optimize_hgj, {'flag' : "classical"}, "Classical HGJ algorithm"),
+(optimize_hgj, {'flag' : "quantum1"}, "Quantum asymmetric HGJ algorithm (Section 4.2)"),
+(optimize_hgj, {'flag' : "quantum2"}, "Quantum asymmetric HGJ algorithm with quantum filtering (Section 4.3)"),
+(optimize_quantum, {}, "New heuristic quantum walk algorithm (Section 5.3)"),
+(optimize_quantum_without_heuristic, {}, "New non-heuristic quantum walk algorithm (Section 6.3)")
+]
 
 
-print("======= RUNNING ALL OPTIMIZATIONS ============")
+def exponent(optimize, kwargs):
+    return optimize(verb=False, **kwargs)[1]
 
-results = [
-(optimize_bcj_classical(verb=False)[1], "Classical BCJ algorithm with relaxed constraints (Section 2.4, second paragraph)"),
-(optimize_classical(verb=False)[1], "New classical algorithm with {-1,0,1,2} representations (Section 2.4)."),
-(optimize_hgj(verb=False,flag="classical")[1], "Classical HGJ algorithm"),
-(optimize_hgj(verb=False,flag="quantum1")[1], "Quantum asymmetric HGJ algorithm (Section 4.2)"),
-(optimize_hgj(verb=False,flag="quantum2")[1], "Quantum asymmetric HGJ algorithm with quantum filtering (Section 4.3)"),
-(optimize_quantum(verb=False)[1], "New heuristic quantum walk algorithm (Section 5.3)"),
-(optimize_quantum_without_heuristic(verb=False)[1], "New non-heuristic quantum walk algorithm (Section 6.3)")
-]
 
-print("======= SHOWING ALL OPTIMIZATION RESULTS ============")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs all our optimizations.")
+    parser.add_argument("--workers", type=int, default=None,
+            help="number of optimizations run in parallel (default: the number of cores)")
+    parser.add_argument("--timeout", type=float, default=None,
+            help="maximal time of each optimization, in seconds")
+    parser.add_argument("--no-cache", action="store_true",
+            help="do not reuse nor store the results (see cache.py)")
+    args = parser.parse_args()
+
+    # the results are reused as long as the code does not change (see cache.py)
+    if not args.no_cache:
+        cache.enable()
+
+    print("======= RUNNING ALL OPTIMIZATIONS ============")
 
+    results = [None]*len(jobs)
+    for i, status, value, seconds in run_jobs([ (exponent, {'optimize' : optimize, 'kwargs' : kwargs})
+            for optimize, kwargs, label in jobs ], workers=args.workers, timeout=args.timeout):
+        results[i] = round_upwards_to_str(value) if status == "done" else status
+        print("[%.1fs] %s : %s" % (seconds, jobs[i][2], results[i]))
+        if status == "error":
+            print(value)
 
-for t in results:
-    print(t[1]," : ", round_upwards_to_str(t[0]))
+    print("======= SHOWING ALL OPTIMIZATION RESULTS ============")
 
+    for (optimize, kwargs, label), result in zip(jobs, results):
+        print(label, " : ", result)
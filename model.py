@@ -0,0 +1,340 @@
+"""
+Optimization models.
+
+A Model gathers what each optimization file declares: the parameters (each
+declared once, with its bounds and its starting value, see parameters), the
+constraints (built with wrap) and the time function. It solves the problem
+(directly or with multistart) and prints the results in the same way for all
+our optimizations:
+>>> from classical_bcj import model_bcj
+>>> model_bcj.optimize()
+
+The constraints and the times are written as functions of a namedtuple of the
+parameters. The model gives the constraints to the solver as one vector
+constraint per type, which builds the namedtuple (or the one of duals, for the
+jacobian) once for all the constraints (see batch_constraints).
+
+A Model unpacks as the tuple (namedtuple type, constraints, time, bounds),
+which is what multistart takes.
+"""
+
+from macros import minimize, duals, jacobian, sparse_jacobian, violation, check_constraints, round_to_str, round_upwards_to_str
+import ast
+import collections
+import copy
+import functools
+import os
+import sys
+import time as timer
+import numpy as np
+
+
+def _evaluate(group):
+    """
+    A function of the vector x returning the list of the values of the
+    constraints of group. If they are all built with wrap on the same
+    namedtuple type, it builds the namedtuple once and evaluates their
+    functions on it; otherwise, it calls each constraint.
+    """
+    settypes = { getattr(c['fun'], 'settype', None) for c in group }
+    if len(settypes) != 1 or None in settypes:
+        funs = [ c['fun'] for c in group ]
+        return lambda x : [ fun(x) for fun in funs ]
+    settype, = settypes
+    functions = [ c['fun'].wrapped for c in group ]
+    def evaluate(x):
+        t = settype(*x)
+        return [ f(t) for f in functions ]
+    return evaluate
+
+
+def batch_constraints(constraints):
+    """
+    Groups the constraints (built with wrap) into one vector 'eq' constraint
+    and one vector 'ineq' constraint, in the form accepted by opt.minimize.
+    Their functions evaluate all the constraints of their group on one
+    namedtuple of the parameters, and their jacobians on one list of duals
+    (see _evaluate), instead of one per constraint. The order of the
+    constraints within each group is kept, so that SLSQP solves the same
+    problem. Their 'sparse_jac' gives the jacobians as sparse matrices (see
+    macros.with_sparse_jacobians).
+    """
+    batched = []
+    for kind in ['eq', 'ineq']:
+        group = [ constraint for constraint in constraints if constraint['type'] == kind ]
+        if not group:
+            continue
+        evaluate = _evaluate(group)
+        batched.append({ 'type' : kind,
+            'fun' : lambda x, evaluate=evaluate : np.hstack(evaluate(x)).astype(float),
+            'jac' : lambda x, evaluate=evaluate : jacobian(evaluate(duals(x)), len(x)),
+            'sparse_jac' : lambda x, evaluate=evaluate : sparse_jacobian(evaluate(duals(x)), len(x)) })
+    return batched
+
+
+def _describe(t):
+    """
+    t with the functions replaced by their names, since their repr changes
+    from one run to another.
+    """
+    if isinstance(t, (list, tuple)):
+        return [ _describe(u) for u in t ]
+    if callable(t):
+        return getattr(t, '__qualname__', repr(t))
+    return t
+
+
+def parameters(typename, variables):
+    """
+    The namedtuple type of the parameters, their bounds and their starting
+    point, from the list of variables, each declared once as (name, (lower,
+    upper), start). The namedtuple type belongs to the module of the caller.
+    """
+    module = sys._getframe(1).f_globals.get('__name__')
+    settype = collections.namedtuple(typename, [ name for name, bounds, start in variables ], module=module)
+    return (settype, [ tuple(bounds) for name, bounds, start in variables ],
+            [ start for name, bounds, start in variables ])
+
+
+@functools.lru_cache(maxsize=None)
+def _local_imports(filename):
+    """
+    The files of the modules imported by the file filename (anywhere in it)
+    which lie in its directory, i.e. the modules of this repository.
+    """
+    try:
+        with open(filename) as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError):
+        return ()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    paths = [ os.path.join(os.path.dirname(filename), name.split(".")[0] + ".py") for name in names ]
+    return tuple(sorted(path for path in paths if os.path.isfile(path)))
+
+
+def _with_imports(files):
+    """
+    The files, together with the files of this repository that they import,
+    directly or not.
+    """
+    res, todo = set(), list(files)
+    while todo:
+        f = todo.pop()
+        if f not in res:
+            res.add(f)
+            todo.extend(_local_imports(f))
+    return res
+
+
+class Model:
+    """
+    An optimization problem: minimize time(x) under the constraints, within the
+    bounds, starting from start (see the module docstring).
+
+    @param settype: the namedtuple type of the parameters.
+    @param name: identifies the model in the cache (see cache.py), with the
+    options of its definition, e.g. "hgj quantum2 mcons=0.1".
+    @param constraints: a list of constraints built with wrap.
+    @param time: the time function (of the vector of parameters).
+    @param tol, maxiter: the parameters of SLSQP.
+    @param reports: a list of (label, function of the parameters) printed by
+    show after the time, e.g. the memory.
+    @param batched: give the constraints to the solver as one vector constraint
+    per type (see batch_constraints). The constraints attribute still lists them
+    one by one, e.g. for show.
+    @param epigraph: the default of optimize: minimize the smooth reformulation
+    of the time (see macros.epigraph_problem) instead of the time.
+    """
+
+    def __init__(self, settype, constraints, time, bounds, start, tol=1e-10, maxiter=5000,
+            reports=(), batched=True, name=None, epigraph=False):
+        if not len(settype._fields) == len(bounds) == len(start):
+            raise ValueError("Inconsistent numbers of parameters, bounds and starting values")
+        self.settype = settype
+        self.name = name if name is not None else settype.__name__
+        self.bounds = list(bounds)
+        self.start = [ float(t) for t in start ]
+        self.tol = tol
+        self.maxiter = maxiter
+        self.reports = list(reports)
+        self.epigraph = epigraph
+        self.constraints = list(constraints)
+        self.time = time
+        # the constraints given to the solver
+        self.batch = batch_constraints(self.constraints) if batched else self.constraints
+
+    def __iter__(self):
+        return iter((self.settype, self.batch, self.time, self.bounds))
+
+    def astuple(self, x):
+        return self.settype(*x)
+
+    def variant(self, overrides):
+        """
+        The same model, where each parameter in overrides (a dict {name : value
+        or (lower, upper)}) is fixed to the value or given the new bounds. The
+        starting point is moved inside the new bounds. The batched constraints
+        are shared with this model.
+        """
+        res = copy.copy(self)
+        res.bounds = list(self.bounds)
+        res.start = list(self.start)
+        for name, bounds in overrides.items():
+            if name not in self.settype._fields:
+                raise ValueError("Unknown parameter: " + str(name))
+            i = self.settype._fields.index(name)
+            if not isinstance(bounds, (tuple, list)):
+                bounds = (bounds, bounds)
+            lower, upper = [ None if t is None else float(t) for t in bounds ]
+            res.bounds[i] = (lower, upper)
+            res.start[i] = min(max(res.start[i], -np.inf if lower is None else lower),
+                    np.inf if upper is None else upper)
+        res.name = "%s %s" % (self.name, " ".join("%s=%s" % item for item in overrides.items()))
+        return res
+
+    def definition(self):
+        """
+        Everything that determines the solutions of the model, for the keys
+        of the cache: the code of the constraints and of the time (with their
+        positions, closures and defaults) and the contents of their files, of
+        this file, and of the files of this repository that they import (see
+        _with_imports), e.g. macros.py and interval.py.
+        """
+        import cache as _cache
+        functions = [ c['fun'] for c in self.constraints ] + [ self.time ]
+        sources = []
+        files = { __file__ }
+        for f in functions:
+            f = getattr(f, 'wrapped', None) or f
+            code = f.__code__
+            try:
+                closure = [ cell.cell_contents for cell in f.__closure__ or () ]
+            except ValueError:
+                closure = None
+            sources.append([ os.path.basename(code.co_filename), code.co_firstlineno, code.co_code.hex(),
+                    _describe(closure), _describe(f.__defaults__) ])
+            files.add(code.co_filename)
+        return { 'name' : self.name, 'parameters' : self.settype._fields,
+                 'types' : [ c['type'] for c in self.constraints ], 'sources' : sources,
+                 'bounds' : self.bounds, 'tol' : self.tol, 'maxiter' : self.maxiter,
+                 'files' : { os.path.basename(f) : _cache.file_hash(f) for f in sorted(_with_imports(files)) } }
+
+    def solve(self, start=None, epigraph=False, nstarts=1, workers=None, cache=None, method="SLSQP"):
+        """
+        Minimizes the time from start (default: the starting point of the model).
+        See optimize for epigraph (False by default here), nstarts and workers.
+
+        @param cache: the cache of results (see cache.py), or False to not use
+        any. By default, the cache enabled by cache.enable, if any.
+        @param method: the solver (see macros.minimize), e.g. "trust-constr".
+
+        If profiling is enabled (see profiling.py), the cache is not used and
+        the solve is recorded by the profiler (the starts of a multistart run
+        one after the other).
+        """
+        # the cache, the profiler and multistart are optional features: their
+        # modules are only imported by the solves
+        import cache as _cache
+        import profiling
+        if start is None:
+            start = self.start
+        profiler = profiling.active()
+        if profiler is not None:
+            begin = timer.perf_counter()
+            result = profiler.solve(self, start, epigraph, method, nstarts)
+            result.seconds = timer.perf_counter() - begin
+            return result
+
+        store = cache if cache is not None else _cache.default()
+        if store:
+            options = { 'start' : [ float(t) for t in start ], 'epigraph' : epigraph, 'nstarts' : nstarts,
+                        'method' : method }
+            key = _cache.make_key([ self.definition(), options ])
+            result = store.get(key)
+            if result is not None:
+                return result
+
+        begin = timer.perf_counter()
+        if nstarts > 1:
+            from multistart import multistart
+            result = multistart(self, nstarts, start=start, workers=workers, tol=self.tol,
+                    maxiter=self.maxiter, epigraph=epigraph, method=method)[0]
+        else:
+            result = minimize(self.time, start, self.bounds, self.batch, tol=self.tol,
+                    maxiter=self.maxiter, epigraph=epigraph, method=method)
+        result.seconds = timer.perf_counter() - begin
+        if store:
+            label = "%s epigraph=%s nstarts=%i method=%s" % (self.name, epigraph, nstarts, method)
+            store.put(key, label, result, result.seconds)
+        return result
+
+    def show(self, result, epigraph=False):
+        """
+        Prints the result of solve.
+        """
+        astuple = self.astuple(result.x)
+        print("Validity: ", result.success)
+        print("Time: ", round_upwards_to_str(self.time(astuple)))
+        if epigraph:
+            print("Time (epigraph): ", round_upwards_to_str(result.epigraph))
+        for label, function in self.reports:
+            print(label + ": ", round_upwards_to_str(function(astuple)))
+        for t in astuple._asdict():
+            print(t, round_to_str(astuple._asdict()[t]) )
+        print("Checking that the constraints are satisfied:")
+        print(check_constraints(self.constraints, result.x))
+
+    def optimize(self, verb=True, epigraph=None, nstarts=1, workers=None, start=None, cache=None,
+            method="SLSQP"):
+        """
+        Solves the model (see solve) and prints the result if verb is True.
+        Returns the success of the optimization, the time and the result.
+
+        @param epigraph: if True, minimizes instead the smooth reformulation of
+        the time (see macros.epigraph_problem) and also prints its optimum. By
+        default, the one of the model.
+        @param nstarts: if more than 1, runs also the optimization from nstarts
+        starting points sampled in the bounds, on workers processes, and keeps
+        the best result (see multistart.py).
+        @param start, cache, method: see solve.
+        """
+        if epigraph is None:
+            epigraph = self.epigraph
+        result = self.solve(start, epigraph, nstarts, workers, cache, method)
+        if verb:
+            self.show(result, epigraph)
+        return result.success, self.time(result.x), result
+
+    def compare(self, methods=("SLSQP", "trust-constr", "ipopt"), epigraph=True, start=None, verb=True,
+            feastol=1e-7):
+        """
+        Solves the model with each solver of methods (see macros.minimize),
+        without the cache. Returns a dict method -> (seconds, time, success,
+        maximal violation of the constraints), or None for the solvers which
+        are not installed, and prints it if verb is True. A result whose
+        violation is above feastol is not a success, whatever the solver says,
+        and is printed as FAILED.
+        """
+        rows = {}
+        for method in methods:
+            try:
+                result = self.solve(start, epigraph, cache=False, method=method)
+            except ImportError:
+                rows[method] = None
+                continue
+            v = violation(self.constraints, result.x)
+            rows[method] = (result.seconds, self.time(result.x), bool(result.success and v <= feastol), v)
+        if verb:
+            print("%s (epigraph=%s):" % (self.name, epigraph))
+            for method, row in rows.items():
+                if row is None:
+                    print("   %-14s not installed" % method)
+                else:
+                    print("   %-14s %8.3fs  time %s  success %s  violation %.1e%s" % ((method, row[0],
+                            round_upwards_to_str(row[1])) + row[2:] + ("" if row[2] else "  FAILED",)))
+        return rows
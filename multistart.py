@@ -0,0 +1,153 @@
+"""
+Multi-start optimization: runs SLSQP from many starting points sampled in the
+bounds of a model, in parallel, and collects the distinct local optima.
+
+A model is a tuple (namedtuple type, constraints, time function, bounds), as
+defined in each optimization file, e.g.:
+>>> from classical import model_classical
+>>> best, optima = multistart(model_classical, nstarts=64)
+>>> print_optima(model_classical, optima)
+
+"""
+
+from macros import minimize, violation, round_to_str, round_upwards_to_str
+import concurrent.futures
+import multiprocessing
+import numpy as np
+
+
+def sample_starts(bounds, nstarts, sampling="lhs", seed=0, start=None, radius=1.):
+    """
+    Samples nstarts starting points inside the bounds, with a Latin hypercube
+    ("lhs") or a scrambled Sobol sequence ("sobol").
+
+    An open bound (None) is replaced by the start coordinate minus or plus
+    radius. Open bounds without a start raise a ValueError.
+    """
+    # scipy.stats takes a long time to import: only when needed
+    from scipy.stats import qmc
+    if sampling == "lhs":
+        sampler = qmc.LatinHypercube(d=len(bounds), seed=seed)
+    elif sampling == "sobol":
+        sampler = qmc.Sobol(d=len(bounds), scramble=True, seed=seed)
+    else:
+        raise ValueError("Invalid sampling: " + str(sampling))
+    lower, upper = np.array(bounds, dtype=float).T
+    open_bounds = np.isnan(lower) | np.isnan(upper)
+    if np.any(open_bounds):
+        if start is None:
+            raise ValueError("Open bounds need a start to sample around")
+        start = np.array(start, dtype=float)
+        lower = np.where(np.isnan(lower), np.fmin(start, upper) - radius, lower)
+        upper = np.where(np.isnan(upper), np.fmax(start, lower) + radius, upper)
+    # qmc.scale does not accept empty intervals (variables fixed by their bounds)
+    return lower + sampler.random(nstarts) * (upper - lower)
+
+
+# the problem solved by the worker processes, set by _init_worker
+_problem = None
+
+
+def _init_worker(problem):
+    global _problem
+    _problem = problem
+
+
+def _solve(x0):
+    """
+    Runs one optimization from x0. Returns None if the evaluation of the
+    constraints failed at some point.
+    """
+    time, bounds, constraints, tol, maxiter, epigraph, method, callback = _problem
+    try:
+        with np.errstate(all='ignore'):
+            result = minimize(time, x0, bounds, constraints, tol=tol, maxiter=maxiter,
+                    epigraph=epigraph, method=method, callback=None if callback is None else callback(x0))
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return None
+    result.start = x0
+    result.violation = violation(constraints, result.x)
+    return result
+
+
+def distinct_optima(results, xtol=1e-4, ftol=1e-6):
+    """
+    Groups the results by local optimum: two results are the same optimum if
+    their times differ by less than ftol and their parameters by less than xtol.
+    Returns one result per optimum (sorted by time), with the number of starts
+    that reached it in result.count.
+    """
+    optima = []
+    for result in sorted(results, key=lambda r: r.fun):
+        for optimum in optima:
+            if (abs(result.fun - optimum.fun) < ftol and
+                    np.max(np.abs(result.x - optimum.x)) < xtol):
+                optimum.count += 1
+                break
+        else:
+            result.count = 1
+            optima.append(result)
+    return optima
+
+
+def multistart(model, nstarts=64, start=None, sampling="lhs", seed=0, workers=None,
+        tol=1e-10, maxiter=5000, epigraph=False, feastol=1e-7, method="SLSQP", callback=None):
+    """
+    Optimizes the model from nstarts starting points sampled in its bounds
+    (plus the given start, if any), using a pool of worker processes.
+
+    @param model: a tuple (namedtuple type, constraints, time, bounds).
+    @param sampling: "lhs" (Latin hypercube) or "sobol". The open bounds are
+    sampled around start (see sample_starts).
+    @param workers: number of processes (default: all the cores). With
+    workers=1, or if processes cannot be forked, the runs are sequential.
+    @param feastol: maximal violation of the constraints of a feasible result.
+    @param method: the solver (see macros.minimize).
+    @param callback: if not None, a function of each starting point returning
+    the callback of its optimization (see macros.minimize), e.g. to record its
+    iterates. It is called in the worker processes.
+
+    Returns the best feasible result (or the least infeasible one if none is
+    feasible) and the list of distinct feasible local optima, sorted by time
+    (see distinct_optima).
+    """
+    settype, constraints, time, bounds = model
+    # the open bounds are sampled around the start of a Model by default
+    center = getattr(model, "start", None) if start is None else start
+    starts = list(sample_starts(bounds, nstarts, sampling, seed, center))
+    if start is not None:
+        starts.insert(0, np.array(start, dtype=float))
+    problem = (time, bounds, constraints, tol, maxiter, epigraph, method, callback)
+
+    if workers == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        _init_worker(problem)
+        results = [ _solve(x0) for x0 in starts ]
+    else:
+        # with fork, the problem (which contains lambdas) is not pickled
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_init_worker, initargs=(problem,)) as executor:
+            results = list(executor.map(_solve, starts))
+
+    results = [ r for r in results if r is not None ]
+    if not results:
+        raise RuntimeError("All the optimizations failed")
+    feasible = [ r for r in results if r.violation <= feastol ]
+    if not feasible:
+        return min(results, key=lambda r: r.violation), []
+    optima = distinct_optima(feasible)
+    return optima[0], optima
+
+
+def print_optima(model, optima, verb=False):
+    """
+    Prints the distinct local optima found by multistart.
+    """
+    settype = model[0]
+    for i, optimum in enumerate(optima):
+        print("Optimum %i: time %s, reached from %i start(s)" %
+                (i, round_upwards_to_str(optimum.fun), optimum.count))
+        if verb:
+            astuple = settype(*optimum.x)
+            for t in astuple._asdict():
+                print("   ", t, round_to_str(astuple._asdict()[t]))
@@ -0,0 +1,293 @@
+"""
+Profiling of the optimizations: where the time of SLSQP goes.
+
+Once enabled, the models (see model.py) are solved with each constraint and
+the time function wrapped in timers, and with the macros (p_good, g, f, xlx...)
+replaced by timed versions. The profiler records:
+- the number of calls and the time of the batched constraints given to the
+solver (one vector function per type, see model.batch_constraints) and of
+their jacobians, e.g. "eq batch (12 constraints)". With
+profile(per_constraint=True), the constraints are given one by one instead,
+labelled by their index, their type, the comment above them in the source and
+their expression, e.g. "8 eq [size of l5r = c4] g(1/32.0 + x.alpha4, x.alpha4)
+* ...": this shows which constraint costs most, but it is not the evaluation
+that Model.solve does;
+- the same for the time function and for each macro (the time of a macro
+includes the macros it calls);
+- the trace of the SLSQP iterations: time, maximal violation of the
+constraints and norm of the step (on the original parameters).
+
+>>> import profiling
+>>> with profiling.profile() as p:
+...     optimize_quantum(verb=False)
+>>> p.report()                    # or p.report("profile.txt"), p.dump("profile.json")
+
+Profiling disables the cache (see cache.py). The starts of a multistart are
+run one after the other in the current process, to be profiled.
+"""
+
+from macros import violation, function_node
+from multistart import multistart
+import macros
+import ast
+import contextlib
+import json
+import linecache
+import time as timer
+import numpy as np
+
+
+# the macros timed, when they are in the module of the constraints or in macros.py
+MACROS = ["xlx", "f", "g", "h", "p_good", "p_good_2", "p_good_2_aux", "p_good_2_up",
+        "p_good_2_down", "proba_2", "argmin_proba_2", "filtering"]
+
+
+def comment_above(filename, lineno):
+    """
+    The comment above the line lineno in a list of constraints, skipping the
+    other constraints (and the commented out ones), or "".
+    """
+    for i in range(lineno - 1, 0, -1):
+        line = linecache.getline(filename, i).strip()
+        if line.startswith("{") or line.startswith("#{") or line.startswith("# {"):
+            continue
+        if line.startswith("#"):
+            return line.lstrip("#").strip()
+        return ""
+    return ""
+
+
+def constraint_label(index, constraint):
+    """
+    The label of a constraint (built with wrap): its index, its type, the
+    comment above it and its expression.
+    """
+    fun = constraint['fun']
+    f = getattr(fun, 'wrapped', fun)
+    label = "%i %s" % (index, constraint['type'])
+    code = getattr(f, '__code__', None)
+    if code is None:
+        return label
+    comment = comment_above(code.co_filename, code.co_firstlineno)
+    if comment:
+        label += " [%s]" % comment
+    # the expression of the lambda, without the dict around it
+    node = function_node(f)
+    if isinstance(node, ast.Lambda):
+        label += " " + ast.unparse(node.body)
+    return label
+
+
+class Counter:
+    """
+    Number of calls and total time (in seconds) of a function.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.
+
+    def timed(self, fun):
+        def inner(*args, **kwargs):
+            begin = timer.perf_counter()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                self.seconds += timer.perf_counter() - begin
+                self.calls += 1
+        return inner
+
+
+class Profiler:
+    """
+    Statistics of the solves done while it is active (see profile).
+
+    @param per_constraint: time the constraints one by one, instead of the
+    batches that Model.solve gives to the solver. The report then labels them
+    as unbatched.
+    """
+
+    def __init__(self, per_constraint=False):
+        self.per_constraint = per_constraint
+        # label -> Counter, for the constraints and the time, and for the macros
+        self.functions = {}
+        self.macros = {}
+        # one list of (iteration, time, violation, step norm) per solve
+        self.traces = []
+
+    def _counter(self, table, label):
+        if label not in table:
+            table[label] = Counter()
+        return table[label]
+
+    def _patch_macros(self, modules):
+        """
+        Replaces the macros by timed versions in the modules. Returns the list of
+        (module dict, name, original function) to restore.
+        """
+        patched = []
+        for namespace in modules:
+            for name in MACROS:
+                fun = namespace.get(name)
+                if callable(fun) and not hasattr(fun, 'profiled'):
+                    timed = self._counter(self.macros, name).timed(fun)
+                    timed.profiled = True
+                    namespace[name] = timed
+                    patched.append((namespace, name, fun))
+        return patched
+
+    def _timed_constraints(self, model):
+        """
+        The constraints given to the solver, with timers: the batches of
+        model.batch (see model.batch_constraints), as in Model.solve, or the
+        constraints one by one if per_constraint.
+        """
+        constraints = []
+        if self.per_constraint or model.batch is model.constraints:
+            for i, constraint in enumerate(model.constraints):
+                label = constraint_label(i, constraint)
+                fun = constraint['fun']
+                constraints.append(dict(constraint,
+                        fun=self._counter(self.functions, label).timed(fun),
+                        jac=self._counter(self.functions, label + " (jacobian)").timed(fun.jac)))
+            return constraints
+        for constraint in model.batch:
+            size = sum(1 for c in model.constraints if c['type'] == constraint['type'])
+            label = "%s batch (%i constraints)" % (constraint['type'], size)
+            timed = dict(constraint, fun=self._counter(self.functions, label).timed(constraint['fun']),
+                    jac=self._counter(self.functions, label + " (jacobian)").timed(constraint['jac']))
+            if 'sparse_jac' in constraint:
+                timed['sparse_jac'] = self._counter(self.functions, label + " (sparse jacobian)").timed(
+                        constraint['sparse_jac'])
+            constraints.append(timed)
+        return constraints
+
+    def solve(self, model, start, epigraph, method="SLSQP", nstarts=1):
+        """
+        Solves the model from start as Model.solve, with the timers. With
+        nstarts > 1, the starts of the multistart are run one after the other,
+        in this process, and each one has its trace.
+        """
+        constraints = self._timed_constraints(model)
+        timed = self._counter(self.functions, "time").timed(model.time)
+        timed_gradient = self._counter(self.functions, "time (gradient)").timed(model.time)
+        def time(x, **kwargs):
+            # macros.grad evaluates the time on a list of duals
+            return (timed_gradient if isinstance(x, list) else timed)(x, **kwargs)
+
+        functions = [ getattr(c['fun'], 'wrapped', c['fun']) for c in model.constraints ] + [ model.time ]
+        modules = [ macros.__dict__ ] + [ f.__globals__ for f in functions if hasattr(f, '__globals__') ]
+        modules = list({ id(m) : m for m in modules }.values())
+
+        # the iterates of each start, evaluated after the solve so that they
+        # are not counted
+        runs = []
+        def callback(x0):
+            iterates = []
+            runs.append((x0, iterates))
+            return lambda z : iterates.append(np.array(z))
+
+        patched = self._patch_macros(modules)
+        try:
+            if nstarts > 1:
+                result = multistart((model.settype, constraints, time, model.bounds), nstarts, start=start,
+                        workers=1, tol=model.tol, maxiter=model.maxiter, epigraph=epigraph, method=method,
+                        callback=callback)[0]
+            else:
+                result = macros.minimize(time, start, model.bounds, constraints, tol=model.tol,
+                        maxiter=model.maxiter, epigraph=epigraph, callback=callback(start), method=method)
+        finally:
+            for namespace, name, fun in patched:
+                namespace[name] = fun
+
+        n = len(start)
+        for x0, iterates in runs:
+            trace = []
+            previous = np.array(x0, dtype=float)
+            for i, z in enumerate(iterates):
+                x = z[:n]
+                trace.append((i + 1, float(model.time(x)), float(violation(model.constraints, x)),
+                        float(np.linalg.norm(x - previous))))
+                previous = x
+            self.traces.append(trace)
+        return result
+
+    def ranking(self, table):
+        return sorted(table.items(), key=lambda item: -item[1].seconds)
+
+    def report(self, path=None):
+        """
+        Prints the functions called, ranked by total time, and the iteration
+        traces (or writes them to the file path).
+        """
+        lines = []
+        title = "Constraints (%s) and time" % ("one by one, unbatched" if self.per_constraint else "as solved")
+        for title, table in [ (title, self.functions), ("Macros (inclusive time)", self.macros) ]:
+            lines.append("%s:" % title)
+            lines.append("%10s %10s %10s  %s" % ("seconds", "calls", "us/call", "function"))
+            # e.g. the sparse jacobians are not called by SLSQP
+            for label, c in self.ranking(table):
+                if c.calls == 0:
+                    continue
+                lines.append("%10.4f %10i %10.2f  %s" % (c.seconds, c.calls, 1e6*c.seconds/max(c.calls, 1), label))
+            lines.append("")
+        for k, trace in enumerate(self.traces):
+            lines.append("Iterations (solve %i):" % k)
+            lines.append("%6s %14s %12s %12s" % ("iter", "time", "violation", "step"))
+            for it, t, v, step in trace:
+                lines.append("%6i %14.8f %12.3e %12.3e" % (it, t, v, step))
+            lines.append("")
+        text = "\n".join(lines)
+        if path is None:
+            print(text)
+        else:
+            with open(path, "w") as f:
+                f.write(text)
+
+    def dump(self, path):
+        """
+        Writes all the statistics to the JSON file path.
+        """
+        def table(t):
+            return [ { 'function' : label, 'calls' : c.calls, 'seconds' : c.seconds }
+                    for label, c in self.ranking(t) ]
+        with open(path, "w") as f:
+            json.dump({ 'per_constraint' : self.per_constraint, 'functions' : table(self.functions), 'macros' : table(self.macros),
+                    'traces' : [ [ dict(zip(['iteration', 'time', 'violation', 'step'], row)) for row in trace ]
+                            for trace in self.traces ] }, f, indent=1)
+
+
+# the profiler used by the models, if any
+_active = None
+
+
+def enable(per_constraint=False):
+    """
+    Makes the models record their solves in a new profiler (see Profiler).
+    Returns it.
+    """
+    global _active
+    _active = Profiler(per_constraint)
+    return _active
+
+
+def disable():
+    global _active
+    _active = None
+
+
+def active():
+    return _active
+
+
+@contextlib.contextmanager
+def profile(per_constraint=False):
+    """
+    Profiles the solves done in the with block (see Profiler).
+    """
+    global _active
+    previous = _active
+    profiler = enable(per_constraint)
+    try:
+        yield profiler
+    finally:
+        _active = previous
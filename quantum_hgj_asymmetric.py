@@ -27,24 +27,33 @@ in Section 4.4 of the paper
 >>> create_graph()
 to create tikz code for the plot of Figure 4 in Section 4.4
 
+>>> sweep_hgj("quantum2", workers=4)
+to compute the whole time-memory tradeoff curve (see sweep_hgj)
+
 """
 
-from macros import round_to_str, check_constraints, round_upwards_to_str, wrap
+from macros import round_to_str, round_upwards_to_str, wrap, xlx_array, violation
+from macros import Dual, Interval
+from model import Model, parameters
 import collections
+import concurrent.futures
+import contextlib
+import os
 from math import*
-import scipy.optimize as opt
-import matplotlib.pyplot as plt
 import numpy as np
 
 
 # in these parameters, c0 is the size (in bits, in proportion of n) of the final
 # modular constraint that we obtain; i.e., if we want a solution of the
 # knapsack problem, we should enforce c0 = 1
-set_qhgj = collections.namedtuple('QHGJ', 'l30 l31 l32 l34 l20 l21 l22 l10 l11 a b c r c20 c21 c1 c0')
+set_qhgj, bounds_qhgj, start_qhgj = parameters('QHGJ', [ (name, (0, 1), 0.) for name in
+        'l30 l31 l32 l34 l20 l21 l22 l10 l11 a b c r c20 c21 c1 c0'.split() ])
 def qhgj(f) : return wrap(f,set_qhgj)
 
 
 def xlx(x):
+    if isinstance(x, (Dual, Interval)): return x.xlx(0)
+    if isinstance(x, np.ndarray): return xlx_array(x, slope=0)
     if x<=0: return 0
     return x*log(x, 2)
 
@@ -66,7 +75,15 @@ def filtering(a,b):
     Hamming weight "bn"
     have two colliding "ones". This is the filtering of representations in 
     the HGJ algorithm and its variants.
+
+    At b >= 1 (which the solver may try) the first term is replaced by its
+    limit 0 instead of dividing by 1-b.
     """
+    if isinstance(b, np.ndarray):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(b < 1, (1-b)*h(a/(1-b)), 0.) - h(a)
+    if not isinstance(b, Interval) and b >= 1:
+        return -h(a)
     return (1-b)*h(a/(1-b)) - h(a)
 
 
@@ -106,13 +123,13 @@ def memory_hgj(x):
     return max(x.l31,x.l32,x.l34,x.l21,x.l22,x.l11)
 
 
-def classical_time_hgj(x):
+def classical_time_hgj(x, max=max):
     x = set_qhgj(*x)
     return (1 - x.c0) + max(x.l31, x.l32, x.l34, x.l21, x.l22, x.l22*2 - x.c1 + x.c21,
                 x.l30 + max(x.l31 - x.c20,0) + max(x.l21 - x.c1 + x.c20,0 ))
 
 
-def quantum_time_hgj_first(x):
+def quantum_time_hgj_first(x, max=max):
     """
     Quantum time in the QRACM model, as obtained in section 4.2
     """
@@ -121,7 +138,7 @@ def quantum_time_hgj_first(x):
             0.5*(  x.l10 - filtering(x.b, x.c) + max(x.c20 - x.l31, 0) + max(x.c1 - x.c20 - x.l21, 0 ) ))
 
 
-def quantum_time_hgj_second(x):
+def quantum_time_hgj_second(x, max=max):
     """
     Improved quantum time in the QRACM model, as obtained in section 4.3, 
     using quantum filtering in the intermediate lists.
@@ -131,22 +148,10 @@ def quantum_time_hgj_second(x):
             0.5*(  x.l10 - filtering(x.b, x.c) + max(x.c20 - x.l31, 0) + max(x.c1 - x.c20 - x.l21, 0 ) ))
 
 
-def optimize_hgj(flag="classical", verb=True, mcons=None):
+def model_hgj(flag="classical", mcons=None, epigraph=False):
     """
-    Optimizes the parameters of our "asymmetric" quantum HGJ algorithm and
-    returns the best time complexity achievable.
-    
-    @param flag: either "classical", "quantum1", "quantum2", "moremem" where "classical"
-    means the classical optimization (we should find the original parameters),
-    "quantum1" means the first quantum optimization (without improved filtering),
-    "quantum2" means the second (with improved filtering).
-    "moremem" means that we are in the "quantum1" setting and the memory constraint
-    is enforced only on the quantum-accessed lists. So the classical memory used
-    may (and will) be higher than the memory constraint that we enforce.
-    
-    @param verb: decides if the results must be printed.
-    @param mcons: if not none, specifies a memory constraint. For ex: mcons = 0.1
-    means that the memory used should be  of the order 2^{0.1 n}
+    Returns the model (see model.py) optimized by optimize_hgj, with the same
+    parameters.
     """
     if flag not in ["classical", "quantum1", "quantum2", "moremem"]:
         raise ValueError("Invalid flag: " + str(flag))
@@ -158,29 +163,47 @@ def optimize_hgj(flag="classical", verb=True, mcons=None):
     mycons = constraints_hgj[:]
     mycons.append( { 'type' : 'eq', 'fun' : qhgj(lambda x :  x.c0 - 1)} )
     
-    objective = time
     # try to minimize the memory
-    if mcons is not None:
+    if mcons is not None and epigraph:
+        lists = ["l31", "l21", "l11"] if flag == "moremem" else ["l31", "l32", "l21", "l22", "l34", "l11"]
+        for l in lists:
+            mycons.append( {'type' : 'ineq', 'fun' : qhgj(lambda x, l=l : mcons - getattr(x, l)) } )
+    elif mcons is not None:
         if flag == "moremem":
             # constrain only the QRACM
             mycons.append( {'type' : 'ineq', 'fun' : qhgj(lambda x : mcons - max(x.l31,x.l21,x.l11)) } )
         else:
             mycons.append( {'type' : 'ineq', 'fun' : qhgj(lambda x : mcons - max(x.l31,x.l32,x.l21,x.l22,x.l34,x.l11,x.l22)) } )
 
-    result = opt.minimize(objective, [0.]*17, bounds=[(0,1)]*17, 
-                tol=1e-8, constraints=mycons,options={ "maxiter" : 10000})
-    astuple = set_qhgj(*result.x)
-    
-    if verb:
-        print("Validity: ", result.success)
-        print("Time: ", round_upwards_to_str(time(astuple)))
-        print("Memory: ", round_upwards_to_str(memory_hgj(astuple)))
-        print("Sum: ", round_upwards_to_str( time(astuple) + memory_hgj(astuple))) 
-        for t in astuple._asdict():
-            print(t, round_to_str(astuple._asdict()[t]) )
-        print(check_constraints(mycons, result.x))
+    return Model(set_qhgj, mycons, time, bounds_qhgj, start_qhgj, tol=1e-8, maxiter=10000,
+            reports=[ ("Memory", memory_hgj), ("Sum", lambda x : time(x) + memory_hgj(x)) ],
+            name="hgj %s mcons=%s" % (flag, mcons))
+
 
-    return result.success, objective(astuple), result
+def optimize_hgj(flag="classical", verb=True, mcons=None, epigraph=False, nstarts=1, workers=None,
+        start=None):
+    """
+    Optimizes the parameters of our "asymmetric" quantum HGJ algorithm and
+    returns the best time complexity achievable.
+    
+    @param flag: either "classical", "quantum1", "quantum2", "moremem" where "classical"
+    means the classical optimization (we should find the original parameters),
+    "quantum1" means the first quantum optimization (without improved filtering),
+    "quantum2" means the second (with improved filtering).
+    "moremem" means that we are in the "quantum1" setting and the memory constraint
+    is enforced only on the quantum-accessed lists. So the classical memory used
+    may (and will) be higher than the memory constraint that we enforce.
+    
+    @param verb: decides if the results must be printed.
+    @param mcons: if not none, specifies a memory constraint. For ex: mcons = 0.1
+    means that the memory used should be  of the order 2^{0.1 n}
+    @param epigraph: as in Model.optimize, and the memory constraint is then
+    split into one constraint per list.
+    @param nstarts, workers: see Model.optimize.
+    @param start: the starting point (default: all zeroes), e.g. the solution
+    for a close memory constraint.
+    """
+    return model_hgj(flag, mcons, epigraph).optimize(verb, epigraph, nstarts, workers, start)
 
 
 def show_optimizations():
@@ -200,22 +223,182 @@ def show_optimizations():
     optimize_hgj(flag="moremem")
 
 
-def print_table_contents():
+#=================================
+# time-memory tradeoffs
+#====================================
+
+tradeoff_point = collections.namedtuple('tradeoff_point', 'mcons time memory params')
+
+
+def constrained_memory_hgj(flag, x):
+    """
+    The memory bounded by the constraint mcons of optimize_hgj (only the
+    quantum-accessed lists for "moremem").
+    """
+    x = set_qhgj(*x)
+    if flag == "moremem":
+        return max(x.l31, x.l21, x.l11)
+    return max(x.l31, x.l32, x.l21, x.l22, x.l34, x.l11)
+
+
+def _best_result(constraints, results, feastol=1e-7):
+    """
+    The best of the solver results: the successful ones first, then by
+    violation of the constraints (up to feastol), then by time.
+    """
+    def key(result):
+        v = violation(constraints, result.x)
+        return (not result.success, v if v > feastol else 0., result.fun)
+    return min(results, key=key)
+
+
+def _solve_tradeoff(flag, m, start, epigraph):
+    """
+    Optimizes for the memory bound m, warm-started at start. Falls back to the
+    default starting point if this fails, and keeps the best of both results
+    (see _best_result).
+    """
+    model = model_hgj(flag, m, epigraph)
+    result = model.optimize(False, epigraph, start=start)[2]
+    if not result.success:
+        cold = model.optimize(False, epigraph)[2]
+        result = _best_result(model.constraints, [result, cold])
+    return result.x
+
+
+def _solve_chain(flag, mcons, start, epigraph):
+    """
+    Optimizes for each memory bound in mcons, in this order, warm-starting
+    each optimization at the solution of the previous one.
+    """
+    xs = []
+    for m in mcons:
+        start = _solve_tradeoff(flag, m, start, epigraph)
+        xs.append(start)
+    return xs
+
+
+def _chunks(l, k):
+    """
+    Splits the list l into at most k contiguous non-empty chunks.
+    """
+    size = max(-(-len(l) // k), 1)
+    return [ l[i:i+size] for i in range(0, len(l), size) ]
+
+
+def sweep_hgj(flag="quantum2", mcons=None, workers=1, refine=0.05, maxpoints=500,
+        minstep=1e-3, epigraph=True):
+    """
+    Computes the time-memory tradeoff curve of optimize_hgj.
+
+    The unconstrained optimum is computed first. Above its memory, the memory
+    constraint is inactive; below it, the memory bounds are swept downwards.
+    In both directions, each optimization is warm-started at the solution for
+    the previous bound.
+
+    @param mcons: the initial grid of memory bounds (default: 61 points between
+    0 and 0.3).
+    @param workers: number of processes. The grid is split into contiguous
+    chunks on each side of the unconstrained optimum, one warm-started chain of
+    optimizations per chunk. The first bounds of the chunks are solved first,
+    serially, so that each chain starts from its neighbour on the curve.
+    @param refine: if not None, the grid is refined adaptively: a point is added
+    in the middle of the intervals around each point where the slope of the curve
+    changes by more than refine, as long as these intervals are larger than minstep
+    and there are less than maxpoints points.
+    @param epigraph: use the smooth reformulation of optimize_hgj. Warm starts
+    need it: with the max in the time and the memory constraint, SLSQP often
+    fails to move away from the solution for the previous bound.
+    
+    Returns the list of tradeoff_point (memory bound, time, memory, parameters),
+    sorted by memory bound.
+    """
+    if mcons is None:
+        mcons = np.linspace(0, 0.3, 61)
+    mcons = sorted(set(float(m) for m in mcons))
+    time = model_hgj(flag).time
+
+    x0 = optimize_hgj(flag, verb=False, epigraph=epigraph)[2].x
+    m0 = constrained_memory_hgj(flag, x0)
+    below = [ m for m in mcons if m < m0 ][::-1]
+    above = [ m for m in mcons if m >= m0 ]
+    
+    # with workers=1, executor is None and the chains run in this process
+    with (contextlib.nullcontext() if workers == 1 else
+            concurrent.futures.ProcessPoolExecutor(max_workers=workers)) as executor:
+        if executor is None:
+            chunks = [ below, above ]
+            xs = [ _solve_chain(flag, chunk, x0, epigraph) for chunk in chunks ]
+        else:
+            k = max((workers or os.cpu_count()) // 2, 1)
+            chunks = _chunks(below, k) + _chunks(above, k)
+            # the first bound of each chunk is solved serially, warm-started at the
+            # first bound of the previous chunk on the same side, then each chunk
+            # is warm-started at its first bound
+            firsts = []
+            for side in [_chunks(below, k), _chunks(above, k)]:
+                firsts.extend(_solve_chain(flag, [ chunk[0] for chunk in side ], x0, epigraph))
+            rests = executor.map(_solve_chain, [flag]*len(chunks), [ chunk[1:] for chunk in chunks ], firsts,
+                    [epigraph]*len(chunks))
+            xs = [ [first] + rest for first, rest in zip(firsts, rests) ]
+        solutions = dict(zip([ m for chunk in chunks for m in chunk ], [ x for l in xs for x in l ]))
+    
+        while refine is not None and len(solutions) < maxpoints:
+            ms = sorted(solutions)
+            ts = np.array([ time(solutions[m]) for m in ms ])
+            slopes = np.diff(ts) / np.diff(ms)
+            new = set()
+            for i in np.nonzero(np.abs(np.diff(slopes)) > refine)[0]:
+                for j in [i, i+1]:
+                    if ms[j+1] - ms[j] > minstep:
+                        new.add((ms[j] + ms[j+1]) / 2)
+            if not new:
+                break
+            new = sorted(new)[:maxpoints - len(solutions)]
+            # warm-start at the solution for the closest bound below
+            starts = [ solutions[max(m2 for m2 in ms if m2 < m)] for m in new ]
+            args = ([flag]*len(new), new, starts, [epigraph]*len(new))
+            solved = executor.map(_solve_tradeoff, *args) if executor else map(_solve_tradeoff, *args)
+            solutions.update(zip(new, solved))
+
+    return [ tradeoff_point(m, time(solutions[m]), memory_hgj(solutions[m]), set_qhgj(*solutions[m]))
+            for m in sorted(solutions) ]
+
+
+def tradeoff_hgj(flag, mcons, sweep=False, workers=1, refine=None):
+    """
+    The tradeoff_point of optimize_hgj for each memory bound in mcons, sorted
+    by memory bound.
+
+    @param sweep: if False, each bound is optimized from the default starting
+    point, without the epigraph form, as in the paper. If True, the bounds are
+    swept with warm starts, on workers processes, and possibly refined (see
+    sweep_hgj): this is faster, and often finds a better point.
+    """
+    if sweep:
+        return sweep_hgj(flag, mcons=mcons, workers=workers, refine=refine)
+    time = model_hgj(flag).time
+    points = []
+    for m in sorted(set(float(m) for m in mcons)):
+        x = optimize_hgj(flag, verb=False, mcons=m)[2].x
+        points.append(tradeoff_point(m, time(x), memory_hgj(x), set_qhgj(*x)))
+    return points
+
+
+def print_table_contents(mcons=(0.05, 0.1, 0.15, 0.2, 0.3), sweep=False, workers=1):
     """
     Prints the contents of the QRACM time-memory tradeoff table in Section 4
-    in the paper.
+    in the paper (see tradeoff_hgj for sweep and workers).
     """
     
-    for m in [0.05, 0.1, 0.15, 0.2, 0.3]:
-        l = [round_to_str(m)]
-        for flag in ["quantum1", "quantum2", "moremem"]:
-            a,b,c = optimize_hgj(flag=flag,verb=False,mcons=m)
-            astuple = set_qhgj(*c.x)
-            time = (classical_time_hgj if flag == "classical" else
-            quantum_time_hgj_second if flag == "quantum2" else
-            quantum_time_hgj_first)
-            l.append(round_upwards_to_str(time(astuple)))
-            l.append(round_upwards_to_str(memory_hgj(astuple)))
+    rows = [ [round_to_str(m)] for m in mcons ]
+    for flag in ["quantum1", "quantum2", "moremem"]:
+        points = { point.mcons : point for point in tradeoff_hgj(flag, mcons, sweep, workers) }
+        for row, m in zip(rows, mcons):
+            point = points[float(m)]
+            row.append(round_upwards_to_str(point.time))
+            row.append(round_upwards_to_str(point.memory))
+    for l in rows:
         print(" & ".join([t for t in l]) + "\\\\")
 
 
@@ -275,20 +458,22 @@ The complexities \\\\ are $\\bigOt{2^{\\alpha n}}$
     return fig
 
 
-def create_graph():
+def create_graph(mcons=(0,0.025,0.05,0.075,0.1,0.15,0.175,0.2,0.225, 0.2358, 0.3), sweep=False, workers=1,
+        refine=None):
     """
     Prints the QRACM time-memory tradeoff graph in Section 4 of the paper.
     Plots the "quantum2" optimization and the T*M = 2^n/2 curve.
+    With sweep, the memory bounds can be refined where the curve bends (see
+    tradeoff_hgj and sweep_hgj).
     """
     
     legend = ["Optimization", "$T M = 2^{n/2}$"]
     xdata = [ [],[] ]
     ydata = [ [],[] ]
 
-    for m in [0,0.025,0.05,0.075,0.1,0.15,0.175,0.2,0.225, 0.2358, 0.3]:
-        a,b,c = optimize_hgj(flag="quantum2",verb=False,mcons=m)
-        astuple = set_qhgj(*c.x)
-        ydata[0].append(quantum_time_hgj_second(astuple))
+    for point in tradeoff_hgj("quantum2", mcons, sweep, workers, refine):
+        m = point.mcons
+        ydata[0].append(point.time)
         xdata[0].append(m)
         xdata[1].append(m)
         ydata[1].append( 0.5 - m)# if 0.5-m > 0.2358 else 0.2358 )
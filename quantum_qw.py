@@ -1,4 +1,3 @@
-
 """
 Optimization target: new quantum walk algorithm with a 6-level merging tree
 and {0,-1,1,2} representations (Section 5). This is the heuristic case.
@@ -8,104 +7,172 @@ Run:
 
 To obtain the exponent 0.216 and the parameters given in Section 5.3
 
+The non heuristic case (Section 6) shares most of its parameters and
+constraints: model_qw builds both (see quantum_qw_no_heuristic.py).
 """
 
-from macros import round_to_str, check_constraints, round_upwards_to_str, wrap
+from macros import wrap
 from macros import f,g,p_good_2_down, p_good_2_up, p_good
-import collections
+from model import Model, parameters
 from math import*
-import scipy.optimize as opt
-import matplotlib.pyplot as plt
-import numpy as np
 
 
-set_quantum = collections.namedtuple('quantum', 'p0 p1 p2 p3 l0 l1 l2 l3 l4 delta c1 c2 c3 c4 alpha1 alpha2 alpha3 alpha4 gamma1')
-def quantum(f) : return wrap(f,set_quantum)
+# (name, bounds, start), with or without the heuristic
+VARIABLES = {
+    True : [
+    ('p0', (-1, 0), -0.2), ('p1', (-1, 0), -0.03), ('p2', (-1, 0), -0.02), ('p3', (-1, 0), 0.),
+    ('l0', (-1, 0), -0.2), ('l1', (0, 1), 0.19), ('l2', (0, 1), 0.19), ('l3', (0, 1), 0.19),
+    ('l4', (0, 1), 0.19), ('delta', (0, 1), 0.19), ('c1', (0, 1), 0.19), ('c2', (0, 1), 0.19),
+    ('c3', (0, 1), 0.19), ('c4', (0, 1), 0.19), ('alpha1', (0, 0.1), 0.05), ('alpha2', (0, 0.1), 0.05),
+    ('alpha3', (0, 0.1), 0.05), ('alpha4', (0, 0.1), 0.005), ('gamma1', (0, 0.01), 0.005)],
+    False : [
+    ('p0', (-1, 0), -0.2), ('p1', (-1, 0), -0.03), ('p2', (-1, 0), -0.016), ('l0', (-1, 0), -0.2),
+    ('l1', (0, 1), 0.18), ('l2', (0, 1), 0.21), ('l3', (0, 1), 0.22), ('l4', (0, 1), 0.22),
+    ('c1', (0, 1), 0.63), ('c2', (0, 1), 0.43), ('c3', (0, 1), 0.22), ('alpha1', (0, 0.1), 0.05),
+    ('alpha2', (0, 0.1), 0.05), ('alpha3', (0, 0.1), 0.005), ('gamma1', (0, 0.01), 0.005)],
+}
 #=================================
 # Among these variables:
 # - pi is the filtering probability at level i
 # - li is the list size at level i
 # - l0 < 0, since only a few nodes contain a solution
-# - gamma is the parameter of the asymmetric left-right split between l5r and l5l
-# - l5r and l5l are implicit. We have l5l = l4 in size and l5r = c4
+# - with the heuristic, gamma is the parameter of the asymmetric left-right
+# split between l5r and l5l. l5r and l5l are implicit. We have l5l = l4 in
+# size and l5r = c4. There is no such split without the heuristic
 # - ci is the total number of bits of the modular constraint at level i
 # - alphai is the total number of "-1" at level i
 # - gammai is the total number of "2" at level i
 
 
-constraints_quantum = [
-# filtering terms (they are negative variables)
-{ 'type' : 'eq', 'fun' : quantum(lambda x : p_good_2_down(1/2., 0, 0., 1/4.+x.alpha1-2*x.gamma1, x.alpha1, x.gamma1) - x.p0 )},
-{ 'type' : 'eq', 'fun' : quantum(lambda x : p_good_2_up(1/4.+x.alpha1-2*x.gamma1, x.alpha1, x.gamma1, 1/8.+x.alpha2, x.alpha2, 0) - x.p1)},
-{ 'type' : 'eq', 'fun' : quantum(lambda x : p_good(1/8.+x.alpha2, x.alpha2, 1/16.+x.alpha3, x.alpha3) - x.p2)},
-{ 'type' : 'eq', 'fun' : quantum(lambda x : p_good(1/16.+x.alpha3, x.alpha3, 1/32.+x.alpha4, x.alpha4) - x.p3)},
-# sizes of the lists
-{ 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l1 - (1-x.c1) + x.p0 - x.l0 )},
-{ 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l2 - (x.c1 - x.c2) + x.p1 - x.l1 )},
-{ 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l3 - (x.c2 - x.c3) + x.p2 - x.l2 )},
-{ 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l4 - (x.c3 - x.c4) + x.p3 - x.l3 )},
-# size of l5r = c4
-{ 'type' : 'eq', 'fun' : quantum(lambda x : g(1/32.+x.alpha4, x.alpha4)*(1-x.delta) - x.c4 )},
-# size of l5l = l4
-{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/16 + g(1/32.+x.alpha4, x.alpha4)*x.delta - x.l4)},
-# at other levels
-{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/2 + f(1/4.+x.alpha1-2*x.gamma1, x.alpha1, x.gamma1) - x.c1 - x.l1)},
-{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/4 + g(1/8.+x.alpha2, x.alpha2) - x.c2 - x.l2)},
-{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/8 + g(1/16.+x.alpha3, x.alpha3) - x.c3 - x.l3)},
-{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/16 + g(1/32.+x.alpha4, x.alpha4) - x.c4 - x.l4)},
-# coherence of the -1
-#{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.alpha2 - x.alpha1/2)},
-#{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.alpha3 - x.alpha2/2)},
-#{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.alpha4 - x.alpha3/2)},
-#{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.alpha1 - x.gamma1)},
-# no update explosion
-{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.l4-x.l3)},
-{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.l3-x.l2)},
-{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.l2-x.l1)},
-]
-
-
-def quantum_time(x):
+def constraints_qw(quantum, heuristic):
+    """
+    The constraints, on the parameters wrapped by quantum, with or without the
+    heuristic (in the order of the original models).
+    """
+    constraints = [
+    # filtering terms (they are negative variables)
+    { 'type' : 'eq', 'fun' : quantum(lambda x : p_good_2_down(1/2., 0, 0., 1/4.+x.alpha1-2*x.gamma1, x.alpha1, x.gamma1) - x.p0 )},
+    { 'type' : 'eq', 'fun' : quantum(lambda x : p_good_2_up(1/4.+x.alpha1-2*x.gamma1, x.alpha1, x.gamma1, 1/8.+x.alpha2, x.alpha2, 0) - x.p1)},
+    { 'type' : 'eq', 'fun' : quantum(lambda x : p_good(1/8.+x.alpha2, x.alpha2, 1/16.+x.alpha3, x.alpha3) - x.p2)},
+    ]
+    if heuristic:
+        constraints += [
+        { 'type' : 'eq', 'fun' : quantum(lambda x : p_good(1/16.+x.alpha3, x.alpha3, 1/32.+x.alpha4, x.alpha4) - x.p3)},
+        ]
+    constraints += [
+    # sizes of the lists
+    { 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l1 - (1-x.c1) + x.p0 - x.l0 )},
+    { 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l2 - (x.c1 - x.c2) + x.p1 - x.l1 )},
+    { 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l3 - (x.c2 - x.c3) + x.p2 - x.l2 )},
+    ]
+    if heuristic:
+        constraints += [
+        { 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l4 - (x.c3 - x.c4) + x.p3 - x.l3 )},
+        # size of l5r = c4
+        { 'type' : 'eq', 'fun' : quantum(lambda x : g(1/32.+x.alpha4, x.alpha4)*(1-x.delta) - x.c4 )},
+        # size of l5l = l4
+        { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/16 + g(1/32.+x.alpha4, x.alpha4)*x.delta - x.l4)},
+        ]
+    else:
+        constraints += [
+        { 'type' : 'eq', 'fun' : quantum(lambda x : 2*x.l4 - (x.c3 ) - x.l3 )},
+        ]
+    constraints += [
+    # at other levels
+    { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/2 + f(1/4.+x.alpha1-2*x.gamma1, x.alpha1, x.gamma1) - x.c1 - x.l1)},
+    { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/4 + g(1/8.+x.alpha2, x.alpha2) - x.c2 - x.l2)},
+    { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/8 + g(1/16.+x.alpha3, x.alpha3) - x.c3 - x.l3)},
+    ]
+    if heuristic:
+        constraints += [
+        { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/16 + g(1/32.+x.alpha4, x.alpha4) - x.c4 - x.l4)},
+        ]
+    else:
+        constraints += [
+        { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l0/16 + g(1/16.+x.alpha3, x.alpha3)/2 - x.l4)},
+        ]
+    # coherence of the -1
+    #{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.alpha2 - x.alpha1/2)},
+    #{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.alpha3 - x.alpha2/2)},
+    #{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.alpha4 - x.alpha3/2)},
+    #{ 'type' : 'ineq', 'fun' : quantum(lambda x : x.alpha1 - x.gamma1)},
+    # no update explosion
+    if not heuristic:
+        constraints += [
+        { 'type' : 'ineq', 'fun' : quantum(lambda x : x.c3 - x.l4)},
+        ]
+    constraints += [
+    { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l4-x.l3)},
+    { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l3-x.l2)},
+    { 'type' : 'ineq', 'fun' : quantum(lambda x : x.l2-x.l1)},
+    ]
+    return constraints
+
+
+def time_qw(settype, heuristic):
+    """
+    The quantum time on the parameters of type settype, with or without the
+    heuristic on the quantum walk.
+    """
+    def quantum_time(x, max=max):
+        """
+        Heuristic quantum time.
+        """
+        x = settype(*x)
+        setup = max( x.c4, x.l4, x.l3 - x.p3/2, x.l2 - x.p2/2, x.l1 - x.p1/2, (x.l1 + max(x.l1 - (1-x.c1), 0))/2 )
+        update = max( 0, (x.l4 - (x.c3 - x.c4))/2, (x.l3 - (x.c2 - x.c3))/2, (x.l2 - (x.c1 - x.c2))/2, (x.l1 - (1 - x.c1))/2)
+        return max(setup, (max(0, -x.l0) + x.l4)/2 + update)
+
+    def quantum_time_without_heuristic(x, max=max):
+        """
+        Quantum time without any heuristic on the quantum walk (it modifies the
+        update cost). Now only the classical subset-sum heuristic is needed.
+        """
+        x = settype(*x)
+        setup = max( x.c3, x.l3, x.l2 - x.p2/2, x.l1 - x.p1/2, (x.l1 + max(x.l1 - (1-x.c1), 0))/2 )
+
+        time2 = max(x.l3 - (x.c2-x.c3),0)
+        # number of elements to modify at level 2
+        elts2 = max(x.l3 - (x.c2-x.c3) + x.p2/2, 0)
+
+        time1 = max(x.l2 - (x.c1-x.c2),0)
+        # number of elements to modify at level 1
+        elts1 = max(x.l2 - (x.c1-x.c2) + x.p1/2, 0)
+
+        update = max(0, time2, elts2+time1, (elts2+elts1)/2 + max((x.l1 - (1 - x.c1))/2,0))
+        return max(setup, (max(0, -x.l0) + x.l4)/2 + update)
+
+    return quantum_time if heuristic else quantum_time_without_heuristic
+
+
+def model_qw(heuristic=True):
     """
-    Heuristic quantum time.
+    The model of the quantum walk algorithm, with the heuristic (Section 5)
+    or without it (Section 6).
     """
-    x = set_quantum(*x)
-    setup = max( x.c4, x.l4, x.l3 - x.p3/2, x.l2 - x.p2/2, x.l1 - x.p1/2, (x.l1 + max(x.l1 - (1-x.c1), 0))/2 )
-    update = max( 0, (x.l4 - (x.c3 - x.c4))/2, (x.l3 - (x.c2 - x.c3))/2, (x.l2 - (x.c1 - x.c2))/2, (x.l1 - (1 - x.c1))/2)
-    return max(setup, (max(0, -x.l0) + x.l4)/2 + update)
+    settype, bounds, start = parameters('quantum', VARIABLES[heuristic])
+    quantum = lambda f : wrap(f, settype)
+    if heuristic:
+        return Model(settype, constraints_qw(quantum, True), time_qw(settype, True), bounds, start)
+    return Model(settype, constraints_qw(quantum, False), time_qw(settype, False), bounds, start,
+            maxiter=10000, name="quantum no heuristic")
 
 
-def optimize_quantum(verb=True):
+model_quantum = model_qw()
+set_quantum = model_quantum.settype
+constraints_quantum = model_quantum.constraints
+quantum_time = model_quantum.time
+
+
+def optimize_quantum(verb=True, epigraph=False, nstarts=1, workers=None):
     """
+    Optimizes the parameters.
+
+    See Model.optimize for epigraph, nstarts and workers.
     """
-    
-    time = quantum_time
-    
-    objective = time
-    mycons = constraints_quantum
-
-    start = [-0.2, -0.03, -0.02, 0, -0.2] + [(0.19)]*9 + [(0.05)]*3 + [(0.005)]*2
-    bounds = [(-1,0)]*5 + [(0,1)]*9 + [(0, 0.1)]*4 + [(0, 0.01)]
-   
-    result = opt.minimize(objective, start, 
-            bounds= bounds, tol=1e-10, 
-            constraints=mycons, options={'maxiter':5000})
-    
-    astuple = set_quantum(*result.x)
-    
-    if verb:
-        print("Validity: ", result.success)
-        print("Time: ", round_upwards_to_str(time(astuple)))
-        for t in astuple._asdict():
-            print(t, round_to_str(astuple._asdict()[t]) )
-        print(check_constraints(mycons, result.x))
-
-    return result.success, objective(astuple), result
+    return model_quantum.optimize(verb, epigraph, nstarts, workers)
 
 
 if __name__ == "__main__":
     print("=========== QUANTUM OPTIMIZATION WITH QW HEURISTIC ===========")
     optimize_quantum()
-
-    pass
-
@@ -0,0 +1,96 @@
+"""
+Runs independent jobs (e.g. the optimizations of main.py) in parallel
+processes, and reports each result as soon as it is available:
+>>> for i, status, value, seconds in run_jobs([ (optimize_classical, {'verb' : False}) ]):
+...     print(i, status, value)
+
+Each job has its own process, so that it can be stopped when it exceeds its
+timeout.
+"""
+
+import multiprocessing
+import multiprocessing.connection
+import os
+import time
+import traceback
+
+
+def _run(fun, kwargs, connection):
+    try:
+        result = ("done", fun(**kwargs))
+    except BaseException:
+        result = ("error", traceback.format_exc())
+    connection.send(result)
+    connection.close()
+
+
+def run_jobs(jobs, workers=None, timeout=None):
+    """
+    Runs the jobs, given as (function, keyword arguments), at most workers
+    (default: the number of cores) at a time.
+
+    @param timeout: if not None, the maximal time (in seconds) of each job.
+    The jobs that exceed it are terminated, unless their result is already
+    available.
+
+    Yields (index of the job, status, value, duration in seconds) as the jobs
+    finish, where status is "done" (value is the returned value), "error"
+    (value is the traceback) or "timeout" (value is None). The return values
+    must be picklable.
+
+    Each job sends its result through its own pipe: terminating a job cannot
+    corrupt the results of the others.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("fork" if "fork" in methods else None)
+    pending = list(enumerate(jobs))[::-1]
+    # index -> (process, end of the pipe to read, start time)
+    running = {}
+
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                index, (fun, kwargs) = pending.pop()
+                reader, writer = context.Pipe(duplex=False)
+                # not a daemon, so that a job can use a pool of processes itself
+                process = context.Process(target=_run, args=(fun, kwargs, writer))
+                process.start()
+                writer.close()
+                running[index] = (process, reader, time.perf_counter())
+
+            wait = None
+            if timeout is not None:
+                wait = max(min(start for p, r, start in running.values()) + timeout - time.perf_counter(), 0)
+            ready = multiprocessing.connection.wait([ r for p, r, start in running.values() ] +
+                    [ p.sentinel for p, r, start in running.values() ], timeout=wait)
+            now = time.perf_counter()
+            for index, (process, reader, start) in list(running.items()):
+                if reader.poll():
+                    # the result is read before the process is joined: the
+                    # process may be blocked on sending a large one
+                    try:
+                        status, value = reader.recv()
+                    except (EOFError, OSError):
+                        process.join()
+                        status, value = "error", "Exit code %s" % process.exitcode
+                    process.join()
+                elif process.sentinel in ready or not process.is_alive():
+                    # the process died without sending a result
+                    process.join()
+                    status, value = "error", "Exit code %s" % process.exitcode
+                elif timeout is not None and now - start >= timeout:
+                    process.terminate()
+                    process.join()
+                    status, value = "timeout", None
+                else:
+                    continue
+                reader.close()
+                del running[index]
+                yield index, status, value, now - start
+    finally:
+        # if the caller stops early (e.g. on KeyboardInterrupt)
+        for process, reader, start in running.values():
+            process.terminate()
+            reader.close()
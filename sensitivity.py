@@ -0,0 +1,234 @@
+"""
+Sensitivity analysis of a solution: which constraints and which terms of the
+max of the time are binding, their Lagrange multipliers, and the derivatives
+of the optimal time with respect to the bounds.
+>>> from quantum_qw import model_quantum
+>>> success, time, result = model_quantum.optimize(verb=False)
+>>> report = sensitivity(model_quantum, result.x, verb=True)
+
+The time is a nest of max, so the multipliers are those of its smooth
+reformulation (see macros.epigraph_problem): each max gets a variable u_j with
+the constraints u_j >= term. At a solution x, the active constraints are the
+'eq' ones, the 'ineq' ones and the bounds which are tight (up to tol), and the
+terms which reach their max. The multipliers solve the stationarity condition
+of the KKT conditions, grad(objective) = sum of multiplier*grad(constraint),
+in the least-squares sense with nonnegative multipliers for the inequalities;
+all gradients are the exact jacobians of the constraints (see
+macros.with_jacobians). The residual of this system tells how far x is from a
+KKT point.
+
+A multiplier is the derivative of the optimal time when its constraint is
+relaxed: if c(x) >= 0 becomes c(x) >= -eps, the time decreases by about
+multiplier*eps. The weights of the terms of a max add up to the weight of the
+max (1 for the outermost one): for quantum_time, they tell whether the setup
+or the update is binding, and which level of the tree limits them.
+"""
+
+from macros import epigraph_problem, with_jacobians, function_node, round_to_str
+import ast
+import builtins
+import collections
+import numpy as np
+
+
+Sensitivity = collections.namedtuple('Sensitivity', 'time constraints branches bounds residual kkt')
+Sensitivity.__doc__ = """
+The result of sensitivity:
+- time: the time at the solution
+- constraints: for each constraint, a dict with its index, type, source (if
+found), value, whether it is active, its multiplier and the derivative of
+the time when it is relaxed ("derivative"): -multiplier, the derivative with
+respect to eps of the optimal time under c(x) >= -eps (or c(x) = -eps)
+- branches: for each call to max in the time, the list of its terms, as dicts
+with their source (if found), value, whether they are binding, and their
+weight (multiplier)
+- bounds: for each active bound of a parameter, a dict with its name, its side
+("lower" or "upper"), its value, its multiplier and the derivative of the time
+with respect to it. The bounds which duplicate an 'eq' constraint on the
+same parameter (e.g. c0 <= 1 and c0 - 1 = 0) are left out
+- residual: the norm of the residual of the stationarity condition
+- kkt: whether the residual is at most max_residual. Otherwise x is not a KKT
+point, and the multipliers mean nothing.
+"""
+
+
+def _source(f):
+    """
+    The source of the expression of a constraint or of the term of a max, or
+    None if it cannot be found.
+    """
+    f = getattr(f, 'wrapped', None) or f
+    node = function_node(f) if hasattr(f, '__code__') else None
+    if isinstance(node, ast.Lambda):
+        return ast.unparse(node.body)
+    return None
+
+
+def _max_terms(time, counts):
+    """
+    The sources of the terms of the calls to max in the time, in the order in
+    which they are evaluated (the arguments before the call), or None if they
+    do not match counts, the numbers of terms of the calls.
+    """
+    node = function_node(time) if hasattr(time, '__code__') else None
+    if node is None:
+        return None
+    calls = []
+    def visit(t):
+        for child in ast.iter_child_nodes(t):
+            visit(child)
+        if isinstance(t, ast.Call) and isinstance(t.func, ast.Name) and t.func.id == "max":
+            calls.append([ ast.unparse(a) for a in t.args ])
+    for statement in node.body:
+        visit(statement)
+    if [ len(terms) for terms in calls ] != counts:
+        return None
+    return calls
+
+
+def sensitivity(model, x, tol=1e-6, max_residual=1e-4, verb=False):
+    """
+    The sensitivity analysis of the model at its solution x (see the module
+    docstring), as a Sensitivity.
+
+    @param tol: the constraints, bounds and terms of a max within tol of being
+    tight are active.
+    @param max_residual: the largest residual of the stationarity condition
+    for which x is taken as a KKT point (see Sensitivity.kkt).
+    """
+    import scipy.optimize
+    x = np.array(x, dtype=float)
+    n = len(x)
+    constraints = with_jacobians(model.constraints)
+    objective, objective_jac, mycons, mybounds, z = epigraph_problem(model.time, constraints,
+            model.bounds, list(x))
+    z = np.array(z, dtype=float)
+    pad = lambda row : np.concatenate([np.ravel(row), np.zeros(len(z) - n)])
+
+    # the active constraints, as rows of the jacobian
+    rows, lower = [], []
+    report = []
+    for k, c in enumerate(constraints):
+        value = float(c['fun'](x))
+        active = c['type'] == 'eq' or value <= tol
+        report.append({ 'index' : k, 'type' : c['type'], 'source' : _source(c['fun']), 'value' : value,
+                        'active' : active, 'multiplier' : 0., 'derivative' : 0., 'row' : None })
+        if active:
+            report[-1]['row'] = len(rows)
+            rows.append(pad(c['jac'](x)))
+            lower.append(-np.inf if c['type'] == 'eq' else 0.)
+
+    # the terms of the max: u_j - term >= 0
+    counts = []
+    def count_max(*terms):
+        counts.append(len(terms))
+        return builtins.max(terms)
+    model.time(x, max=count_max)
+    sources = _max_terms(model.time, counts)
+    trace = mycons[-1]
+    diffs, jac = trace['fun'](z), trace['jac'](z)
+    branches = []
+    d = 0
+    for j, count in enumerate(counts):
+        terms = []
+        for t in range(count):
+            binding = bool(diffs[d] <= tol)
+            terms.append({ 'source' : None if sources is None else sources[j][t],
+                           'value' : float(z[n + j] - diffs[d]), 'binding' : binding, 'weight' : 0.,
+                           'row' : len(rows) if binding else None })
+            if binding:
+                rows.append(np.asarray(jac[d], dtype=float))
+                lower.append(0.)
+            d += 1
+        branches.append(terms)
+
+    # the parameters fixed by an 'eq' constraint on them only: their bounds
+    # would split its multiplier arbitrarily
+    fixed = set()
+    for c in report:
+        if c['type'] == 'eq' and c['row'] is not None:
+            support = np.nonzero(rows[c['row']])[0]
+            if len(support) == 1:
+                fixed.add(int(support[0]))
+
+    # the active bounds of the parameters
+    bounds = []
+    for i, (lo, hi) in enumerate(model.bounds):
+        for side, bound, sign in [("lower", lo, 1.), ("upper", hi, -1.)]:
+            if bound is not None and sign*(x[i] - bound) <= tol and i not in fixed:
+                row = np.zeros(len(z))
+                row[i] = sign
+                bounds.append({ 'name' : model.settype._fields[i], 'side' : side, 'value' : float(bound),
+                                'multiplier' : 0., 'derivative' : 0., 'row' : len(rows), 'sign' : sign })
+                rows.append(row)
+                lower.append(0.)
+
+    gradient = objective_jac(z)
+    if rows:
+        A = np.array(rows).T
+        result = scipy.optimize.lsq_linear(A, gradient, bounds=(np.array(lower), np.inf))
+        multipliers = result.x
+        residual = float(np.linalg.norm(A @ multipliers - gradient))
+    else:
+        multipliers = np.zeros(0)
+        residual = float(np.linalg.norm(gradient))
+
+    for c in report:
+        row = c.pop('row')
+        if row is not None:
+            c['multiplier'] = float(multipliers[row])
+            # relaxing c >= 0 into c >= -eps decreases the time by multiplier*eps
+            c['derivative'] = -c['multiplier']
+    for terms in branches:
+        for term in terms:
+            row = term.pop('row')
+            if row is not None:
+                term['weight'] = float(multipliers[row])
+    for b in bounds:
+        row, sign = b.pop('row'), b.pop('sign')
+        b['multiplier'] = float(multipliers[row])
+        # raising a lower bound (sign 1) increases the time
+        b['derivative'] = sign*b['multiplier']
+
+    res = Sensitivity(float(model.time(x)), report, branches, bounds, residual, residual <= max_residual)
+    if verb:
+        show(res)
+    return res
+
+
+def show(report, threshold=1e-9):
+    """
+    Prints a Sensitivity: the binding terms of the max, the constraints and
+    the bounds with a multiplier above threshold, by decreasing multiplier.
+    """
+    print("Time: %s (KKT residual %.1e)" % (round_to_str(report.time), report.residual))
+    if not report.kkt:
+        print("Not a KKT point: no multiplier is shown. Solve the model again (e.g. with epigraph=True).")
+    print("Binding terms of the max:")
+    for j, terms in enumerate(report.branches):
+        for t, term in enumerate(terms):
+            if term['binding']:
+                print("   max %i, term %i: %s = %s%s" % (j, t, term['source'] or "?", round_to_str(term['value']),
+                        " (weight %s)" % round_to_str(term['weight']) if report.kkt else ""))
+    if not report.kkt:
+        return
+    print("Active constraints (derivative of the time when relaxed):")
+    for c in sorted(report.constraints, key=lambda c : -abs(c['multiplier'])):
+        if abs(c['multiplier']) > threshold:
+            print("   %s %i: %s (%s)" % (c['type'], c['index'], c['source'] or "?", round_to_str(c['derivative'])))
+    print("Active bounds (derivative of the time):")
+    for b in sorted(report.bounds, key=lambda b : -b['multiplier']):
+        if b['multiplier'] > threshold:
+            print("   %s %s = %s (%s)" % (b['side'], b['name'], round_to_str(b['value']), round_to_str(b['derivative'])))
+
+
+if __name__ == "__main__":
+    from classical_bcj import model_bcj
+    from quantum_qw import model_quantum
+    from quantum_hgj_asymmetric import model_hgj
+    for model in [ model_bcj, model_quantum, model_hgj("quantum2") ]:
+        with np.errstate(all='ignore'):
+            # the plain solve of HGJ stops away from a KKT point
+            success, time, result = model.optimize(verb=False, epigraph=True)
+        print("=========== %s ===========" % model.name)
+        sensitivity(model, result.x, verb=True)
@@ -0,0 +1,88 @@
+"""
+Tests of the cache of optimization results (cache.py). Run:
+    python -m pytest -q
+"""
+
+from cache import Cache, make_key
+from classical_bcj import model_bcj
+import os
+import numpy as np
+import pytest
+import scipy.optimize as opt
+import sqlite3
+
+
+def result(x):
+    return opt.OptimizeResult(x=np.array(x), fun=sum(x), success=True, status=0, message="ok", nit=3)
+
+
+def test_get_put(tmp_path):
+    cache = Cache(str(tmp_path / "results.sqlite"))
+    assert cache.get("key") is None
+    cache.put("key", "label", result([1., 2.]), 0.5)
+    res = cache.get("key")
+    assert res.cached and res.seconds == 0.5 and res.success and res.nit == 3
+    np.testing.assert_array_equal(res.x, [1., 2.])
+
+
+def test_invalidate(tmp_path):
+    cache = Cache(str(tmp_path / "results.sqlite"))
+    for label in ["hgj quantum2", "hgj moremem", "bcj"]:
+        cache.put(label, label, result([0.]), 0.)
+    assert cache.invalidate("hgj") == 2
+    assert [ e[0] for e in cache.entries() ] == ["bcj"]
+    assert cache.invalidate() == 1 and cache.entries() == []
+
+
+def test_evict(tmp_path):
+    cache = Cache(str(tmp_path / "results.sqlite"))
+    for key in "abc":
+        cache.put(key, key, result([0.]*10), 0.)
+    cache.get("a")
+    size = cache.entries()[0][2]
+    # the least recently used result goes first
+    assert cache.evict(2*size) == 1
+    assert sorted(e[0] for e in cache.entries()) == ["a", "c"]
+    # put evicts beyond max_size
+    cache.max_size = size
+    cache.put("d", "d", result([0.]*10), 0.)
+    assert [ e[0] for e in cache.entries() ] == ["d"]
+
+
+def test_connections_closed(tmp_path, monkeypatch):
+    connections = []
+    def connect(*args, **kwargs):
+        connections.append(sqlite3.connect(*args, **kwargs))
+        return connections[-1]
+    monkeypatch.setattr(Cache, "_connect", lambda self : connect(self.path))
+    cache = Cache(str(tmp_path / "results.sqlite"))
+    cache.put("key", "label", result([1., 2.]), 0.5)
+    cache.get("key")
+    cache.get("other")
+    cache.entries()
+    cache.invalidate()
+    # __init__, put and its evict, the gets, entries and invalidate
+    assert len(connections) == 7
+    for db in connections:
+        with pytest.raises(sqlite3.ProgrammingError):
+            db.execute("SELECT 1")
+
+
+def test_model(tmp_path):
+    cache = Cache(str(tmp_path / "results.sqlite"))
+    res = model_bcj.solve(cache=cache)
+    assert not getattr(res, 'cached', False)
+    again = model_bcj.solve(cache=cache)
+    assert again.cached
+    np.testing.assert_array_equal(again.x, res.x)
+    # another start is another key
+    assert not getattr(model_bcj.solve(start=res.x, cache=cache), 'cached', False)
+    assert len(cache.entries()) == 2
+
+
+def test_definition():
+    definition = model_bcj.definition()
+    # the files of the repository imported by the model, directly or not
+    assert {"classical_bcj.py", "model.py", "macros.py", "interval.py", "multistart.py"} <= set(definition['files'])
+    assert make_key(definition) == make_key(model_bcj.definition())
+    assert make_key(definition) != make_key(model_bcj.variant({ 'l4' : (0, 0.2) }).definition())
@@ -0,0 +1,69 @@
+"""
+Tests of the certified upper bounds of certify.py. Run:
+    python -m pytest -q
+"""
+
+from certify import certify, certify_tradeoff, enclosable
+from classical_bcj import model_bcj
+from classical import model_classical
+from quantum_hgj_asymmetric import tradeoff_hgj
+from interval import Interval, NotEnclosable
+import quantum_qw
+import copy
+import numpy as np
+import pytest
+
+
+def optimum(model):
+    with np.errstate(all='ignore'):
+        return model.optimize(False, cache=False)[2].x
+
+
+@pytest.mark.parametrize("model", [model_bcj, quantum_qw.model_quantum, model_classical],
+        ids=["bcj", "quantum", "classical"])
+def test_certified(model):
+    x = optimum(model)
+    with np.errstate(all='ignore'):
+        certificate = certify(model, x)
+    assert certificate.certified and certificate.message == ""
+    assert certificate.bound == pytest.approx(model.time(x), abs=1e-7)
+    # the box (around the exact solution) lies within the bounds, and the time
+    # is below the bound on it
+    assert certificate.bound >= model.time((certificate.box.lo + certificate.box.hi)/2)
+    for (lo, hi), a, b in zip(model.bounds, certificate.box.lo, certificate.box.hi):
+        assert (lo is None or lo <= a) and (hi is None or b <= hi)
+
+
+def test_not_enclosable():
+    def opaque(x):
+        if isinstance(x[0], Interval):
+            raise NotEnclosable("opaque")
+        return x[0] - 0.5
+    model = copy.copy(model_bcj)
+    model.constraints = model_bcj.constraints + [ { 'type' : 'ineq', 'fun' : opaque } ]
+    x = optimum(model_bcj)
+    assert enclosable(model, x) == "constraint %i cannot be enclosed: opaque" % len(model_bcj.constraints)
+    certificate = certify(model, x)
+    assert not certificate.certified and certificate.bound == np.inf
+    assert certificate.message == enclosable(model, x)
+
+
+@pytest.mark.parametrize("overrides, message", [
+    ({ 'l4' : 0.25 }, "the box leaves the bounds of l4"),
+    ({ 'alpha1' : 0. }, "Krawczyk test failed"),
+])
+def test_not_certified(overrides, message):
+    # a variable fixed by its bounds, and a degenerate alphabet (xlx at 0)
+    model = model_bcj.variant(overrides)
+    with np.errstate(all='ignore'):
+        certificate = certify(model, optimum(model))
+    assert not certificate.certified and certificate.bound == np.inf and certificate.message == message
+
+
+def test_tradeoff():
+    points = tradeoff_hgj("quantum2", [0.1, 0.3], sweep=True)
+    with np.errstate(all='ignore'):
+        certificates = certify_tradeoff(points)
+    for point, certificate in zip(points, certificates):
+        assert certificate.certified
+        assert certificate.bound == pytest.approx(point.time, abs=1e-5)
@@ -0,0 +1,88 @@
+"""
+Tests of the inner minimization of p_good_2 in classical.py. Run:
+    python -m pytest -q
+"""
+
+from classical import p_good_2, proba_2, argmin_proba_2
+from macros import grad, Dual, Interval
+import numpy as np
+import pytest
+
+
+def level(alpha2, gamma2, alpha3, gamma3):
+    """
+    The arguments of p_good_2 in the constraint of p2 of the classical model.
+    """
+    return (1/8.+alpha2-2*gamma2, alpha2, gamma2, 1/16.+alpha3-2*gamma3, alpha3, gamma3)
+
+
+def bounds(b0, a0, c0, b1, a1, c1):
+    return (max(a0/2+b0/2-a1, 0, b1/2-a1/2+a0/4+b0/4-c0/2),
+            min(1/2.-c0/2-a1, b0/2, b1/2-a1/2+a0/4+b0/4))
+
+
+def points(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.uniform([0, 0, 0, 0], [0.06, 0.01, 0.03, 0.005], (count, 4))
+
+
+def test_argmin_proba_2():
+    checked = 0
+    for point in points(100):
+        args = level(*point)
+        lo, hi = bounds(*args)
+        if not lo < hi:
+            continue
+        x = argmin_proba_2(*args[:5], lo, hi)
+        assert lo <= x <= hi
+        grid = np.linspace(lo, hi, 2001)[1:-1]
+        values = proba_2(grid, *args[:5])
+        assert proba_2(x, *args[:5]) <= values.min() + 1e-12
+        assert x == pytest.approx(grid[np.argmin(values)], abs=2*(hi - lo)/2000)
+        checked += 1
+    assert checked > 50
+    assert argmin_proba_2(*level(0.03, 0., 0.01, 0.)[:5], 0.1, 0.1) == 0.1
+
+
+def test_p_good_2_continuous():
+    # without "2" at level 2 (gamma2 = 0), the interval of the minimization is
+    # a point, which the rounding errors can make empty. The value must not
+    # jump there, and the gradient in the other parameters (along which the
+    # interval stays a point) must be the one of the function. The slope in
+    # gamma2 itself can be infinite, as the one of xlx at 0.
+    fun = lambda v : p_good_2(*level(*v))
+    jac = grad(fun)
+    others = [0, 2, 3]
+    h = 1e-6
+    for point in points(200, seed=1):
+        at = np.array(point)
+        at[1] = 0.
+        assert fun(at + [0, 1e-9, 0, 0]) == pytest.approx(fun(at), abs=1e-7)
+        differences = [ (fun(at + h*e) - fun(at - h*e))/(2*h) for e in np.eye(4)[others] ]
+        np.testing.assert_allclose(jac(at)[others], differences, rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(jac(at + [0, 1e-9, 0, 0])[others], jac(at)[others], rtol=1e-4, atol=1e-5)
+
+
+def test_p_good_2_enclosure():
+    # on a box of the parameters, the enclosure contains the values and the
+    # gradients at its corners and at its middle (the width of the box is
+    # amplified about a thousand times)
+    jac = grad(lambda v : p_good_2(*level(*v)))
+    checked = 0
+    for point in points(30, seed=2):
+        lo, hi = bounds(*level(*point))
+        if not lo + 1e-4 < hi:
+            continue
+        radius = 1e-7
+        box = Interval(point - radius, point + radius)
+        value = p_good_2(*level(*box))
+        gradient = p_good_2(*level(*[ Dual(box[i], {i: 1.}) for i in range(4) ])).d
+        for corner in [point - radius, point, point + radius]:
+            assert value.lo <= p_good_2(*level(*corner)) <= value.hi
+            for i, d in enumerate(jac(corner)):
+                assert gradient[i].lo <= d <= gradient[i].hi
+        # at a point (as in the Krawczyk test), the enclosure is tight
+        value = p_good_2(*level(*Interval(point)))
+        assert value.hi - value.lo < 1e-12
+        checked += 1
+    assert checked > 10
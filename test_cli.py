@@ -0,0 +1,63 @@
+"""
+Tests of the command-line interface of cli.py. Run:
+    python -m pytest -q
+"""
+
+from cli import main, COLUMNS
+from classical_bcj import model_bcj
+import csv
+import json
+import pytest
+
+
+@pytest.mark.parametrize("args, message", [
+    ([], "no model given"),
+    (["knapsack"], "unknown model: knapsack"),
+    (["bcj", "--flag", "quantum2"], "--flag and --mcons only apply to: hgj"),
+    (["hgj", "--flag", "quantum3"], "unknown flag for hgj: quantum3"),
+    (["bcj", "--method", "newton"], "invalid choice: 'newton'"),
+])
+def test_errors(args, message, capsys):
+    with pytest.raises(SystemExit) as e:
+        main(args + ["--no-cache"])
+    assert e.value.code == 2
+    assert message in capsys.readouterr().err
+
+
+def test_list(capsys):
+    assert main(["--list"]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert "bcj" in lines and "hgj (--flag classical|quantum1|quantum2|moremem)" in lines
+
+
+def test_json(tmp_path):
+    path = tmp_path / "results.json"
+    assert main(["bcj", "classical", "--no-cache", "-o", str(path)]) == 0
+    bcj, classical = json.loads(path.read_text())
+    assert (bcj['model'], bcj['status'], bcj['success']) == ("bcj", "done", True)
+    assert bcj['time'] == pytest.approx(0.2891, abs=1e-4) and bcj['epigraph_time'] is None
+    assert list(bcj['parameters']) == list(model_bcj.settype._fields)
+    # the classical model is solved in epigraph form by default (see Model)
+    assert classical['epigraph'] and classical['epigraph_time'] == pytest.approx(classical['time'], abs=1e-8)
+    assert main(["classical", "--no-epigraph", "--no-cache", "-o", str(path)]) == 0
+    assert not json.loads(path.read_text())[0]['epigraph']
+
+
+def test_csv(tmp_path):
+    path = tmp_path / "tradeoff.csv"
+    assert main(["hgj", "--flag", "quantum2", "--mcons", "0.1", "0.2", "--format", "csv", "--no-cache",
+            "-o", str(path)]) == 0
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0][:len(COLUMNS)] == COLUMNS and rows[0][len(COLUMNS):len(COLUMNS) + 2] == ["Memory", "Sum"]
+    runs = [ dict(zip(rows[0], row)) for row in rows[1:] ]
+    assert [ (r['model'], r['flag'], r['mcons'], r['status']) for r in runs ] == [
+            ("hgj", "quantum2", "0.1", "done"), ("hgj", "quantum2", "0.2", "done")]
+    assert float(runs[0]['time']) > float(runs[1]['time'])
+
+
+def test_timeout(tmp_path):
+    path = tmp_path / "results.json"
+    assert main(["bcj", "--timeout", "0.01", "--no-cache", "-o", str(path)]) == 1
+    result, = json.loads(path.read_text())
+    assert (result['model'], result['status'], result['error']) == ("bcj", "timeout", None)
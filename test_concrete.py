@@ -0,0 +1,128 @@
+"""
+Small-n tests of the concrete solvers (concrete_*.py) and of the list
+operations they share. Run:
+    python -m pytest -q
+"""
+
+from concrete import random_instance, check_solution, from_limbs, popcount, join
+from concrete_bcj import solve_bcj
+from concrete_classical import solve_classical, make_plan, pack, unpack, add_digits, nibbles
+from concrete_streaming import solve_streaming
+from concrete_qw import BatchWalkTree, Spec, make_spec, qw_parameters, DEPTH
+import numpy as np
+import pytest
+
+
+def assert_solution(instance, solution):
+    """
+    solution is a 0/1 vector whose weights add up to the target modulo 2^n.
+    """
+    assert solution is not None
+    solution = np.asarray(solution)
+    assert set(np.unique(solution)) <= {0, 1}
+    weights = from_limbs(instance.weights)
+    total = sum(w for w, e in zip(weights, solution) if e) % (1 << instance.n)
+    assert total == from_limbs([instance.target])[0]
+
+
+@pytest.mark.parametrize("n", [20, 24])
+def test_bcj(n):
+    instance = random_instance(n, seed=n)
+    solution, stats = solve_bcj(instance, seed=0)
+    assert_solution(instance, solution)
+
+
+@pytest.mark.parametrize("n", [20, 24])
+def test_classical(n):
+    instance = random_instance(n, seed=n)
+    solution, stats = solve_classical(instance, seed=0)
+    assert_solution(instance, solution)
+    # the "2" of the model at levels 1 and 2 (gamma3 is 0)
+    assert [ digits[2] for digits in stats['digits'] ] == [0, 1, 1, 0]
+
+
+@pytest.mark.parametrize("twos", [(1, 0, 0), (0, 1, 0)])
+def test_classical_twos(twos):
+    instance = random_instance(24, seed=3)
+    solution, stats = solve_classical(instance, seed=0, twos=twos)
+    assert_solution(instance, solution)
+    assert tuple(digits[2] for digits in stats['digits'][1:]) == twos
+    # the merges of the levels 1 and 2 keep pairs with "2" digits
+    assert all(level['log2_filtering'] is not None for level in stats['levels'][1:3])
+
+
+def test_classical_plans():
+    assert all(digits[2] == 0 for digits in make_plan(32, twos="best").digits)
+    with pytest.raises(ValueError):
+        make_plan(24, twos=(2, 1, 1))
+
+
+def test_add_digits():
+    rng = np.random.default_rng(0)
+    for n in [7, 8]:
+        # pairs of vectors of {-1,0,1,2}^n whose sums are in [-1, 2]...
+        left = rng.integers(-1, 3, (1000, n))
+        right = rng.integers(-1, 3, (1000, n))
+        np.testing.assert_array_equal(unpack(pack(left), n), left)
+        total = unpack(add_digits(pack(left), pack(right)), n)
+        np.testing.assert_array_equal(total, left + right)
+        # ... and the others, of nibbles outside of [1, 4], which merge_stream drops
+        nib = nibbles(add_digits(pack(left), pack(right)))[:, :n]
+        np.testing.assert_array_equal((nib >= 1) & (nib <= 4), (left + right >= -1) & (left + right <= 2))
+
+
+@pytest.mark.parametrize("mcons", [None, 0.25])
+def test_streaming(mcons, tmp_path):
+    instance = random_instance(24, seed=1)
+    solution, stats = solve_streaming(instance, mcons=mcons, seed=0, directory=str(tmp_path))
+    assert_solution(instance, solution)
+    # with a budget, the classes which do not fit are written to disk
+    assert (stats['spilled'] > 0) == (mcons is not None)
+
+
+def test_check_solution():
+    instance = random_instance(16, seed=0)
+    assert check_solution(instance, instance.solution)
+    wrong = instance.solution.copy()
+    wrong[0] ^= 1
+    assert not check_solution(instance, wrong)
+
+
+def test_popcount():
+    x = np.random.default_rng(0).integers(0, 1 << 63, (100, 2), dtype=np.uint64) << np.uint64(1)
+    expected = [ sum(bin(int(t)).count("1") for t in row) for row in x ]
+    assert list(popcount(x)) == expected
+    # without np.bitwise_count (NumPy < 2.0)
+    bitwise_count = getattr(np, 'bitwise_count', None)
+    try:
+        if bitwise_count is not None:
+            del np.bitwise_count
+        assert list(popcount(x)) == expected
+        assert list(popcount(x[:, ::-1])) == expected
+    finally:
+        if bitwise_count is not None:
+            np.bitwise_count = bitwise_count
+
+
+def test_join():
+    left, right = np.array([3, 1, 2, 3]), np.array([3, 3, 0, 1])
+    pairs = sorted((int(i), int(j)) for chunk_i, chunk_j in join(left, right, chunk=2)
+            for i, j in zip(chunk_i, chunk_j))
+    assert pairs == [ (i, j) for i in range(4) for j in range(4) if left[i] == right[j] ]
+
+
+def test_batch_walk_tree():
+    # without filtering, each list is exactly the join of its children
+    spec = make_spec(qw_parameters(False), False)
+    tree = BatchWalkTree(24, Spec(spec.sizes, spec.bits, [0.]*len(spec.filters)), seed=0)
+    tree.setup()
+    for t in range(20):
+        changes = tree.updates(50)
+        assert changes.shape == (50, DEPTH + 1)
+        assert np.all(changes[:, DEPTH] == 2)
+    for v in range(2**DEPTH - 1):
+        left, right, parent = tree.lists[2*v + 1], tree.lists[2*v + 2], tree.lists[v]
+        expected = { (int(left['ids'][i]), int(right['ids'][j])) for chunk_i, chunk_j in
+                join(left['keys'], right['keys']) for i, j in zip(chunk_i, chunk_j) }
+        assert set(zip(parent['left'].tolist(), parent['right'].tolist())) == expected
+        assert len(parent['ids']) == len(expected)
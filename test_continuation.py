@@ -0,0 +1,53 @@
+"""
+Tests of the continuation from BCJ to classical.py of continuation.py. Run:
+    python -m pytest -q
+"""
+
+from continuation import continuation, onsets, bcj_start, Step
+from classical import model_classical
+from macros import violation
+import collections
+import pytest
+
+
+@pytest.fixture(scope="module")
+def path():
+    return continuation(steps=4)
+
+
+def test_start(path):
+    start = path[0]
+    assert (start.t, start.gamma_max, start.accepted) == (0., 0., True)
+    assert list(start.x) == bcj_start(model_classical)
+    assert start.time == pytest.approx(0.2891, abs=1e-4)
+    assert start.x.gamma1 == start.x.gamma2 == start.x.gamma3 == 0
+
+
+def test_path(path):
+    assert [ s.t for s in path ] == sorted(s.t for s in path) and path[-1].t == 1.
+    assert path[-1].gamma_max == pytest.approx(0.01)
+    for previous, step in zip(path, path[1:]):
+        # the feasible set grows: the time cannot increase
+        assert step.time <= previous.time + 1e-9
+        assert violation(model_classical.constraints, list(step.x)) <= 1e-8
+        assert all(getattr(step.x, name) <= step.gamma_max + 1e-9 for name in ["gamma1", "gamma2", "gamma3"])
+        alphas = [step.x.alpha1, step.x.alpha2, step.x.alpha3]
+        assert all(a <= hi + 1e-9 for a, hi in zip(alphas, step.alpha_max))
+    # the optimum of the epigraph form of classical.py (see Model)
+    assert path[-1].time == pytest.approx(0.2829, abs=1e-4)
+
+
+def test_onsets(path):
+    res = onsets(path)
+    assert list(res) == ["gamma1", "gamma2", "gamma3"]
+    assert res["gamma1"] is path[1] and res["gamma3"] is None
+
+
+def test_onsets_leave():
+    # a gamma which leaves 0 and comes back pays off from its last departure
+    X = collections.namedtuple('X', 'gamma1 alpha1')
+    path = [ Step(t, t, [0.1], 0.3 - t/10, X(g, 0.05), True, True, 0., 0)
+            for t, g in [(0., 0.), (0.25, 0.1), (0.5, 0.), (0.75, 0.2), (1., 0.3)] ]
+    assert onsets(path)["gamma1"] is path[3]
+    assert onsets(path, tol=0.25)["gamma1"] is path[4]
+    assert onsets(path, tol=0.5)["gamma1"] is None
@@ -0,0 +1,61 @@
+"""
+Tests of the batch exploration of explore.py, on model_bcj. Run:
+    python -m pytest -q
+"""
+
+from explore import explore, grid, to_csv, evaluate
+from classical_bcj import model_bcj
+from quantum_hgj_asymmetric import model_hgj
+from macros import violation
+import csv
+import io
+import math
+import numpy as np
+import pytest
+
+
+def test_grid():
+    overrides = grid(delta=[0, 0.5], gamma1=[(0, 0.01), (0, 0.02)])
+    assert len(overrides) == 4
+    assert overrides[1] == { 'delta' : 0, 'gamma1' : (0, 0.02) }
+
+
+@pytest.fixture(scope="module")
+def table():
+    # a bound, a fixed value, another parameter, and an unknown parameter
+    return explore(model_bcj, [ { 'l4' : (0, 0.2) }, { 'l4' : 0.25 }, { 'c3' : (0.2, None) }, { 'x' : 0 } ],
+            workers=2)
+
+
+def test_explore(table):
+    assert list(table["status"]) == ["done", "done", "done", "error"]
+    assert table[0]["l4"] <= 0.2 + 1e-9 and table[1]["l4"] == pytest.approx(0.25)
+    assert table[2]["c3"] >= 0.2 - 1e-9
+    # a tighter bound cannot give a better time than the optimum
+    assert all(table[i]["time"] >= 0.2891 - 1e-4 for i in range(3))
+    # a missing bound, and the bounds of the parameters not overridden, are NaN
+    assert table[2]["c3_min"] == 0.2 and math.isnan(table[2]["c3_max"]) and math.isnan(table[2]["l4_min"])
+    assert math.isnan(table[3]["time"])
+
+
+@pytest.mark.parametrize("model", [model_bcj, model_hgj("quantum2", 0.2)], ids=["bcj", "hgj"])
+def test_evaluate(model):
+    # the memory constraint of hgj calls max: it is evaluated point by point
+    x = np.array(model.start, dtype=float)
+    xs = x + np.random.default_rng(0).uniform(0, 0.01, (20, len(x)))
+    times, violations = evaluate(model, xs)
+    np.testing.assert_allclose(times, [ model.time(y) for y in xs ], rtol=1e-12)
+    np.testing.assert_allclose(violations, [ violation(model.constraints, y) for y in xs ], rtol=1e-12)
+
+
+def test_to_csv(table, tmp_path):
+    text = to_csv(table)
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert list(rows[0]) == list(table.dtype.names)
+    assert [ row["status"] for row in rows ] == ["done", "done", "done", "error"]
+    assert float(rows[1]["l4"]) == table[1]["l4"] and rows[1]["success"] == "True"
+    assert rows[3]["time"] == "nan"
+    path = tmp_path / "table.csv"
+    assert to_csv(table, str(path)) is None
+    with open(path, newline="") as f:
+        assert f.read() == text
@@ -0,0 +1,48 @@
+"""
+Tests of the finite-n integer search of finite.py, on model_bcj. Run:
+    python -m pytest -q
+"""
+
+from finite import integer_search, finite_model
+from classical_bcj import model_bcj
+import numpy as np
+import pytest
+
+
+ASYMPTOTIC = 0.2891
+
+
+@pytest.fixture(scope="module")
+def results():
+    return { n : integer_search(model_bcj, n) for n in [50, 200] }
+
+
+@pytest.mark.parametrize("n", [50, 200])
+def test_integer_search(results, n):
+    result = results[n]
+    assert np.isfinite(result.time) and result.time > ASYMPTOTIC
+    # the integer parameters are multiples of 1/n
+    assert set(result.integers) == {"c1", "c2", "c3", "alpha1", "alpha2", "alpha3"}
+    for name, k in result.integers.items():
+        assert isinstance(k, int) and getattr(result.x, name) == pytest.approx(k/n, abs=1e-12)
+    # a valid point of the exact model at n, with the time found
+    exact = finite_model(model_bcj, n)
+    x = list(result.x)
+    assert exact.time(x) == pytest.approx(result.time, abs=1e-12)
+    for c in exact.constraints:
+        value = float(c['fun'](x))
+        assert (abs(value) if c['type'] == 'eq' else -value) <= 1e-9
+    assert result.sizes['l4'] == round(2.**(result.x.l4*n))
+
+
+def test_local_optimum(results):
+    # the search started from its result stays there
+    result = results[50]
+    again = integer_search(model_bcj, 50, list(result.x))
+    assert again.integers == result.integers and again.time == pytest.approx(result.time, abs=1e-12)
+
+
+def test_convergence(results):
+    # the time at n decreases towards the asymptotic exponent
+    assert results[50].time > results[200].time > ASYMPTOTIC
+    assert results[200].time - ASYMPTOTIC < 0.05
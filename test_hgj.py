@@ -0,0 +1,86 @@
+"""
+Tests of the time-memory tradeoffs of quantum_hgj_asymmetric.py. Run:
+    python -m pytest -q
+"""
+
+from quantum_hgj_asymmetric import _chunks, sweep_hgj, tradeoff_hgj, constrained_memory_hgj
+from quantum_hgj_asymmetric import filtering, h, _best_result
+from macros import duals
+import numpy as np
+import pytest
+import types
+import warnings
+
+
+MCONS = (0.1, 0.2, 0.3)
+
+
+def test_chunks():
+    assert _chunks([], 3) == []
+    assert _chunks([1, 2, 3, 4, 5], 2) == [[1, 2, 3], [4, 5]]
+    assert _chunks([1, 2], 4) == [[1], [2]]
+
+
+def test_filtering_at_one():
+    # no division by 1-b = 0, and the limit of the first term at b = 1
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert filtering(np.float64(0.), np.float64(1.)) == -h(0.)
+        assert filtering(0.1, 1.5) == pytest.approx(-h(0.1))
+        a, b = duals(np.array([0.1, 1.]))
+        assert filtering(a, b).v == pytest.approx(-h(0.1))
+        np.testing.assert_allclose(filtering(np.array([0.1, 0.1]), np.array([0.5, 1.])),
+                [filtering(0.1, 0.5), -h(0.1)])
+
+
+def test_best_result():
+    # x[0] >= 0: the violation is -x[0]
+    constraints = [ { 'type' : 'ineq', 'fun' : lambda x : x[0] } ]
+    def result(x, fun, success=False):
+        return types.SimpleNamespace(x=np.array([x]), fun=fun, success=success)
+    feasible, infeasible = result(0., 2.), result(-0.5, 1.)
+    assert _best_result(constraints, [infeasible, feasible]) is feasible
+    # the violations up to feastol are the same, the time decides
+    assert _best_result(constraints, [result(-1e-9, 2.), result(0., 3.)]).fun == 2.
+    assert _best_result(constraints, [result(-0.1, 2.), infeasible]).fun == 2.
+    assert _best_result(constraints, [infeasible, result(-1., 5., success=True)]).fun == 5.
+
+
+@pytest.fixture(scope="module")
+def cold():
+    return tradeoff_hgj("quantum2", MCONS)
+
+
+# the times in the table of the paper (the original print_table_contents)
+TABLE = {
+    "quantum1" : [0.3896, 0.2760, 0.2373],
+    "quantum2" : [0.3896, 0.2760, 0.2356],
+}
+
+
+@pytest.mark.parametrize("flag", list(TABLE))
+def test_table(cold, flag):
+    points = cold if flag == "quantum2" else tradeoff_hgj(flag, MCONS)
+    assert [ point.mcons for point in points ] == list(MCONS)
+    for point, time in zip(points, TABLE[flag]):
+        assert point.time == pytest.approx(time, abs=1e-4)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_sweep(cold, workers):
+    points = tradeoff_hgj("quantum2", MCONS, sweep=True, workers=workers)
+    assert [ point.mcons for point in points ] == list(MCONS)
+    for point, reference in zip(points, cold):
+        assert constrained_memory_hgj("quantum2", point.params) <= point.mcons + 1e-6
+        # the warm starts find the points of the paper, or better ones
+        assert point.time <= reference.time + 1e-6
+        assert point.time == pytest.approx(reference.time, abs=1e-4)
+
+
+def test_refine():
+    points = sweep_hgj("quantum2", mcons=MCONS, refine=0.05, maxpoints=7)
+    ms = [ point.mcons for point in points ]
+    assert ms == sorted(ms) and ms[0] == 0.1 and ms[-1] == 0.3 and 3 < len(ms) <= 7
+    # the less memory, the more time
+    times = [ point.time for point in points ]
+    assert all(a >= b - 1e-6 for a, b in zip(times, times[1:]))
@@ -0,0 +1,153 @@
+"""
+Tests of the exact jacobians of the models (against finite differences), of
+the array kernels (against the scalar ones) and of the exact counts of
+macros.py (against enumeration). Run:
+    python -m pytest -q
+"""
+
+from macros import with_jacobians, with_sparse_jacobians, epigraph_problem, log2_multinomial, log2_representations, PAIRS
+from classical_bcj import model_bcj, model_bcj_memory
+from classical import model_classical
+from quantum_hgj_asymmetric import model_hgj
+import classical
+import macros
+import quantum_hgj_asymmetric
+import quantum_qw
+import quantum_qw_no_heuristic
+import collections
+import itertools
+import math
+import numpy as np
+import pytest
+
+
+MODELS = {
+    "bcj" : lambda : model_bcj,
+    "bcj memory" : lambda : model_bcj_memory(0.2),
+    "classical" : lambda : model_classical,
+    "quantum" : lambda : quantum_qw.model_quantum,
+    "quantum no heuristic" : lambda : quantum_qw_no_heuristic.model_quantum,
+}
+for flag in ["classical", "quantum1", "quantum2", "moremem"]:
+    MODELS["hgj " + flag] = lambda flag=flag : model_hgj(flag)
+    MODELS["hgj %s mcons" % flag] = lambda flag=flag : model_hgj(flag, 0.2)
+    MODELS["hgj %s mcons epigraph" % flag] = lambda flag=flag : model_hgj(flag, 0.2, True)
+
+
+def points(model, count=3, seed=0):
+    """
+    Random points well inside the bounds of the model.
+    """
+    rng = np.random.default_rng(seed)
+    lower, upper = [ np.array([ b[i] for b in model.bounds ], dtype=float) for i in range(2) ]
+    return [ lower + (upper - lower)*rng.uniform(0.1, 0.9, len(lower)) for k in range(count) ]
+
+
+def finite_differences(fun, x, h=1e-6):
+    columns = []
+    for i in range(len(x)):
+        e = np.zeros(len(x))
+        e[i] = h
+        columns.append((np.atleast_1d(fun(x + e)) - np.atleast_1d(fun(x - e)))/(2*h))
+    return np.array(columns).T
+
+
+def assert_jacobian(jac, fun, x):
+    with np.errstate(all='ignore'):
+        exact = np.atleast_2d(jac(x))
+        approx = finite_differences(fun, x)
+    finite = np.isfinite(approx)
+    assert np.all(np.isfinite(exact[finite]))
+    np.testing.assert_allclose(exact[finite], approx[finite], rtol=1e-4, atol=1e-5)
+
+
+@pytest.mark.parametrize("name", list(MODELS))
+def test_jacobians(name):
+    model = MODELS[name]()
+    for x in points(model):
+        for constraint in with_jacobians(model.constraints):
+            assert_jacobian(constraint['jac'], constraint['fun'], x)
+
+
+@pytest.mark.parametrize("name", list(MODELS))
+def test_batched_jacobians(name):
+    model = MODELS[name]()
+    for x in points(model):
+        for constraint in model.batch:
+            assert_jacobian(constraint['jac'], constraint['fun'], x)
+
+
+@pytest.mark.parametrize("name", list(MODELS))
+def test_sparse_jacobians(name):
+    # the sparse jacobians of the other solvers (see macros.SOLVERS) are the
+    # dense ones of SLSQP, for the constraints one by one and for the batches
+    model = MODELS[name]()
+    for x in points(model):
+        for constraints in [with_jacobians(model.constraints), model.batch]:
+            for dense, sparse in zip(constraints, with_sparse_jacobians(constraints)):
+                with np.errstate(all='ignore'):
+                    np.testing.assert_allclose(sparse['jac'](x).toarray(), np.atleast_2d(dense['jac'](x)),
+                            rtol=1e-12, atol=1e-12)
+
+
+def test_sparse_epigraph():
+    model = model_bcj
+    dense = epigraph_problem(model.time, model.batch, model.bounds, model.start)
+    sparse = epigraph_problem(model.time, with_sparse_jacobians(model.batch), model.bounds, model.start,
+            sparse=True)
+    z = np.array(dense[4]) + 0.01
+    for c, s in zip(dense[2], sparse[2]):
+        np.testing.assert_allclose(s['jac'](z).toarray(), np.atleast_2d(c['jac'](z)), rtol=1e-12, atol=1e-12)
+
+
+# the kernels which accept arrays, by their number of arguments
+KERNELS = { "macros.xlx" : (macros.xlx, 1), "macros.g" : (macros.g, 2), "macros.f" : (macros.f, 3),
+            "macros.p_good" : (macros.p_good, 4), "macros.p_good_2_down" : (macros.p_good_2_down, 6),
+            "macros.p_good_2_up" : (macros.p_good_2_up, 6), "classical.xlx" : (classical.xlx, 1),
+            "classical.g" : (classical.g, 2), "classical.f" : (classical.f, 3),
+            "classical.p_good" : (classical.p_good, 4), "hgj.h" : (quantum_hgj_asymmetric.h, 1),
+            "hgj.filtering" : (quantum_hgj_asymmetric.filtering, 2) }
+
+
+@pytest.mark.parametrize("name", list(KERNELS))
+def test_array_kernels(name):
+    # the array version gives the scalar one elementwise, also at 0 and below
+    # 0 (where xlx is clamped)
+    kernel, nargs = KERNELS[name]
+    args = np.random.default_rng(0).uniform(-0.1, 0.6, (nargs, 200))
+    args[:, :20] = 0.
+    with np.errstate(all='ignore'):
+        expected = [ kernel(*[ float(t) for t in point ]) for point in args.T ]
+        np.testing.assert_allclose(kernel(*args), expected, rtol=1e-12, atol=1e-12)
+
+
+def test_log2_multinomial():
+    assert log2_multinomial(10, [3, 2]) == pytest.approx(math.log2(math.comb(10, 3)*math.comb(7, 2)))
+    assert log2_multinomial(5, [3, 3]) == -np.inf
+    np.testing.assert_allclose(log2_multinomial(6, [np.array([0, 1, 2]), 1]),
+            [ math.log2(math.comb(6, a)*math.comb(6 - a, 1)) for a in [0, 1, 2] ])
+
+
+def counts(v):
+    return (v.count(1), v.count(-1), v.count(2))
+
+
+@pytest.mark.parametrize("n", [3, 4])
+def test_log2_representations(n):
+    # all the sums of two vectors of {-1,0,1,2}^n whose digits add up to a
+    # digit of {-1,0,1,2}, by the counts of the three vectors
+    sums = set(PAIRS)
+    total = collections.Counter()
+    for left in itertools.product([-1, 0, 1, 2], repeat=n):
+        for right in itertools.product([-1, 0, 1, 2], repeat=n):
+            parent = tuple(a + b for a, b in zip(left, right))
+            if all(d in sums for d in parent):
+                total[(parent, counts(left), counts(right))] += 1
+    checked = 0
+    for (parent, left, right), ways in total.items():
+        if parent == tuple(sorted(parent)):
+            assert log2_representations(n, counts(parent), left, right) == pytest.approx(math.log2(ways))
+            checked += 1
+    assert checked > 0
+    assert log2_representations(n, (1, 1), (1, 0), (1, 1)) == log2_representations(n, (1, 1, 0), (1, 0, 0),
+            (1, 1, 0))
@@ -0,0 +1,97 @@
+"""
+Tests of model.py, on the toy model of conftest.py and on the models of the
+paper. Run:
+    python -m pytest -q
+"""
+
+from macros import wrap, with_jacobians, epigraph_problem
+from classical_bcj import model_bcj
+from quantum_hgj_asymmetric import model_hgj
+from model import Model, batch_constraints
+import copy
+import numpy as np
+import pytest
+import warnings
+
+
+def opaque(toy):
+    """
+    A constraint and a time of the toy model which use its namedtuple as a
+    tuple.
+    """
+    constraint = { 'type' : 'ineq', 'fun' : wrap(lambda x : sum(x) - 1, toy.settype) }
+    def opaque_time(x):
+        return sum(t*t for t in toy.settype(*x))
+    return constraint, opaque_time
+
+
+def test_batch_constraints(toy):
+    x = np.array([0.2, 0.7, 0.1])
+    opaque_constraint, _ = opaque(toy)
+    # a constraint not built with wrap is called as it is
+    plain = { 'type' : 'ineq', 'fun' : lambda x : x[0] }
+    eq = { 'type' : 'eq', 'fun' : wrap(lambda x : x.c, toy.settype) }
+    for constraints, values, jac in [
+            (toy.constraints + [opaque_constraint], [-0.1, 0.], [[1, 1, 0], [1, 1, 1]]),
+            (toy.constraints + [plain], [-0.1, 0.2], [[1, 1, 0], [1, 0, 0]]) ]:
+        batch, = batch_constraints(constraints + [eq])[1:]
+        assert batch['type'] == 'ineq'
+        np.testing.assert_allclose(batch['fun'](x), values, atol=1e-12)
+        np.testing.assert_allclose(batch['jac'](x), jac)
+        np.testing.assert_allclose(batch['sparse_jac'](x).toarray(), jac)
+    batch, = batch_constraints([eq])
+    assert batch['type'] == 'eq' and batch['fun'](x) == pytest.approx([0.1])
+
+
+def test_model_opaque(toy):
+    opaque_constraint, opaque_time = opaque(toy)
+    model = Model(toy.settype, [opaque_constraint], opaque_time, toy.bounds, toy.start)
+    assert model.time is opaque_time
+    success, time, result = model.optimize(verb=False, cache=False)
+    assert success and time == pytest.approx(1/3, abs=1e-6)
+
+
+def test_epigraph_problem(toy):
+    objective, jac, constraints, bounds, start = epigraph_problem(toy.time, with_jacobians(toy.constraints),
+            toy.bounds, toy.start)
+    # one auxiliary variable T for max(a, b), starting at its value
+    assert start == [0.9, 0.6, 0.3, 0.9] and bounds[:3] == toy.bounds
+    assert objective(start) == pytest.approx(1.2)
+    np.testing.assert_allclose(jac(start), [0, 0, 1, 1])
+    # the original constraint, then T - a >= 0 and T - b >= 0
+    np.testing.assert_allclose(np.concatenate([ np.atleast_1d(c['fun'](start)) for c in constraints ]),
+            [0.5, 0., 0.3])
+
+
+def test_epigraph(model_toy):
+    result = model_toy.solve(epigraph=True, cache=False)
+    assert result.success and result.epigraph == pytest.approx(0.5, abs=1e-8)
+    np.testing.assert_allclose(result.x, [0.5, 0.5, 0.], atol=1e-6)
+    # the same optimum as the plain problem
+    plain = model_bcj.solve(cache=False)
+    smooth = model_bcj.solve(epigraph=True, cache=False)
+    assert smooth.epigraph == pytest.approx(model_bcj.time(smooth.x), abs=1e-8)
+    assert model_bcj.time(smooth.x) == pytest.approx(model_bcj.time(plain.x), abs=1e-6)
+
+
+@pytest.mark.parametrize("model", [model_bcj, model_hgj("quantum2", None, True)], ids=["bcj", "hgj quantum2"])
+def test_trust_constr(model):
+    # the interior point method reaches the optimum of SLSQP
+    with warnings.catch_warnings():
+        # BFGS warns on the linear constraints
+        warnings.simplefilter("ignore", UserWarning)
+        rows = model.compare(["SLSQP", "trust-constr"], verb=False)
+    (_, slsqp, success, _), (_, trust, trust_success, v) = rows["SLSQP"], rows["trust-constr"]
+    assert success and trust_success and v <= 1e-7
+    assert trust == pytest.approx(slsqp, abs=1e-4)
+
+
+def test_compare_failed(capsys):
+    # stopped too early, the solvers are far from feasible: their success is False
+    model = copy.copy(model_bcj)
+    model.maxiter = 3
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        rows = model.compare(["SLSQP", "trust-constr"])
+    assert all(not row[2] and row[3] > 1e-7 for row in rows.values())
+    assert capsys.readouterr().out.count("FAILED") == 2
@@ -0,0 +1,77 @@
+"""
+Tests of the multi-start optimization (multistart.py) on a double well, whose
+two local minima are close to a = -1 (the global one) and a = 1. Run:
+    python -m pytest -q
+"""
+
+from macros import wrap
+from model import Model, parameters
+from multistart import multistart, distinct_optima, sample_starts
+import numpy as np
+import pytest
+import scipy.optimize as opt
+
+
+set_well, bounds_well, start_well = parameters('Well', [
+    ("a", (-2, 2), 0.9),
+    ("b", (0, 1), 0.5),
+])
+
+constraints_well = [
+    { 'type' : 'ineq', 'fun' : wrap(lambda x : x.a + 2*x.b + 1, set_well) },
+]
+
+
+def time_well(x):
+    x = set_well(*x)
+    y = x.a*x.a - 1
+    return y*y + 0.1*x.a + x.b*x.b
+
+
+model_well = Model(set_well, constraints_well, time_well, bounds_well, start_well)
+
+
+def test_sample_starts():
+    for sampling in ["lhs", "sobol"]:
+        starts = sample_starts(bounds_well, 16, sampling)
+        assert starts.shape == (16, 2)
+        assert np.all(starts >= [-2, 0]) and np.all(starts <= [2, 1])
+        np.testing.assert_array_equal(starts, sample_starts(bounds_well, 16, sampling))
+    with pytest.raises(ValueError):
+        sample_starts(bounds_well, 4, "grid")
+
+
+def test_sample_starts_open_bounds():
+    bounds = [(None, 2), (0, None), (None, None)]
+    starts = sample_starts(bounds, 16, start=[3, 0.5, 0], radius=0.5)
+    assert np.all(np.isfinite(starts))
+    assert np.all(starts >= [1.5, 0, -0.5]) and np.all(starts <= [2, 1, 0.5])
+    with pytest.raises(ValueError):
+        sample_starts(bounds, 4)
+    # a variant with an open bound is sampled around its start
+    best, optima = multistart(model_well.variant({ "a" : (None, 2) }), nstarts=8, workers=1)
+    assert best.x[0] == pytest.approx(-1.012, abs=0.002)
+
+
+def test_distinct_optima():
+    results = [ opt.OptimizeResult(x=np.array(x), fun=fun) for x, fun in
+            [([1., 0.], 2.), ([0., 0.], 1.), ([1e-6, 0.], 1.), ([0.5, 0.], 1.)] ]
+    optima = distinct_optima(results)
+    assert [ (o.fun, o.count) for o in optima ] == [(1., 2), (1., 1), (2., 1)]
+    assert optima[0].x[0] in (0., 1e-6) and optima[1].x[0] == 0.5
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_multistart(workers):
+    best, optima = multistart(model_well, nstarts=12, start=start_well, workers=workers)
+    assert len(optima) == 2 and sum(o.count for o in optima) == 13
+    assert best is optima[0]
+    assert best.x[0] == pytest.approx(-1.012, abs=0.002) and optima[1].x[0] == pytest.approx(0.987, abs=0.002)
+
+
+def test_solve():
+    # from its start, a single run ends in the local minimum at a = 1
+    single = model_well.solve(cache=False)
+    assert single.x[0] > 0
+    best = model_well.solve(nstarts=8, workers=1, cache=False)
+    assert best.x[0] < 0 and best.fun < single.fun - 0.1
@@ -0,0 +1,101 @@
+"""
+Tests of the profiler (profiling.py) on the BCJ model, whose constraints call
+p_good, g and xlx. Run:
+    python -m pytest -q
+"""
+
+from classical_bcj import model_bcj
+from profiling import profile, constraint_label
+import classical_bcj
+import copy
+import json
+import macros
+import numpy as np
+import pytest
+
+
+def counted(fun, calls, label):
+    def inner(*args, **kwargs):
+        calls[label] = calls.get(label, 0) + 1
+        return fun(*args, **kwargs)
+    return inner
+
+
+def test_batches():
+    # the calls that Model.solve makes to each batch and its jacobian
+    calls = {}
+    model = copy.copy(model_bcj)
+    model.batch = []
+    for constraint in model_bcj.batch:
+        size = sum(1 for c in model_bcj.constraints if c['type'] == constraint['type'])
+        label = "%s batch (%i constraints)" % (constraint['type'], size)
+        model.batch.append(dict(constraint, fun=counted(constraint['fun'], calls, label),
+                jac=counted(constraint['jac'], calls, label + " (jacobian)")))
+    reference = model.solve(cache=False)
+
+    with profile() as p:
+        result = model_bcj.solve(cache=False)
+    np.testing.assert_array_equal(result.x, reference.x)
+    assert result.nit == reference.nit
+    assert { label : c.calls for label, c in p.functions.items()
+            if "batch" in label and c.calls } == calls
+    assert p.functions["time"].calls == result.nfev
+    assert { "p_good", "g", "xlx" } <= { name for name, c in p.macros.items() if c.calls }
+    trace, = p.traces
+    assert len(trace) == result.nit and trace[-1][1] == pytest.approx(result.fun)
+
+
+def test_per_constraint():
+    with profile(per_constraint=True) as p:
+        model_bcj.solve(cache=False)
+    labels = [ constraint_label(i, c) for i, c in enumerate(model_bcj.constraints) ]
+    assert all(p.functions[label].calls > 0 and p.functions[label + " (jacobian)"].calls > 0
+            for label in labels)
+    assert not any("batch" in label for label in p.functions)
+
+
+def test_restored():
+    originals = { name : getattr(macros, name) for name in ["p_good", "g", "xlx"] }
+    with profile():
+        model_bcj.solve(cache=False)
+    assert all(getattr(macros, name) is fun for name, fun in originals.items())
+    assert classical_bcj.p_good is originals["p_good"]
+
+    def failing(x):
+        raise RuntimeError("time")
+    model = copy.copy(model_bcj)
+    model.time = failing
+    with pytest.raises(RuntimeError):
+        with profile():
+            model.solve(cache=False)
+    assert all(getattr(macros, name) is fun for name, fun in originals.items())
+    assert classical_bcj.p_good is originals["p_good"]
+
+
+def test_constraint_label(toy):
+    assert constraint_label(0, toy.constraints[0]) == "0 ineq x.a + x.b - 1"
+    assert (constraint_label(1, model_bcj.constraints[1]) ==
+            "1 eq [filtering terms] p_good(1 / 4.0 + x.alpha1, x.alpha1, 1 / 8.0 + x.alpha2, x.alpha2) - x.p1")
+    assert constraint_label(3, { 'type' : 'eq', 'fun' : np.sum }) == "3 eq"
+
+
+def test_report_dump(tmp_path):
+    with profile() as p:
+        result = model_bcj.solve(cache=False)
+    p.report(str(tmp_path / "profile.txt"))
+    text = (tmp_path / "profile.txt").read_text()
+    assert "Constraints (as solved) and time:" in text and "Macros (inclusive time):" in text
+    assert "Iterations (solve 0):" in text
+    # the sparse jacobians and the macros of other models are not called
+    assert "sparse jacobian" not in text and "p_good_2" not in text
+    assert "eq batch (7 constraints) (jacobian)" in text
+
+    p.dump(str(tmp_path / "profile.json"))
+    with open(tmp_path / "profile.json") as f:
+        dump = json.load(f)
+    assert not dump['per_constraint']
+    seconds = [ row['seconds'] for row in dump['functions'] ]
+    assert seconds == sorted(seconds, reverse=True)
+    assert { row['function'] : row['calls'] for row in dump['functions'] }["time"] == result.nfev
+    trace, = dump['traces']
+    assert [ row['iteration'] for row in trace ] == list(range(1, result.nit + 1))
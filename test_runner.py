@@ -0,0 +1,59 @@
+"""
+Tests of the parallel jobs of runner.py. Run:
+    python -m pytest -q
+"""
+
+from runner import run_jobs
+import os
+import time
+
+
+def square(x):
+    return x*x
+
+
+def fail():
+    raise ValueError("failed job")
+
+
+def sleep(seconds, value=None):
+    time.sleep(seconds)
+    return value
+
+
+def crash():
+    os._exit(3)
+
+
+def large():
+    return b"x"*(16 * 2**20)
+
+
+def results(jobs, **kwargs):
+    return { i : (status, value) for i, status, value, seconds in run_jobs(jobs, **kwargs) }
+
+
+def test_done():
+    jobs = [ (square, {'x' : x}) for x in range(6) ]
+    assert results(jobs, workers=3) == { x : ("done", x*x) for x in range(6) }
+
+
+def test_errors():
+    res = results([ (fail, {}), (crash, {}), (square, {'x' : 2}) ], workers=2)
+    assert res[0][0] == "error" and "ValueError: failed job" in res[0][1]
+    assert res[1] == ("error", "Exit code 3")
+    assert res[2] == ("done", 4)
+
+
+def test_timeout():
+    begin = time.perf_counter()
+    res = results([ (sleep, {'seconds' : 30}), (sleep, {'seconds' : 0.1, 'value' : 1}) ], workers=2,
+            timeout=1)
+    assert res == { 0 : ("timeout", None), 1 : ("done", 1) }
+    assert time.perf_counter() - begin < 10
+
+
+def test_large_result():
+    # larger than the buffer of the pipe: read before the job is joined
+    res = results([ (large, {}) ], timeout=5)
+    assert res[0][0] == "done" and len(res[0][1]) == 16 * 2**20
@@ -0,0 +1,52 @@
+"""
+Tests of the sensitivity analysis of sensitivity.py. Run:
+    python -m pytest -q
+"""
+
+from model import Model
+from sensitivity import sensitivity
+from classical_bcj import model_bcj
+import numpy as np
+import pytest
+
+
+def test_toy(model_toy):
+    # on the toy model of conftest.py, a = b = 1/2 and c = 0 at the optimum:
+    # relaxing the constraint by eps saves eps/2, and raising the lower bound
+    # of c costs as much
+    report = sensitivity(model_toy, model_toy.solve(cache=False).x)
+    assert report.kkt and report.time == pytest.approx(0.5)
+    constraint, = report.constraints
+    assert constraint['active'] and constraint['source'] == "x.a + x.b - 1"
+    assert constraint['derivative'] == pytest.approx(-0.5)
+    assert [ (t['source'], t['binding']) for t in report.branches[0] ] == [("x.a", True), ("x.b", True)]
+    assert [ t['weight'] for t in report.branches[0] ] == pytest.approx([0.5, 0.5])
+    bound, = report.bounds
+    assert (bound['name'], bound['side']) == ("c", "lower") and bound['derivative'] == pytest.approx(1.)
+
+
+def relaxed(constraint, eps):
+    fun = constraint['fun']
+    def inner(x):
+        return fun(x) + eps
+    inner.jac = fun.jac
+    return dict(constraint, fun=inner)
+
+
+def test_derivatives():
+    # the largest multipliers of BCJ predict the optimal time when their
+    # constraint is relaxed (the smaller ones are not unique: the active
+    # constraints are degenerate)
+    x = model_bcj.solve(cache=False).x
+    report = sensitivity(model_bcj, x)
+    assert report.kkt and all(c['multiplier'] >= 0 for c in report.constraints if c['type'] == 'ineq')
+    assert sum(t['weight'] for t in report.branches[0]) == pytest.approx(1., abs=1e-4)
+    eps = 1e-4
+    largest = sorted(report.constraints, key=lambda c : c['derivative'])[:6]
+    assert {'eq', 'ineq'} <= { c['type'] for c in largest }
+    for c in largest:
+        constraints = [ relaxed(d, eps) if i == c['index'] else d for i, d in enumerate(model_bcj.constraints) ]
+        model = Model(model_bcj.settype, constraints, model_bcj.time, model_bcj.bounds, x)
+        with np.errstate(all='ignore'):
+            time = model.optimize(False, epigraph=True, cache=False)[1]
+        assert (time - report.time)/eps == pytest.approx(c['derivative'], rel=0.01)
@@ -0,0 +1,62 @@
+"""
+Tests of the merging-tree models of tree.py, against the models of the
+paper. Run:
+    python -m pytest -q
+"""
+
+from tree import model_tree, sweep_depths, MergingTree
+import classical
+import classical_bcj
+import quantum_qw
+import pytest
+import warnings
+
+
+def test_built_silently():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        model_tree(4, "-101")
+        model_tree(3, "-1012", "quantum")
+
+
+# the trees which generalize the models of the paper: (arguments of model_tree,
+# epigraph, model)
+MODELS = {
+    "bcj" : ((4, "-101"), False, lambda : classical_bcj.model_bcj),
+    "classical" : ((4, "-1012"), True, lambda : classical.model_classical),
+    "quantum" : ((5, ["-1012", "-101", "-101", "-101"], "quantum"), False, lambda : quantum_qw.model_quantum),
+}
+
+
+@pytest.mark.parametrize("name", list(MODELS))
+def test_exponents(name):
+    args, epigraph, model = MODELS[name]
+    success, time, result = model_tree(*args).optimize(False, epigraph, cache=False)
+    assert success
+    assert time == pytest.approx(model().optimize(False, epigraph, cache=False)[1], abs=1e-6)
+
+
+def test_hgj():
+    # the classical HGJ algorithm, with symmetric lists (0.337)
+    success, time, result = model_tree(3, "01").optimize(False, cache=False)
+    assert success and time == pytest.approx(0.3371, abs=1e-4)
+
+
+def test_parameters():
+    tree = MergingTree(4, ["-1012", "-101", "01"])
+    assert tree.settype._fields == ("p0", "p1", "p2", "l1", "l2", "l3", "l4", "c1", "c2", "c3", "alpha1",
+            "alpha2", "gamma1")
+    assert "delta" in MergingTree(3, "01", "quantum").settype._fields
+    for args in [(1,), (3, "012"), (3, ["01"]), (3, "01", "grover")]:
+        with pytest.raises(ValueError):
+            MergingTree(*args)
+
+
+def test_sweep_depths():
+    # the epigraph form stops at 1.0974 at depth 10, the plain time at 0.9219
+    # at depth 9: the better one is kept
+    res = sweep_depths([4, 5, 9, 10], "-1012", verb=False)
+    assert [ (depth, success) for depth, success, time, worse in res ] == [(4, True), (5, True), (9, True), (10, True)]
+    assert [ time for depth, success, time, worse in res ] == pytest.approx([0.2829, 0.2834, 0.2834, 0.2834], abs=1e-4)
+    # depth 5 is worse than depth 4
+    assert [ worse for depth, success, time, worse in res ] == [False, True, False, False]
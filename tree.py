@@ -0,0 +1,260 @@
+"""
+Generic merging trees: the model (see model.py) of a merging tree of any depth,
+with a representation alphabet per level and a classical or quantum walk cost.
+
+Level 0 is the solution and level d is the bottom of the tree. The lists of
+level i have size li, and merging two lists of level i+1 into a list of level
+i puts a modular constraint on c_i - c_{i+1} bits (c_0 = 1). A representation
+at level i >= 1 has 1/2^{i+1} + alphai - 2 gammai "1", alphai "-1" and gammai
+"2", depending on the alphabet of the level:
+- "01": no -1 nor 2 (alphai = gammai = 0);
+- "-101": no 2 (gammai = 0);
+- "-1012".
+The bottom level d has the alphabet of level d-1, since its representations
+are halves of the ones of level d-1.
+
+The classical cost generalizes classical_bcj.py and classical.py, the quantum
+walk cost ("quantum") generalizes quantum_qw.py:
+>>> model_tree(4, "-101").optimize()                                # 0.289
+>>> model_tree(4, "-1012").optimize(epigraph=True)                  # 0.283
+>>> model_tree(5, ["-1012", "-101", "-101", "-101"], "quantum").optimize()   # 0.216
+>>> sweep_depths(range(3, 11), "-101")
+"""
+
+from macros import g, p_good, p_good_2_down, p_good_2_up, wrap, round_upwards_to_str
+from model import Model
+import classical
+import macros
+import collections
+import numpy as np
+
+
+ALPHABETS = ["01", "-101", "-1012"]
+
+COSTS = ["classical", "quantum"]
+
+
+class MergingTree:
+    """
+    The parameters, constraints and time of a merging tree.
+
+    @param depth: the level d of the bottom lists (at least 2).
+    @param alphabets: the alphabet of each level 1, ..., d-1 (see ALPHABETS), or
+    one alphabet for all of them.
+    @param cost: "classical" or "quantum" (see COSTS).
+
+    Among the parameters:
+    - pi is the filtering probability of the merge into level i
+    - li is the list size at level i; classically, l0 = 0 since we want to find
+    the solution. With the quantum walk, l0 < 0 since only a few nodes contain
+    a solution, and the bottom lists are implicit: the left one has size
+    l_{d-1} and the right one size c_{d-1}, split by delta (as in quantum_qw.py)
+    - ci is the total number of bits of the modular constraint at level i
+    - alphai is the total number of "-1" at level i (if allowed)
+    - gammai is the total number of "2" at level i (if allowed)
+    """
+
+    def __init__(self, depth, alphabets="-101", cost="classical"):
+        if depth < 2:
+            raise ValueError("Invalid depth: " + str(depth))
+        if isinstance(alphabets, str):
+            alphabets = [alphabets]*(depth - 1)
+        alphabets = list(alphabets)
+        if len(alphabets) != depth - 1 or any(a not in ALPHABETS for a in alphabets):
+            raise ValueError("Invalid alphabets: " + str(alphabets))
+        if cost not in COSTS:
+            raise ValueError("Invalid cost: " + str(cost))
+        self.depth = depth
+        self.cost = cost
+        # the alphabets of the levels 0, ..., d
+        self.alphabets = ["01"] + alphabets + alphabets[-1:]
+
+        d = depth
+        names = [ "p%i" % i for i in range(d - 1) ]
+        if cost == "classical":
+            names += [ "l%i" % i for i in range(1, d + 1) ]
+        else:
+            names += [ "l%i" % i for i in range(d) ] + [ "delta" ]
+        names += [ "c%i" % i for i in range(1, d) ]
+        names += [ "alpha%i" % i for i in range(1, d) if self.minus(i) ]
+        names += [ "gamma%i" % i for i in range(1, d) if self.two(i) ]
+        self.settype = collections.namedtuple("tree%i" % d, names)
+
+    def __repr__(self):
+        # used in the keys of the cache (see Model.definition)
+        return "MergingTree(%i, %r, %r)" % (self.depth, self.alphabets[1:-1], self.cost)
+
+    def minus(self, i):
+        return "-1" in self.alphabets[i]
+
+    def two(self, i):
+        return "2" in self.alphabets[i]
+
+    def level(self, x, i):
+        """
+        The numbers of "1", "-1" and "2" of the representations at level i.
+        """
+        if i == 0:
+            return 1/2., 0., 0.
+        alpha = getattr(x, "alpha%i" % i) if self.minus(i) else 0.
+        gamma = getattr(x, "gamma%i" % i) if self.two(i) else 0.
+        return 1/2**(i + 1) + alpha - 2*gamma, alpha, gamma
+
+    def entropy(self, x, i):
+        """
+        The number of representations at level i.
+        """
+        ones, alpha, gamma = self.level(x, i)
+        if not self.two(i):
+            return g(ones, alpha)
+        return (classical.f if self.cost == "classical" else macros.f)(ones, alpha, gamma)
+
+    def filtering(self, x, i):
+        """
+        The probability that the sum of two representations of level i+1 is a
+        representation of level i.
+        """
+        upper, lower = self.level(x, i), self.level(x, i + 1)
+        if not self.two(i) and not self.two(i + 1):
+            return p_good(upper[0], upper[1], lower[0], lower[1])
+        if i == 0:
+            kernel = classical.p_good_2_aux if self.cost == "classical" else p_good_2_down
+        elif self.two(i + 1):
+            kernel = classical.p_good_2
+        else:
+            kernel = p_good_2_up
+        return kernel(*upper, *lower)
+
+    def constraints(self):
+        d = self.depth
+        tree = lambda f : wrap(f, self.settype)
+        c = lambda x, i : 1 if i == 0 else getattr(x, "c%i" % i)
+        l = lambda x, i : getattr(x, "l%i" % i)
+        p = lambda x, i : getattr(x, "p%i" % i)
+
+        # filtering terms
+        res = [ { 'type' : 'eq', 'fun' : tree(lambda x, i=i : self.filtering(x, i) - p(x, i)) }
+                for i in range(d - 1) ]
+        if self.cost == "classical":
+            # sizes of the lists (l0 = 0)
+            res += [ { 'type' : 'eq', 'fun' : tree(lambda x, i=i :
+                    2*l(x, i) - (c(x, i-1) - c(x, i)) + p(x, i-1) - (l(x, i-1) if i > 1 else 0)) }
+                    for i in range(1, d) ]
+            res.append({ 'type' : 'eq', 'fun' : tree(lambda x : 2*l(x, d) - c(x, d-1) - l(x, d-1)) })
+            res += [ { 'type' : 'ineq', 'fun' : tree(lambda x, i=i : self.entropy(x, i) - c(x, i) - l(x, i)) }
+                    for i in range(1, d) ]
+            res.append({ 'type' : 'ineq', 'fun' : tree(lambda x : self.entropy(x, d-1)*0.5 - l(x, d)) })
+            # coherence of the -1 and of the 2
+            res += [ { 'type' : 'ineq', 'fun' : tree(lambda x, i=i :
+                    getattr(x, "alpha%i" % (i+1)) - getattr(x, "alpha%i" % i)/2) }
+                    for i in range(1, d - 1) if self.minus(i) and self.minus(i + 1) ]
+            res += [ { 'type' : 'ineq', 'fun' : tree(lambda x, i=i :
+                    getattr(x, "alpha%i" % i) - 2*getattr(x, "gamma%i" % i)) }
+                    for i in range(1, d) if self.two(i) ]
+        else:
+            # sizes of the lists
+            res += [ { 'type' : 'eq', 'fun' : tree(lambda x, i=i :
+                    2*l(x, i) - (c(x, i-1) - c(x, i)) + p(x, i-1) - l(x, i-1)) }
+                    for i in range(1, d) ]
+            # size of the right bottom list = c_{d-1}
+            res.append({ 'type' : 'eq', 'fun' : tree(lambda x : self.entropy(x, d-1)*(1 - x.delta) - c(x, d-1)) })
+            # size of the left bottom list = l_{d-1}
+            res.append({ 'type' : 'ineq', 'fun' : tree(lambda x :
+                    x.l0/2**(d-1) + self.entropy(x, d-1)*x.delta - l(x, d-1)) })
+            # at other levels
+            res += [ { 'type' : 'ineq', 'fun' : tree(lambda x, i=i :
+                    x.l0/2**i + self.entropy(x, i) - c(x, i) - l(x, i)) } for i in range(1, d) ]
+            # no update explosion
+            res += [ { 'type' : 'ineq', 'fun' : tree(lambda x, i=i : l(x, i+1) - l(x, i)) }
+                    for i in range(1, d - 1) ]
+        return res
+
+    def time(self, x, max=max):
+        """
+        Classical time, or heuristic quantum time (as in quantum_qw.py).
+        """
+        x = self.settype(*x)
+        d = self.depth
+        if self.cost == "classical":
+            l = [0] + [ getattr(x, "l%i" % i) for i in range(1, d + 1) ]
+        else:
+            l = [ getattr(x, "l%i" % i) for i in range(d) ]
+        c = [1] + [ getattr(x, "c%i" % i) for i in range(1, d) ]
+        p = [ getattr(x, "p%i" % i) for i in range(d - 1) ]
+        if self.cost == "classical":
+            return max(l[d], l[d-1], *[ l[i] - p[i] for i in range(d - 2, 0, -1) ], -p[0])
+        setup = max(c[d-1], l[d-1], *[ l[i] - p[i]/2 for i in range(d - 2, 0, -1) ],
+                (l[1] + max(l[1] - (1 - c[1]), 0))/2)
+        update = max(0, *[ (l[i] - (c[i-1] - c[i]))/2 for i in range(d - 1, 0, -1) ])
+        return max(setup, (max(0, -l[0]) + l[d-1])/2 + update)
+
+    def bounds(self):
+        return [ (-1, 0) if name[0] == "p" or name == "l0" else
+                 (0, 0.1) if name.startswith("alpha") else
+                 (0, 0.01) if name.startswith("gamma") else (0, 1)
+                 for name in self.settype._fields ]
+
+    def start(self):
+        return [ -0.2 if name[0] == "p" or name == "l0" else
+                 0.03 if name.startswith("alpha") else
+                 0.005 if name.startswith("gamma") else 0.2
+                 for name in self.settype._fields ]
+
+
+def model_tree(depth, alphabets="-101", cost="classical", bounds=None, start=None, **kwargs):
+    """
+    Returns the model (see model.py) of the merging tree of the given depth,
+    alphabets and cost (see MergingTree).
+
+    @param bounds, start: dicts {parameter : bounds or starting value} which
+    replace the default ones for these parameters.
+    The other keyword arguments are given to Model, e.g. maxiter.
+    """
+    tree = MergingTree(depth, alphabets, cost)
+    fields = tree.settype._fields
+    mybounds, mystart = tree.bounds(), tree.start()
+    for name, value in (bounds or {}).items():
+        mybounds[fields.index(name)] = value
+    for name, value in (start or {}).items():
+        mystart[fields.index(name)] = value
+    kwargs.setdefault('name', repr(tree))
+    return Model(tree.settype, tree.constraints(), tree.time, mybounds, mystart, **kwargs)
+
+
+def sweep_depths(depths, alphabets="-101", cost="classical", epigraph=None, nstarts=1, workers=None,
+        verb=True, tol=1e-6):
+    """
+    Optimizes the merging trees of the given depths, with the same alphabet at
+    all levels (or a function of the depth returning the alphabets), to see
+    where the exponent stops improving. Returns the list of (depth, success,
+    time, worse), where worse is True if the time is above the one of the
+    previous depth by more than tol.
+
+    @param epigraph: by default, each depth is solved both with and without
+    the epigraph form, and the better successful result is kept: each form
+    stops at a bad local optimum at some depths (e.g. the epigraph form at 1.0974
+    for depth 10 with "-1012", where the plain time reaches 0.2834).
+    """
+    res = []
+    for depth in depths:
+        mine = alphabets(depth) if callable(alphabets) else alphabets
+        model = model_tree(depth, mine, cost)
+        solves = []
+        for form in ([True, False] if epigraph is None else [epigraph]):
+            with np.errstate(all='ignore'):
+                solves.append(model.optimize(False, form, nstarts, workers)[:2])
+        # the successful solves first, then the lower times
+        success, time = min(solves, key=lambda s: (not s[0], s[1]))
+        worse = bool(res and time > res[-1][2] + tol)
+        res.append((depth, success, time, worse))
+        if verb:
+            print("Depth %i: %s (success: %s)%s" % (depth, round_upwards_to_str(time), success,
+                    "  WORSE than depth %i" % res[-2][0] if worse else ""))
+    return res
+
+
+if __name__ == "__main__":
+    print("=========== CLASSICAL MERGING TREES WITH {-1,0,1} REPRESENTATIONS ===========")
+    sweep_depths(range(3, 8), "-101")
+    print("=========== QUANTUM WALK MERGING TREES WITH {-1,0,1} REPRESENTATIONS ===========")
+    sweep_depths(range(3, 8), "-101", "quantum")